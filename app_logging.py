@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Logging Pipeline for the Running Challenge App
+Request threads only enqueue log records; a background listener thread
+formats them (text or JSON) and writes to the rotating file and console
+"""
+
+import os
+import sys
+import json
+import queue
+import random
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Dict, List, Optional
+
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # 'text' or 'json'
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv('ACCESS_LOG_SAMPLE_RATE', '1.0'))
+ACCESS_LOG_SLOW_MS = float(os.getenv('ACCESS_LOG_SLOW_MS', '1000'))
+# Log lines scanned from the end of the shared log file when looking for crawler events
+CRAWLER_EVENT_SCAN_LINES = int(os.getenv('CRAWLER_EVENT_SCAN_LINES', '500'))
+
+CRAWLER_MODULES = ('strava_leaderboard_crawler',)
+CRAWLER_KEYWORDS = ('strava', 'crawler', 'sync')
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+access_logger = logging.getLogger('access')
+
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, merging extra `fields`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'ts': datetime.fromtimestamp(record.created).strftime(DATE_FORMAT),
+            'level': record.levelname,
+            'logger': record.name,
+            'func': record.funcName,
+            'line': record.lineno,
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Classic one-line format with `fields` appended as key=value pairs"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that never blocks or formats on the caller's thread"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Records stay in-process, so skip QueueHandler's eager formatting
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def is_crawler_line(line: str) -> bool:
+    """Crawler module output, or any line mentioning strava/crawler/sync (text or JSON format)"""
+    name, message = '', line
+    if line.startswith('{'):
+        try:
+            payload = json.loads(line)
+            name, message = str(payload.get('logger', '')), str(payload.get('message', ''))
+        except (ValueError, AttributeError):
+            pass
+    else:
+        parts = line.split(' - ', 4)
+        if len(parts) == 5:
+            name, message = parts[1], parts[4]
+    if name in CRAWLER_MODULES:
+        return True
+    if name == 'access':
+        return False
+    message = message.lower()
+    return any(keyword in message for keyword in CRAWLER_KEYWORDS)
+
+
+def tail_lines(path: str, limit: int, block_size: int = 8192) -> List[str]:
+    """Return the last `limit` lines of a file by seeking backwards from the end.
+
+    Cost is proportional to the bytes in those lines, not the file size.
+    """
+    if limit <= 0:
+        return []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        chunks = []
+        newlines = 0
+        # One extra newline is needed to know the first wanted line is complete
+        while position > 0 and newlines <= limit:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size)
+            chunks.append(chunk)
+            newlines += chunk.count(b'\n')
+    data = b''.join(reversed(chunks))
+    lines = data.splitlines()
+    return [line.decode('utf-8', errors='replace') for line in lines[-limit:]]
+
+
+def recent_crawler_events(log_file: str, limit: int = 10, scan: Optional[int] = None) -> List[str]:
+    """Last `limit` crawler events in the shared log file.
+
+    Every worker and the cron crawler append to the same file, so all status
+    polls see the same history whichever process answers.
+    """
+    lines = tail_lines(log_file, CRAWLER_EVENT_SCAN_LINES if scan is None else scan)
+    return [line for line in lines if is_crawler_line(line)][-limit:]
+
+
+class LogCapture:
+    """Records emitted inside one capture_logs() block"""
+
+    def __init__(self, level: int, formatter: logging.Formatter):
+        self.level = level
+        self.formatter = formatter
+        self.records: List[logging.LogRecord] = []
+
+    def getvalue(self) -> str:
+        return ''.join(f"{self.formatter.format(record)}\n" for record in self.records)
+
+
+_active_capture: contextvars.ContextVar = contextvars.ContextVar('log_capture', default=None)
+
+
+class ContextCaptureHandler(logging.Handler):
+    """Root handler that copies records into the capture of the emitting context.
+
+    Runs on the caller's thread (before the queue) because context variables
+    are not visible to the writer thread. Costs one lookup when nothing is
+    being captured.
+    """
+
+    def emit(self, record: logging.LogRecord):
+        capture = _active_capture.get()
+        if capture is not None and record.levelno >= capture.level:
+            capture.records.append(record)
+
+
+capture_handler = ContextCaptureHandler()
+
+
+@contextmanager
+def capture_logs(level: int = logging.INFO, fmt: str = '%(asctime)s - %(levelname)s - %(message)s',
+                 datefmt: str = '%H:%M:%S'):
+    """Collect log records emitted by the current context only.
+
+    Concurrent jobs each see just their own lines, and the process-wide
+    handlers are left untouched.
+    """
+    root = logging.getLogger()
+    if capture_handler not in root.handlers:
+        root.addHandler(capture_handler)
+    capture = LogCapture(level, logging.Formatter(fmt, datefmt=datefmt))
+    token = _active_capture.set(capture)
+    try:
+        yield capture
+    finally:
+        _active_capture.reset(token)
+
+
+def make_formatter(fmt: Optional[str] = None) -> logging.Formatter:
+    """Build the formatter selected by LOG_FORMAT"""
+    if (fmt or LOG_FORMAT) == 'json':
+        return JsonFormatter()
+    return TextFormatter(TEXT_FORMAT, datefmt=DATE_FORMAT)
+
+
+def setup_logging(log_file: str, level: int = logging.INFO) -> logging.Logger:
+    """Route the root logger through a queue to file and console writers.
+
+    Safe to call more than once: only the first call installs handlers.
+    """
+    global _listener
+
+    root = logging.getLogger()
+    with _setup_lock:
+        if _listener is not None:
+            return root
+
+        os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+        formatter = make_formatter()
+
+        # Create file handler with daily rotation, keep 7 days
+        file_handler = TimedRotatingFileHandler(
+            log_file,
+            when='midnight',
+            interval=1,
+            backupCount=7,
+            encoding='utf-8'
+        )
+        file_handler.setFormatter(formatter)
+
+        console_handler = logging.StreamHandler(sys.stderr)
+        console_handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.setLevel(level)
+        root.addHandler(queue_handler)
+        root.addHandler(capture_handler)
+
+        _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+    return root
+
+
+def _restart_after_fork():
+    """Threads do not survive fork: give the child a fresh queue and writer"""
+    listener = _listener
+    if listener is None:
+        return
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            handler.queue = log_queue
+    listener.queue = log_queue
+    listener._thread = None
+    listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+def dropped_records() -> int:
+    """Number of records discarded because the queue was full"""
+    return sum(getattr(h, 'dropped', 0) for h in logging.getLogger().handlers)
+
+
+def should_log_access(status_code: int, duration_ms: float) -> bool:
+    """Sample access logs; errors and slow requests are always kept"""
+    if status_code >= 400 or duration_ms >= ACCESS_LOG_SLOW_MS:
+        return True
+    if ACCESS_LOG_SAMPLE_RATE >= 1.0:
+        return True
+    return random.random() < ACCESS_LOG_SAMPLE_RATE
+
+
+def log_access(fields: Dict):
+    """Emit one structured access record"""
+    access_logger.info('request', extra={'fields': fields}, stacklevel=2)
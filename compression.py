@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Response Compression for the Running Challenge App
+Compresses HTML/JSON/text responses with brotli or gzip according to the
+client's Accept-Encoding. Buffered responses below a size threshold are
+left alone; streamed responses are compressed chunk by chunk.
+"""
+
+import os
+import time
+import zlib
+import logging
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', '6'))
+COMPRESS_BR_QUALITY = int(os.getenv('COMPRESS_BR_QUALITY', '4'))
+COMPRESS_ALGORITHMS = [a.strip() for a in os.getenv('COMPRESS_ALGORITHMS', 'br,gzip').split(',') if a.strip()]
+COMPRESS_MIMETYPES = (
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'
+)
+
+COMPRESSED_BYTES = metrics.counter(
+    'http_compression_bytes_total', 'Response bytes before and after compression',
+    ('encoding', 'stage'))
+COMPRESS_SECONDS = metrics.histogram(
+    'http_compression_seconds', 'CPU time spent compressing a buffered response',
+    ('encoding',), (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+
+def available_encodings():
+    """Encodings this process can produce, in server preference order"""
+    return [name for name in COMPRESS_ALGORITHMS
+            if name == 'gzip' or (name == 'br' and brotli is not None)]
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Pick the best encoding both sides support (client q-values win, ties go to br)"""
+    supported = available_encodings()
+    if not supported:
+        return None
+    best = accept_encodings.best_match(supported)
+    if best and accept_encodings.quality(best) > 0:
+        return best
+    return None
+
+
+def make_compressor(encoding: str):
+    """Return (compress(chunk) -> bytes, flush() -> bytes, finish() -> bytes)"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=COMPRESS_BR_QUALITY)
+        return compressor.process, compressor.flush, compressor.finish
+
+    compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return (compressor.compress,
+            lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            lambda: compressor.flush(zlib.Z_FINISH))
+
+
+def compress_bytes(data: bytes, encoding: str) -> bytes:
+    """Compress a complete body in one call"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESS_BR_QUALITY)
+    compressor = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks: Iterable, encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body, flushing after every chunk so clients see progress"""
+    compress, flush, finish = make_compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if not chunk:
+            continue
+        COMPRESSED_BYTES.inc(len(chunk), encoding=encoding, stage='in')
+        output = compress(chunk) + flush()
+        COMPRESSED_BYTES.inc(len(output), encoding=encoding, stage='out')
+        if output:
+            yield output
+    tail = finish()
+    COMPRESSED_BYTES.inc(len(tail), encoding=encoding, stage='out')
+    if tail:
+        yield tail
+
+
+def should_compress(response) -> bool:
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or response.direct_passthrough:
+        return False
+    if response.mimetype == 'text/event-stream':
+        return False
+    return response.mimetype in COMPRESS_MIMETYPES
+
+
+def compress_response(response):
+    """after_request hook: negotiate and apply compression"""
+    if not should_compress(response):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        started = time.perf_counter()
+        compressed = compress_bytes(data, encoding)
+        COMPRESS_SECONDS.observe(time.perf_counter() - started, encoding=encoding)
+        COMPRESSED_BYTES.inc(len(data), encoding=encoding, stage='in')
+        COMPRESSED_BYTES.inc(len(compressed), encoding=encoding, stage='out')
+        response.set_data(compressed)
+
+    response.headers['Content-Encoding'] = encoding
+    if response.headers.get('ETag'):
+        # Different bytes for the same resource: keep the validator weak
+        etag, _ = response.get_etag()
+        response.set_etag(f"{etag}-{encoding}", weak=True)
+    return response
+
+
+def init_app(app):
+    """Install the compression hook on a Flask app"""
+    app.after_request(compress_response)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+PostgreSQL Connection Pool for the Running Challenge App
+Shares a small set of connections between request and background threads
+and recreates them after a WSGI worker fork. psycopg2's pool fails at once
+when every connection is checked out; get_connection() waits up to
+DB_POOL_TIMEOUT seconds for one to come back instead.
+"""
+
+import os
+import logging
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+# Threads outside the request pool that also check out connections: health ping, warm-up,
+# cache refreshes (current and last week), the live update publisher, the report executor
+DB_POOL_BACKGROUND = int(os.getenv('DB_POOL_BACKGROUND', '6'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', str(int(os.getenv('GUNICORN_THREADS', '4')) + DB_POOL_BACKGROUND)))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+
+_pool: Optional[ThreadedConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+# Callables notified after every statement: listener(statement, duration, rowcount, cursor)
+_query_listeners: List[Callable] = []
+
+
+def add_query_listener(listener: Callable):
+    """Register a callback that observes each executed statement"""
+    if listener not in _query_listeners:
+        _query_listeners.append(listener)
+
+
+class InstrumentedCursor:
+    """Cursor proxy that reports statement timings to the query listeners"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+        return False
+
+    def _notify(self, statement, duration: float):
+        for listener in _query_listeners:
+            try:
+                listener(statement, duration, self._cursor.rowcount, self._cursor)
+            except Exception as e:
+                logger.debug(f"Query listener failed: {e}")
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(query, vars)
+        finally:
+            self._notify(query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, vars_list)
+        finally:
+            self._notify(query, time.perf_counter() - started)
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """connection_factory for direct psycopg2.connect() calls (crawler, scripts)"""
+
+    def cursor(self, *args, **kwargs):
+        cursor = super().cursor(*args, **kwargs)
+        return InstrumentedCursor(cursor) if _query_listeners else cursor
+
+
+class PooledConnection:
+    """Connection proxy that hands the connection back to the pool on close()"""
+
+    def __init__(self, pool: ThreadedConnectionPool, conn, slot: Optional[threading.Semaphore] = None):
+        self._pool = pool
+        self._conn = conn
+        self._slot = slot
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError('connection already returned to pool')
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        if self._conn is None:
+            raise psycopg2.InterfaceError('connection already returned to pool')
+        cursor = self._conn.cursor(*args, **kwargs)
+        return InstrumentedCursor(cursor) if _query_listeners else cursor
+
+    @property
+    def closed(self) -> bool:
+        return self._conn is None or bool(self._conn.closed)
+
+    def close(self):
+        """Return the connection to the pool, discarding it if it is broken"""
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            self._put_back(conn)
+        finally:
+            if self._slot is not None:
+                self._slot.release()
+
+    def _put_back(self, conn):
+        discard = bool(conn.closed)
+        if not discard:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        try:
+            self._pool.putconn(conn, close=discard)
+        except Exception as e:
+            # Pool was reset or closed while the connection was checked out
+            logger.debug(f"Dropping connection not owned by current pool: {e}")
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def get_pool(database_url: Optional[str] = None) -> ThreadedConnectionPool:
+    """Get the process-wide pool, creating it lazily in the current process"""
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ThreadedConnectionPool(
+                DB_POOL_MIN,
+                DB_POOL_MAX,
+                database_url or os.getenv('DATABASE_URL'),
+                cursor_factory=psycopg2.extras.RealDictCursor
+            )
+            _pool_pid = pid
+            logger.info(f"Database pool created (pid={pid}, min={DB_POOL_MIN}, max={DB_POOL_MAX})")
+    return _pool
+
+
+def _checkout_slots(pool: ThreadedConnectionPool) -> threading.Semaphore:
+    """One slot per connection the pool may open, so checkouts can wait for a free one"""
+    slots = getattr(pool, 'checkout_slots', None)
+    if slots is None:
+        with _pool_lock:
+            slots = getattr(pool, 'checkout_slots', None)
+            if slots is None:
+                slots = pool.checkout_slots = threading.BoundedSemaphore(pool.maxconn)
+    return slots
+
+
+def get_connection(database_url: Optional[str] = None, timeout: Optional[float] = None) -> PooledConnection:
+    """
+    Check a connection out of the pool, replacing it if the server dropped it.
+    Waits up to `timeout` (default DB_POOL_TIMEOUT) seconds while all are in use,
+    then raises PoolError.
+    """
+    pool = get_pool(database_url)
+    slot = _checkout_slots(pool)
+    wait = DB_POOL_TIMEOUT if timeout is None else timeout
+    if not slot.acquire(timeout=wait):
+        raise PoolError(f"connection pool exhausted: no connection free within {wait:g}s")
+    try:
+        conn = pool.getconn()
+        if conn.closed:
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except BaseException:
+        slot.release()
+        raise
+    return PooledConnection(pool, conn, slot)
+
+
+def reset_pool(close_connections: bool = False):
+    """Forget the current pool so the next checkout opens fresh connections.
+
+    After fork the inherited sockets belong to the parent, so a worker must
+    drop them without closing (closing would terminate the parent's sessions).
+    """
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        pool, _pool, _pool_pid = _pool, None, None
+
+    if pool is not None and close_connections:
+        try:
+            pool.closeall()
+        except Exception as e:
+            logger.warning(f"Error closing database pool: {e}")
+
+
+def pool_status() -> Dict:
+    """Return a snapshot of pool usage for diagnostics"""
+    pool = _pool
+    if pool is None or _pool_pid != os.getpid():
+        return {'initialized': False, 'in_use': 0, 'idle': 0, 'max': DB_POOL_MAX}
+    return {
+        'initialized': True,
+        'in_use': len(pool._used),
+        'idle': len(pool._pool),
+        'max': pool.maxconn
+    }
@@ -93,15 +93,15 @@ wait_for_app() {
     log "⏳ Waiting for application to be ready..."
     
     while [ $wait_time -lt $max_wait ]; do
-        # Check if app is responding on port 5001
-        if curl -s http://localhost:5001/ > /dev/null 2>&1; then
-            log "✅ Application is responding"
+        # Check if app is ready on port 5001 (/readyz: database + templates)
+        if curl -sf http://localhost:5001/readyz > /dev/null 2>&1; then
+            log "✅ Application is ready"
             return 0
         fi
         
         # Also try port 5000
-        if curl -s http://localhost:5000/ > /dev/null 2>&1; then
-            log "✅ Application is responding on port 5000"
+        if curl -sf http://localhost:5000/readyz > /dev/null 2>&1; then
+            log "✅ Application is ready on port 5000"
             return 0
         fi
         
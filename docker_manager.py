@@ -123,11 +123,11 @@ class DockerManager:
             return False, error_msg
     
     def _check_app_health(self) -> bool:
-        """Check if the application is responding"""
+        """Check if the application is ready (database reachable, templates compiled)"""
         try:
             import requests
-            # Try to hit the health endpoint or home page
-            response = requests.get('http://localhost:5001/', timeout=5)
+            # /readyz answers from cached state and never renders a page
+            response = requests.get('http://localhost:5001/readyz', timeout=5)
             return response.status_code == 200
         except:
             return False
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Challenge History Export for the Running Challenge App
+Streams weekly_challenges joined with users as CSV or Parquet for offline
+analysis. Rows are read in keyset-paginated batches of EXPORT_BATCH_ROWS,
+each in its own short transaction on a pooled connection that goes back to
+the pool before the batch is sent, so a slow download neither holds locks
+nor a connection. Memory stays bounded however many rows are exported:
+CSV goes out as chunked HTTP, Parquet as one row group per
+EXPORT_PARQUET_ROW_GROUP rows. Used by the admin endpoint
+/admin/export/challenges.<csv|parquet> and from the command line.
+
+Usage:
+    python export.py --output history.csv
+    python export.py --format parquet --output history.parquet \\
+        --from-week 2025-01-06 --to-week 2025-12-29 --club strava
+"""
+
+import os
+import io
+import csv
+import sys
+import time
+import logging
+import argparse
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import psycopg2.extensions
+
+import db_pool
+import metrics
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_ROWS = int(os.getenv('EXPORT_BATCH_ROWS', '5000'))
+EXPORT_PARQUET_ROW_GROUP = int(os.getenv('EXPORT_PARQUET_ROW_GROUP', '100000'))
+
+FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+# The schema has no club table: users imported from the Strava club leaderboard
+# are marked is_external, people who registered in the app are not
+CLUB_FILTERS = {
+    'all': None,
+    'strava': 'u.is_external IS TRUE',
+    'registered': 'u.is_external IS NOT TRUE'
+}
+
+# Column name -> Parquet type name (pyarrow factory)
+COLUMNS = (
+    ('user_id', 'int32'), ('username', 'string'), ('first_name', 'string'), ('last_name', 'string'),
+    ('is_external', 'bool_'), ('start_date', 'date32'), ('end_date', 'date32'),
+    ('distance_goal', 'float32'), ('total_distance', 'float32'), ('runs', 'int32'),
+    ('average_pace', 'float32'), ('elevation_gain', 'float32'), ('updated_at', 'timestamp')
+)
+
+# Positions of the keyset columns in a row
+USER_ID = [name for name, _ in COLUMNS].index('user_id')
+START_DATE = [name for name, _ in COLUMNS].index('start_date')
+
+EXPORT_ROWS = metrics.counter(
+    'export_rows_total', 'Challenge rows exported',
+    ('format',))
+EXPORT_SECONDS = metrics.histogram(
+    'export_seconds', 'Duration of one challenge history export',
+    ('format', 'result'), (0.1, 0.5, 1, 5, 15, 60, 300))
+
+
+@lru_cache(maxsize=1)
+def pyarrow_modules():
+    """(pyarrow, pyarrow.parquet), imported on the first Parquet export; None when not installed"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:  # pyarrow is optional; CSV export does not need it
+        return None
+    return pyarrow, pyarrow.parquet
+
+
+def _week(value: Optional[str]) -> Optional[date]:
+    """Week start (Monday) of a YYYY-MM-DD date, None when empty"""
+    if not value:
+        return None
+    day = datetime.strptime(value, '%Y-%m-%d').date()
+    return day - timedelta(days=day.weekday())
+
+
+def parse_filters(from_week: Optional[str] = None, to_week: Optional[str] = None,
+                  club: Optional[str] = None) -> Dict:
+    """Validated export filters; raises ValueError on a bad date, range or club"""
+    try:
+        filters = {'from_week': _week(from_week), 'to_week': _week(to_week), 'club': club or 'all'}
+    except ValueError:
+        raise ValueError('weeks must be YYYY-MM-DD')
+    if filters['from_week'] and filters['to_week'] and filters['from_week'] > filters['to_week']:
+        raise ValueError('from_week is after to_week')
+    if filters['club'] not in CLUB_FILTERS:
+        raise ValueError(f"club must be one of {', '.join(CLUB_FILTERS)}")
+    return filters
+
+
+def build_query(filters: Dict, after: Optional[Tuple[int, date]] = None,
+                limit: Optional[int] = None) -> Tuple[str, Dict]:
+    """
+    SQL and parameters for the filtered history, athlete by athlete, oldest week first.
+    Pages follow the UNIQUE(user_id, start_date) index, so each one is an index range scan.
+    :param after: (user_id, start_date) of the last row already read; the page starts after it
+    :param limit: rows per page
+    """
+    conditions = []
+    if filters.get('from_week'):
+        conditions.append('wc.start_date >= %(from_week)s')
+    if filters.get('to_week'):
+        conditions.append('wc.start_date <= %(to_week)s')
+    if CLUB_FILTERS[filters.get('club', 'all')]:
+        conditions.append(CLUB_FILTERS[filters['club']])
+    if after is not None:
+        # (user_id, start_date) is unique, so every row is read exactly once
+        conditions.append('(wc.user_id, wc.start_date) > (%(after_user)s, %(after_week)s)')
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    query = f'''
+        SELECT wc.user_id, u.username, u.first_name, u.last_name, u.is_external,
+               wc.start_date, wc.end_date, wc.distance_goal, wc.total_distance, wc.runs,
+               wc.average_pace, wc.elevation_gain, wc.updated_at
+        FROM weekly_challenges wc
+        JOIN users u ON u.id = wc.user_id
+        {where}
+        ORDER BY wc.user_id, wc.start_date
+        {'LIMIT %(limit)s' if limit else ''}
+    '''
+    params = {key: filters.get(key) for key in ('from_week', 'to_week')}
+    if after is not None:
+        params.update(after_user=after[0], after_week=after[1])
+    if limit:
+        params['limit'] = limit
+    return query, params
+
+
+def iter_batches(database_url: Optional[str], filters: Dict,
+                 batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[List[tuple]]:
+    """
+    Rows of the export in batches. Each batch is one keyset-paginated query
+    whose connection is back in the pool before the batch is yielded.
+    """
+    after = None
+    while True:
+        query, params = build_query(filters, after, batch_rows)
+        conn = db_pool.get_connection(database_url)
+        try:
+            cursor = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        if rows:
+            yield rows
+        if len(rows) < batch_rows:
+            return
+        after = (rows[-1][USER_ID], rows[-1][START_DATE])
+
+
+def csv_chunks(batches: Iterable[List[tuple]]) -> Iterator[bytes]:
+    """UTF-8 CSV: the header, then one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in COLUMNS])
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands what pyarrow wrote so far to the caller"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def parquet_chunks(batches: Iterable[List[tuple]], row_group_rows: int = EXPORT_PARQUET_ROW_GROUP) -> Iterator[bytes]:
+    """Parquet file bytes, emitted as each row group is written; needs pyarrow"""
+    modules = pyarrow_modules()
+    if modules is None:
+        raise RuntimeError('Parquet export needs pyarrow (pip install pyarrow)')
+    pa, pq = modules
+    schema = pa.schema([(name, pa.timestamp('us') if kind == 'timestamp' else getattr(pa, kind)())
+                        for name, kind in COLUMNS])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    pending: List[tuple] = []
+
+    def write_group(rows: List[tuple]):
+        columns = list(zip(*rows))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+
+    try:
+        for rows in batches:
+            pending.extend(rows)
+            if len(pending) >= row_group_rows:
+                while len(pending) >= row_group_rows:
+                    write_group(pending[:row_group_rows])
+                    del pending[:row_group_rows]
+                yield sink.drain()
+        if pending:
+            write_group(pending)
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def export_chunks(database_url: Optional[str], filters: Dict, fmt: str) -> Iterator[bytes]:
+    """Bytes of a whole export in the given format, with metrics"""
+    started = time.perf_counter()
+    counted = {'rows': 0}
+
+    def counting(batches):
+        for rows in batches:
+            counted['rows'] += len(rows)
+            yield rows
+
+    encode = parquet_chunks if fmt == 'parquet' else csv_chunks
+    result = 'error'
+    try:
+        yield from encode(counting(iter_batches(database_url, filters)))
+        result = 'success'
+    finally:
+        EXPORT_ROWS.inc(counted['rows'], format=fmt)
+        EXPORT_SECONDS.observe(time.perf_counter() - started, format=fmt, result=result)
+        logger.info(f"Export format={fmt} rows={counted['rows']} result={result} "
+                    f"duration_ms={(time.perf_counter() - started) * 1000:.0f}")
+
+
+def main():
+    """Write an export to a file (or CSV to stdout)"""
+    parser = argparse.ArgumentParser(description='Export the challenge history as CSV or Parquet')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--format', choices=sorted(FORMATS), default=None,
+                        help='default: from the output file extension, else csv')
+    parser.add_argument('--output', default='-', help="file path, '-' for stdout (CSV only)")
+    parser.add_argument('--from-week', help='first week, YYYY-MM-DD')
+    parser.add_argument('--to-week', help='last week, YYYY-MM-DD')
+    parser.add_argument('--club', choices=list(CLUB_FILTERS), default='all')
+    args = parser.parse_args()
+
+    fmt = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+    if fmt == 'parquet' and args.output == '-':
+        parser.error('Parquet needs --output FILE')
+    if fmt == 'parquet' and pyarrow_modules() is None:
+        parser.error('Parquet export needs pyarrow (pip install pyarrow)')
+    try:
+        filters = parse_filters(args.from_week, args.to_week, args.club)
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    try:
+        for chunk in export_chunks(args.database_url, filters, fmt):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Gunicorn configuration for the Running Challenge App
+All tuning knobs are read from environment variables so the same image
+can be sized per host without rebuilding.
+
+Usage:
+    gunicorn -c gunicorn.conf.py running_challenge_app:app
+
+Graceful reload (finish in-flight requests, start fresh workers):
+    kill -HUP <master pid>
+With preload enabled the master holds the imported code, so picking up
+new code needs a binary upgrade instead:
+    kill -USR2 <master pid> && kill -QUIT <old master pid>
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5001')}")
+
+# Worker processes x threads; gthread keeps long polls and slow pages
+# from starving the other requests handled by the same worker
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Timeouts (seconds); /sync-strava runs the crawler synchronously
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+# Import the app once in the master so workers fork with warm modules
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+accesslog = os.getenv('GUNICORN_ACCESSLOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOGLEVEL', 'info')
+
+
+def on_starting(server):
+    """Start every deployment with an empty shared metrics directory and an up-to-date schema"""
+    metrics_dir = os.getenv('METRICS_MULTIPROC_DIR')
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for filename in os.listdir(metrics_dir):
+            if filename.startswith('metrics_'):
+                os.remove(os.path.join(metrics_dir, filename))
+
+    # Schema migrations run once in the master, never per request or per crawl
+    import leaderboard
+    try:
+        leaderboard.migrate(os.getenv('DATABASE_URL'))
+        server.log.info("Leaderboard schema is up to date")
+    except Exception as e:
+        server.log.warning(f"Leaderboard schema migration skipped: {e}")
+
+
+def post_fork(server, worker):
+    """Drop DB connections inherited from the master; each worker opens its own"""
+    import db_pool
+    db_pool.reset_pool(close_connections=False)
+    server.log.info(f"Worker {worker.pid} forked, database pool reset")
+
+
+def post_worker_init(worker):
+    """Warm templates, the DB pool and the current-week cache before /readyz says OK"""
+    import health
+    health.start_warmup()
+
+
+def worker_exit(server, worker):
+    """Close this worker's pooled connections on shutdown"""
+    import db_pool
+    db_pool.reset_pool(close_connections=True)
+
+
+def child_exit(server, worker):
+    """Runs in the master once a worker is reaped: fold its metrics snapshot into the retired total"""
+    import metrics
+    try:
+        metrics.retire_snapshot(worker.pid)
+    except OSError as e:
+        server.log.warning(f"Could not retire metrics of worker {worker.pid}: {e}")
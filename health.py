@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Health and Readiness Probes for the Running Challenge App
+/healthz answers as long as the process can serve a request (liveness).
+/readyz reports whether the worker can serve real traffic: the boot warmup
+(template compilation, database pool, registered cache priming) finished
+and the database answered a recent ping. Probes only read cached state; the
+ping and the warmup run in background threads, so a probe never waits on
+Postgres.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import jsonify
+
+import db_pool
+from leaderboard_cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+HEALTH_DB_CHECK_INTERVAL = float(os.getenv('HEALTH_DB_CHECK_INTERVAL', '5'))
+HEALTH_DB_MAX_AGE = float(os.getenv('HEALTH_DB_MAX_AGE', '30'))
+
+PROBE_ENDPOINTS = ('healthz', 'readyz')
+
+
+class ReadinessState:
+    """Last known result of each readiness check in this process"""
+
+    def __init__(self):
+        self.templates_warm = False
+        self.warmup_done = False
+        self.warmup_steps: Dict[str, Dict] = {}
+        self.db_ok = False
+        self.db_error: Optional[str] = None
+        self.db_checked_at = 0.0  # monotonic
+        self.started_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def db_age(self) -> Optional[float]:
+        return time.monotonic() - self.db_checked_at if self.db_checked_at else None
+
+
+state = ReadinessState()
+
+# Set by init_app; extra steps (e.g. cache priming) come from add_warmup_step
+_app = None
+_database_url: Optional[str] = None
+_warmup_steps: List[Tuple[str, Callable[[], None]]] = []
+
+
+def add_warmup_step(name: str, step: Callable[[], None]):
+    """Run step() during boot warmup, after templates and the database pool"""
+    _warmup_steps.append((name, step))
+
+
+def check_database(database_url: Optional[str] = None):
+    """Ping Postgres through the pool and record the outcome"""
+    try:
+        conn = db_pool.get_connection(database_url)
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+        if not state.db_ok:
+            logger.info("Readiness: database reachable")
+        state.db_ok, state.db_error = True, None
+    except Exception as e:
+        if state.db_ok or state.db_error is None:
+            logger.warning(f"Readiness: database check failed: {e}")
+        state.db_ok, state.db_error = False, str(e)
+    finally:
+        state.db_checked_at = time.monotonic()
+
+
+def warm_templates(app):
+    """Compile every template once (bytecode cache makes this cheap after a restart)"""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    state.templates_warm = True
+    return f"{len(names)} templates"
+
+
+def _warm_database():
+    """Open the pool with its first connection and record the ping"""
+    check_database(_database_url)
+    if not state.db_ok:
+        raise ConnectionError(state.db_error)
+    return db_pool.pool_status()
+
+
+def warm_up():
+    """
+    Boot warmup: compile templates, open the database pool, then run the
+    registered steps. Failures are recorded but do not stop later steps;
+    readiness still requires a successful database ping on its own.
+    """
+    steps = [('templates', lambda: warm_templates(_app)),
+             ('database', _warm_database)] + _warmup_steps
+    started = time.perf_counter()
+    for name, step in steps:
+        step_started = time.perf_counter()
+        try:
+            detail = step()
+            result = {'ok': True}
+            if detail:
+                result['detail'] = detail
+        except Exception as e:
+            logger.warning(f"Warmup step {name} failed: {e}")
+            result = {'ok': False, 'error': str(e)}
+        result['ms'] = round((time.perf_counter() - step_started) * 1000, 1)
+        state.warmup_steps[name] = result
+    state.warmup_done = True
+    summary = ', '.join(f"{name} {result['ms']:.0f}ms" for name, result in state.warmup_steps.items())
+    logger.info(f"Warmup finished in {(time.perf_counter() - started) * 1000:.0f}ms ({summary}) pid={os.getpid()}")
+
+
+def start_warmup():
+    """Start the warmup once per process (again after fork); called at worker boot"""
+    if _app is None:
+        return
+    pid = os.getpid()
+    with state._lock:
+        if state.started_pid == pid:
+            return
+        state.started_pid = pid
+        state.templates_warm = False
+        state.warmup_done = False
+        state.warmup_steps = {}
+    state._flight.do_background('warmup', warm_up)
+
+
+def readiness(database_url: Optional[str] = None) -> Dict:
+    """Evaluate readiness from cached state, refreshing the DB ping in the background"""
+    start_warmup()
+
+    age = state.db_age()
+    if state.warmup_done and (age is None or age >= HEALTH_DB_CHECK_INTERVAL):
+        state._flight.do_background('database', lambda: check_database(database_url))
+
+    pool = db_pool.pool_status()
+    db_ready = state.db_ok and age is not None and age < HEALTH_DB_MAX_AGE
+    checks = {
+        'database': {
+            'ok': db_ready,
+            'checked_seconds_ago': round(age, 1) if age is not None else None,
+            'error': state.db_error,
+            'pool': pool
+        },
+        'templates': {'ok': state.templates_warm},
+        'warmup': {'ok': state.warmup_done, 'steps': state.warmup_steps}
+    }
+    return {
+        'status': 'ready' if all(check['ok'] for check in checks.values()) else 'not_ready',
+        'checks': checks
+    }
+
+
+def init_app(app, database_url: Optional[str] = None):
+    """Register /healthz and /readyz on a Flask app and remember it for warmup"""
+    global _app, _database_url
+    _app, _database_url = app, database_url
+
+    def healthz():
+        return jsonify({'status': 'ok'})
+
+    def readyz():
+        result = readiness(database_url)
+        return jsonify(result), 200 if result['status'] == 'ready' else 503
+
+    app.add_url_rule('/healthz', 'healthz', healthz)
+    app.add_url_rule('/readyz', 'readyz', readyz)
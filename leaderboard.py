@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Weekly Leaderboard Queries for the Running Challenge App
+Shared by the weekly results page, live updates and the crawler so the
+SQL for one week's standings lives in one place
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+LEADERBOARD_CHANNEL = 'leaderboard_updates'
+
+RESULTS_QUERY_TEMPLATE = '''
+    SELECT u.first_name, u.last_name, u.username, u.is_external, 'https://www.strava.com/athletes/'||replace(u.username,'strava_','') AS strava_url,
+           wc.distance_goal, wc.total_distance, wc.runs,
+           wc.average_pace, wc.elevation_gain, wc.data_version,
+           CASE WHEN COALESCE(wc.distance_goal,0)=0 THEN 0 ELSE
+            ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) END as progress_percentage,
+           CASE
+               WHEN COALESCE(wc.distance_goal,0)=0 THEN 'Chạy chui'
+               WHEN current_date > end_date and ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) < 100 THEN 'Đóng phạt'
+               WHEN ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) < 100 THEN 'Cần bào thêm nữa'
+               WHEN ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) BETWEEN 100 AND 120 THEN 'Hoàn thành kế hoạch'
+               WHEN ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) > 120 THEN 'Chạy hơi lố'
+           END as status
+    FROM users u
+    JOIN weekly_challenges wc ON u.id = wc.user_id
+    WHERE wc.start_date = %s{extra_filter}
+    ORDER BY case when COALESCE(wc.distance_goal,0)>0 then 0 else 1 end,
+               progress_percentage desc, wc.total_distance DESC
+'''
+
+RESULTS_QUERY = RESULTS_QUERY_TEMPLATE.format(extra_filter='')
+
+# Same columns and ranking, restricted to rows written after a data version
+CHANGES_QUERY = RESULTS_QUERY_TEMPLATE.format(extra_filter=' AND wc.data_version > %s')
+
+# Usernames in ranking order, so clients can re-rank without refetching rows
+ORDER_QUERY = '''
+    SELECT u.username
+    FROM users u
+    JOIN weekly_challenges wc ON u.id = wc.user_id
+    WHERE wc.start_date = %s
+    ORDER BY case when COALESCE(wc.distance_goal,0)>0 then 0 else 1 end,
+               CASE WHEN COALESCE(wc.distance_goal,0)=0 THEN 0 ELSE
+                ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) END desc,
+               wc.total_distance DESC
+'''
+
+UNREGISTERED_QUERY = '''
+    SELECT u.first_name, u.last_name, u.username, u.is_external,
+           NULL as distance_goal,
+           NULL as total_distance,
+           NULL as runs,
+           NULL as average_pace,
+           NULL as elevation_gain,
+           NULL as data_version,
+           NULL as progress_percentage,
+           'Chạy chui' as status
+    FROM users u
+    WHERE u.id NOT IN (
+        SELECT DISTINCT wc.user_id
+        FROM weekly_challenges wc
+        WHERE wc.start_date = %s
+    )
+    ORDER BY u.first_name
+'''
+
+COMPLETED_STATUSES = ('Hoàn thành kế hoạch', 'Chạy hơi lố')
+
+
+def get_available_weeks(cursor, limit: int = 10) -> List[Dict]:
+    """Most recent weeks that have challenge rows, for the week filter"""
+    cursor.execute('''
+        SELECT DISTINCT start_date, end_date
+        FROM weekly_challenges
+        ORDER BY start_date DESC
+        LIMIT %s
+    ''', (limit,))
+    available_weeks = []
+    for week in cursor.fetchall():
+        start_date = week['start_date'] if isinstance(week['start_date'], datetime) else datetime.strptime(str(week['start_date']), '%Y-%m-%d').date()
+        end_date = week['end_date'] if isinstance(week['end_date'], datetime) else datetime.strptime(str(week['end_date']), '%Y-%m-%d').date()
+        available_weeks.append({
+            'start_date': start_date,
+            'end_date': end_date,
+            'start_date_str': str(week['start_date'])  # Keep string for form value
+        })
+    return available_weeks
+
+
+def get_registered_results(cursor, week_start) -> List[Dict]:
+    """Challenge rows of the week, ranked"""
+    cursor.execute(RESULTS_QUERY, (week_start,))
+    return list(cursor.fetchall())
+
+
+def get_unregistered_users(cursor, week_start) -> List[Dict]:
+    """Users without a challenge row in the week"""
+    cursor.execute(UNREGISTERED_QUERY, (week_start,))
+    return list(cursor.fetchall())
+
+
+def get_last_update(cursor, week_start):
+    """Latest challenge update of the week (last crawl success)"""
+    cursor.execute('''
+        SELECT MAX(updated_at) as last_update
+        FROM weekly_challenges
+        WHERE start_date = %s
+    ''', (week_start,))
+    result = cursor.fetchone()
+    return result['last_update'] if result and result['last_update'] else None
+
+
+def get_week_results(cursor, week_start, include_unregistered: bool) -> List[Dict]:
+    """Full standings: registered rows, then unregistered users if requested"""
+    results = get_registered_results(cursor, week_start)
+    if include_unregistered:
+        results += get_unregistered_users(cursor, week_start)
+    return results
+
+
+def load_week(cursor, week_start, current_week_start) -> Dict:
+    """Everything the weekly results page shows for one week (the cached and snapshotted value)"""
+    available_weeks = get_available_weeks(cursor)
+    # Unregistered users are listed for the current week only
+    results = get_week_results(cursor, week_start, include_unregistered=week_start == current_week_start)
+    return {
+        'available_weeks': available_weeks,
+        'results': [dict(row) for row in results],  # plain dicts so the snapshot can be saved
+        'last_update': get_last_update(cursor, week_start)
+    }
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Numbers shown in the quick stats row"""
+    return {
+        'participants': len(results),
+        'total_km': round(sum(r['total_distance'] or 0 for r in results)),
+        'completed': sum(1 for r in results if r['status'] in COMPLETED_STATUSES)
+    }
+
+
+def ensure_schema(cursor):
+    """
+    Create the per-week version table and row version column (idempotent).
+    ALTER TABLE takes an ACCESS EXCLUSIVE lock even when the column exists,
+    so it only runs when the catalog says the column is missing.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_versions (
+            start_date DATE PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'weekly_challenges' AND column_name = 'data_version'
+    ''')
+    if cursor.fetchone() is None:
+        cursor.execute('''
+            ALTER TABLE weekly_challenges
+            ADD COLUMN IF NOT EXISTS data_version BIGINT NOT NULL DEFAULT 0
+        ''')
+
+
+def migrate(database_url: Optional[str]):
+    """Apply ensure_schema once, e.g. when gunicorn starts, so request and crawl paths never run DDL"""
+    import psycopg2
+
+    conn = psycopg2.connect(database_url)
+    try:
+        cursor = conn.cursor()
+        ensure_schema(cursor)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def bump_week_version(cursor, week_start) -> int:
+    """
+    Allocate the next data version of a week for a write in this transaction.
+    The version row stays locked until commit, so writers of one week commit
+    in version order and a reader never sees version N+1 before N.
+    """
+    cursor.execute('''
+        INSERT INTO leaderboard_versions (start_date, version)
+        VALUES (%s, 1)
+        ON CONFLICT (start_date) DO UPDATE
+        SET version = leaderboard_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+        RETURNING version
+    ''', (week_start,))
+    return cursor.fetchone()['version']
+
+
+def get_week_version(cursor, week_start) -> int:
+    """Current data version of a week (0 before the first versioned write)"""
+    cursor.execute('SELECT version FROM leaderboard_versions WHERE start_date = %s', (week_start,))
+    result = cursor.fetchone()
+    return result['version'] if result else 0
+
+
+def get_week_versions(cursor, first_week, last_week) -> Dict:
+    """Data versions of the weeks in a range; weeks never written are absent"""
+    cursor.execute('SELECT start_date, version FROM leaderboard_versions WHERE start_date BETWEEN %s AND %s',
+                   (first_week, last_week))
+    return {row['start_date']: row['version'] for row in cursor.fetchall()}
+
+
+def get_changes_since(cursor, week_start, since: int) -> Dict:
+    """
+    Challenge rows of a week written after version `since`.
+    A `since` ahead of the server (e.g. after a database restore) or 0
+    returns every row with full=True so the client replaces its copy.
+    """
+    # Read the version first: commits are ordered, so every row up to it is visible
+    version = get_week_version(cursor, week_start)
+    full = since <= 0 or since > version
+    if full:
+        rows = get_registered_results(cursor, week_start)
+    else:
+        cursor.execute(CHANGES_QUERY, (week_start, since))
+        rows = list(cursor.fetchall())
+
+    order = []
+    if rows or full:
+        cursor.execute(ORDER_QUERY, (week_start,))
+        order = [row['username'] for row in cursor.fetchall()]
+
+    # Rows committed after the version read are newer still; report the highest seen
+    version = max([version] + [row['data_version'] or 0 for row in rows])
+    return {
+        'version': version,
+        'full': full,
+        'rows': rows,
+        'order': order
+    }
+
+
+def notify_leaderboard_changed(cursor, week_start):
+    """Queue a NOTIFY for the week; Postgres delivers it when the transaction commits"""
+    cursor.execute('SELECT pg_notify(%s, %s)', (LEADERBOARD_CHANNEL, str(week_start)))
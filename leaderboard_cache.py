@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Leaderboard Result Cache for the Running Challenge App
+Keeps the query results of each week in process memory. Concurrent misses
+for the same week share one database computation (single-flight), and an
+expired entry is served immediately while one background refresh runs
+(stale-while-revalidate), so a refresh never makes a request wait.
+
+The last good result of each week is also written to disk. When Postgres is
+down, or slower than the latency budget, requests get that copy (flagged as
+degraded) instead of an error, and refreshes back off between attempts.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_CACHE_TTL = float(os.getenv('LEADERBOARD_CACHE_TTL', '30'))
+LEADERBOARD_CACHE_WEEKS = int(os.getenv('LEADERBOARD_CACHE_WEEKS', '16'))
+LEADERBOARD_LATENCY_BUDGET = float(os.getenv('LEADERBOARD_LATENCY_BUDGET', '2.0'))
+LEADERBOARD_RETRY_SECONDS = float(os.getenv('LEADERBOARD_RETRY_SECONDS', '5'))
+# App-owned by default (the app folder is the shared volume in docker-compose), never a world-writable /tmp
+LEADERBOARD_SNAPSHOT_DIR = os.getenv('LEADERBOARD_SNAPSHOT_DIR',
+                                     os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data', 'cache'))
+
+CACHE_REQUESTS = metrics.counter(
+    'leaderboard_cache_requests_total', 'Leaderboard cache lookups by outcome',
+    ('result',))
+CACHE_LOAD_SECONDS = metrics.histogram(
+    'leaderboard_cache_load_seconds', 'Time to load one week from the database')
+
+
+class _Call:
+    """One in-flight computation and the callers waiting for it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run at most one computation per key; concurrent callers share its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None):
+        """
+        Return fn() for the key, joining a computation already in flight.
+        With a timeout the computation runs in a background thread and
+        TimeoutError is raised if it is not done in time (it keeps running).
+        :return: (result, shared) where shared is True for callers that waited
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader and timeout is None:
+            self._run(key, call, fn)
+        elif leader:
+            threading.Thread(target=self._run, args=(key, call, fn),
+                             name=f"load-{key}", daemon=True).start()
+
+        if not call.done.wait(timeout):
+            raise TimeoutError(f"{key} not loaded within {timeout}s")
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader
+
+    def _run(self, key: Hashable, call: _Call, fn: Callable[[], Any]):
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_background(self, key: Hashable, fn: Callable[[], Any]) -> bool:
+        """Start fn() in a daemon thread unless the key is already in flight"""
+        with self._lock:
+            if key in self._calls:
+                return False
+
+        def run():
+            try:
+                self.do(key, fn)
+            except Exception as e:
+                logger.warning(f"Background refresh of {key} failed: {e}")
+
+        threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+        return True
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+
+class CacheEntry:
+    """Loaded value plus when it was loaded and how its last refresh went"""
+
+    def __init__(self, value: Any, loaded_at: Optional[float] = None):
+        self.value = value
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self.invalidated = False
+        self.last_error: Optional[str] = None
+        self.last_attempt = 0.0
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.loaded_at
+
+    @property
+    def degraded(self) -> bool:
+        """True while the database could not provide a newer copy"""
+        return self.last_error is not None
+
+    def is_fresh(self, ttl: float) -> bool:
+        return not self.invalidated and self.age < ttl
+
+    def may_retry(self, retry_seconds: float) -> bool:
+        return self.last_error is None or time.monotonic() - self.last_attempt >= retry_seconds
+
+
+def _encode(value):
+    """json default: dates and decimals as tagged objects so they load back with their type"""
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj: Dict):
+    """json object_hook reversing _encode"""
+    if len(obj) == 1:
+        if '__datetime__' in obj:
+            return datetime.fromisoformat(obj['__datetime__'])
+        if '__date__' in obj:
+            return date.fromisoformat(obj['__date__'])
+        if '__decimal__' in obj:
+            return Decimal(obj['__decimal__'])
+    return obj
+
+
+class SnapshotStore:
+    """
+    Last good value per key on disk as JSON, shared by workers and kept
+    across restarts. A directory owned by another user is refused.
+    """
+
+    def __init__(self, directory: Optional[str] = LEADERBOARD_SNAPSHOT_DIR):
+        self.directory = directory
+        self._usable: Optional[bool] = None
+
+    def _path(self, key: Hashable) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _ready(self) -> bool:
+        """Create the directory once; False when unset or not owned by this process's user"""
+        if not self.directory:
+            return False
+        if self._usable is None:
+            try:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                owner = os.stat(self.directory).st_uid
+            except OSError as e:
+                logger.warning(f"Leaderboard snapshots disabled, cannot use {self.directory}: {e}")
+                self._usable = False
+                return False
+            self._usable = not hasattr(os, 'getuid') or owner == os.getuid()
+            if not self._usable:
+                logger.warning(f"Leaderboard snapshots disabled, {self.directory} is owned by uid {owner}")
+        return self._usable
+
+    def save(self, key: Hashable, entry: CacheEntry):
+        if not self._ready():
+            return
+        try:
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'loaded_at': entry.loaded_at, 'value': entry.value}, f,
+                          default=_encode, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not save leaderboard snapshot for {key}: {e}")
+
+    def load(self, key: Hashable) -> Optional[CacheEntry]:
+        if not self._ready():
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                snapshot = json.load(f, object_hook=_decode)
+            loaded_at, value = snapshot['loaded_at'], snapshot['value']
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable leaderboard snapshot for {key}: {e}")
+            return None
+        return CacheEntry(value, loaded_at)
+
+
+class LeaderboardCache:
+    """Per-process stale-while-revalidate cache of weekly leaderboard data"""
+
+    def __init__(self, loader: Callable[[Hashable], Any], ttl: float = LEADERBOARD_CACHE_TTL,
+                 max_entries: int = LEADERBOARD_CACHE_WEEKS,
+                 latency_budget: float = LEADERBOARD_LATENCY_BUDGET,
+                 retry_seconds: float = LEADERBOARD_RETRY_SECONDS,
+                 snapshots: Optional[SnapshotStore] = None):
+        """
+        :param loader: callable(key) -> value, queries the database
+        :param ttl: seconds an entry is served without a refresh
+        :param max_entries: weeks kept, least recently used are dropped
+        :param latency_budget: seconds a miss waits before falling back to the snapshot
+        :param retry_seconds: pause between refreshes after a failed one
+        :param snapshots: disk store for last good values (default: LEADERBOARD_SNAPSHOT_DIR)
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.latency_budget = latency_budget
+        self.retry_seconds = retry_seconds
+        self.snapshots = snapshots if snapshots is not None else SnapshotStore()
+        self._entries: 'OrderedDict[Hashable, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def get(self, key: Hashable) -> CacheEntry:
+        """
+        Fresh entry, stale entry (refresh started), a coalesced load, or the
+        last good snapshot when the load fails or exceeds the latency budget.
+        Raises the load error only when no copy of the key exists at all.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and entry.is_fresh(self.ttl):
+            CACHE_REQUESTS.inc(result='hit')
+            return entry
+
+        if entry is not None:
+            CACHE_REQUESTS.inc(result='degraded' if entry.degraded else 'stale')
+            if entry.may_retry(self.retry_seconds):
+                self._flight.do_background(key, lambda: self._refresh(key, entry))
+            return entry
+
+        try:
+            entry, shared = self._flight.do(key, lambda: self._load(key), timeout=self.latency_budget)
+        except TimeoutError:
+            fallback = self._fallback(key, f"slower than {self.latency_budget}s")
+            if fallback is not None:
+                return fallback
+            # Nothing to fall back to: keep waiting for the load already running
+            entry, shared = self._flight.do(key, lambda: self._load(key))
+        except Exception as e:
+            fallback = self._fallback(key, str(e))
+            if fallback is None:
+                raise
+            return fallback
+
+        CACHE_REQUESTS.inc(result='coalesced' if shared else 'miss')
+        return entry
+
+    def _load(self, key: Hashable) -> CacheEntry:
+        with CACHE_LOAD_SECONDS.time():
+            entry = CacheEntry(self.loader(key))
+        self._store(key, entry)
+        self.snapshots.save(key, entry)
+        return entry
+
+    def _refresh(self, key: Hashable, stale: CacheEntry) -> CacheEntry:
+        stale.last_attempt = time.monotonic()
+        try:
+            return self._load(key)
+        except Exception as e:
+            stale.last_error = str(e)
+            raise
+
+    def _fallback(self, key: Hashable, reason: str) -> Optional[CacheEntry]:
+        """Serve the disk snapshot (marked degraded) while the database is unavailable"""
+        entry = self.snapshots.load(key)
+        if entry is None:
+            return None
+        logger.warning(f"Serving leaderboard snapshot of {key} from {entry.age:.0f}s ago: {reason}")
+        entry.last_error = reason
+        entry.last_attempt = time.monotonic()
+        with self._lock:
+            # A load that finished meanwhile wins over the snapshot
+            entry = self._entries.setdefault(key, entry)
+        CACHE_REQUESTS.inc(result='degraded')
+        return entry
+
+    def _store(self, key: Hashable, entry: CacheEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key: Hashable) -> bool:
+        """Reload a key in the background so the next request finds it fresh; False if already loading"""
+        return self._flight.do_background(key, lambda: self._load(key))
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Mark one key (or every key) stale; the next request triggers a refresh"""
+        with self._lock:
+            entries = list(self._entries.values()) if key is None else [self._entries.get(key)]
+        for entry in entries:
+            if entry is not None:
+                entry.invalidated = True
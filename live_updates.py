@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Live Leaderboard Updates for the Running Challenge App
+Writers (crawler, registration) NOTIFY on the leaderboard channel; each
+web process keeps one LISTEN connection, computes the changed rows of the
+week once, and fans the delta out to its Server-Sent Events subscribers.
+Each event carries the week's data version as its SSE id, so a client that
+reconnects (Last-Event-ID) is first sent the rows it missed.
+"""
+
+import os
+import json
+import time
+import queue
+import select
+import logging
+import threading
+from datetime import date
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from leaderboard import LEADERBOARD_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+# Each open stream holds a gthread worker thread (idle, without a database connection)
+# for up to SSE_MAX_SECONDS; SSE_RESERVED_THREADS of them are always left for pages
+SSE_RESERVED_THREADS = int(os.getenv('SSE_RESERVED_THREADS', '4'))
+SSE_MAX_CLIENTS = int(os.getenv('SSE_MAX_CLIENTS', str(max(1, int(os.getenv('GUNICORN_THREADS', '4')) - SSE_RESERVED_THREADS))))
+SSE_MAX_SECONDS = int(os.getenv('SSE_MAX_SECONDS', '300'))
+SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_DEBOUNCE_SECONDS = float(os.getenv('SSE_DEBOUNCE_SECONDS', '1.0'))
+SUBSCRIBER_QUEUE_SIZE = 16
+
+
+class LeaderboardBroker:
+    """Per-process hub between Postgres notifications and SSE clients"""
+
+    def __init__(self, database_url: Optional[str], delta_source: Callable[[date, Dict], Optional[Dict]]):
+        """
+        :param database_url: PostgreSQL URL used for the LISTEN connection
+        :param delta_source: callable(week_start, snapshot) -> event dict or None;
+                             it updates `snapshot` in place with the rows it saw
+        """
+        self.database_url = database_url
+        self.delta_source = delta_source
+        self._subscribers: Dict[date, Set[queue.Queue]] = {}
+        self._snapshots: Dict[date, Dict] = {}
+        self._pending: Dict[date, float] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._listener_pid: Optional[int] = None
+        self._notification_listeners: List[Callable[[Optional[date]], None]] = []
+
+    def add_notification_listener(self, listener: Callable[[Optional[date]], None]):
+        """
+        Call listener(week_start) for every leaderboard notification, and
+        listener(None) after (re)connecting since notifications may have been missed
+        """
+        self._notification_listeners.append(listener)
+
+    def start(self):
+        """Start listening without waiting for the first SSE subscriber"""
+        self._ensure_threads()
+
+    def _notify_listeners(self, week_start: Optional[date]):
+        for listener in self._notification_listeners:
+            try:
+                listener(week_start)
+            except Exception as e:
+                logger.warning(f"Leaderboard notification listener failed: {e}")
+
+    # Subscriptions
+
+    def subscribe(self, week_start: date) -> Optional[queue.Queue]:
+        """Register an SSE client; None when this process is at capacity"""
+        with self._lock:
+            if sum(len(s) for s in self._subscribers.values()) >= SSE_MAX_CLIENTS:
+                return None
+            subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+            self._subscribers.setdefault(week_start, set()).add(subscriber)
+        self._ensure_threads()
+        return subscriber
+
+    def unsubscribe(self, week_start: date, subscriber: queue.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(week_start)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[week_start]
+                    self._snapshots.pop(week_start, None)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    # Publishing
+
+    def publish(self, week_start: date):
+        """Schedule a delta computation for the week (bursts are debounced)"""
+        with self._lock:
+            if week_start not in self._subscribers:
+                return
+            self._pending.setdefault(week_start, time.monotonic() + SSE_DEBOUNCE_SECONDS)
+        self._wakeup.set()
+
+    def _broadcast(self, week_start: date, event: Dict):
+        message = (event.get('version'), json.dumps(event, ensure_ascii=False, default=str))
+        with self._lock:
+            subscribers = list(self._subscribers.get(week_start, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # Slow client: drop it, EventSource will reconnect and resync
+                self.unsubscribe(week_start, subscriber)
+                try:
+                    subscriber.get_nowait()
+                    subscriber.put_nowait(None)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def _publish_loop(self):
+        while True:
+            self._wakeup.wait(timeout=SSE_DEBOUNCE_SECONDS)
+            self._wakeup.clear()
+            now = time.monotonic()
+            with self._lock:
+                due = [week for week, at in self._pending.items() if at <= now]
+                for week in due:
+                    del self._pending[week]
+            for week_start in due:
+                with self._lock:
+                    snapshot = self._snapshots.setdefault(week_start, {})
+                try:
+                    event = self.delta_source(week_start, snapshot)
+                except Exception as e:
+                    logger.warning(f"Could not compute leaderboard delta for {week_start}: {e}")
+                    continue
+                if event:
+                    self._broadcast(week_start, event)
+
+    # Postgres LISTEN
+
+    def _listen_loop(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.database_url)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f"LISTEN {LEADERBOARD_CHANNEL}")
+                logger.info(f"Listening for {LEADERBOARD_CHANNEL} notifications (pid={os.getpid()})")
+                backoff = 1
+                self._notify_listeners(None)
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            week_start = date.fromisoformat(notify.payload)
+                        except ValueError:
+                            logger.warning(f"Ignoring leaderboard notification with payload {notify.payload!r}")
+                            continue
+                        self._notify_listeners(week_start)
+                        self.publish(week_start)
+            except Exception as e:
+                logger.warning(f"Leaderboard listener disconnected: {e}; retrying in {backoff}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _ensure_threads(self):
+        """Start the listener and publisher once per process (again after fork)"""
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+        threading.Thread(target=self._listen_loop, name='leaderboard-listener', daemon=True).start()
+        threading.Thread(target=self._publish_loop, name='leaderboard-publisher', daemon=True).start()
+
+
+def diff_rows(snapshot: Dict, rows: List[Dict]) -> Dict:
+    """Compare rows to the last snapshot (username -> row) and update it in place"""
+    current = {row['username']: row for row in rows}
+    changed = [row for username, row in current.items() if snapshot.get(username) != row]
+    removed = [username for username in snapshot if username not in current]
+    order = list(current)
+    order_changed = order != list(snapshot)
+    snapshot.clear()
+    snapshot.update(current)
+    return {
+        'changed': changed,
+        'removed': removed,
+        'order': order,
+        'order_changed': order_changed
+    }
+
+
+def parse_event_id(value: Optional[str]) -> Optional[int]:
+    """Data version from a Last-Event-ID header; None when absent or not a version"""
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        return None
+    return version if version > 0 else None
+
+
+def _frame(message: Tuple[Optional[int], str]) -> str:
+    version, payload = message
+    event_id = f"id: {version}\n" if version is not None else ''
+    return f"{event_id}event: delta\ndata: {payload}\n\n"
+
+
+def sse_stream(broker: LeaderboardBroker, week_start: date, subscriber: queue.Queue,
+               replay: Optional[Dict] = None):
+    """
+    Generator of SSE frames for one client, bounded by SSE_MAX_SECONDS.
+    :param replay: event with the rows changed since the client's Last-Event-ID, sent first
+    """
+    deadline = time.monotonic() + SSE_MAX_SECONDS
+    try:
+        yield f"retry: 5000\n: subscribed to {week_start}\n\n"
+        if replay:
+            yield _frame((replay.get('version'), json.dumps(replay, ensure_ascii=False, default=str)))
+        while time.monotonic() < deadline:
+            try:
+                message = subscriber.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            if message is None:
+                break
+            yield _frame(message)
+    finally:
+        broker.unsubscribe(week_start, subscriber)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Load Test Suite for the Running Challenge App
+Drives the main pages of a running app (or one started here with gunicorn
+against a local Postgres) at several concurrency levels and writes
+throughput and p50/p95/p99 latency per scenario to a JSON results file, so
+runs from different commits can be compared.
+
+Usage:
+    # Seed a local database, start gunicorn on it and run every scenario
+    DATABASE_URL=postgresql://localhost/strava_loadtest python loadtest.py run --seed --start
+
+    # Against an app that is already running
+    python loadtest.py run --url http://localhost:5001 --concurrency 1,8,32 --duration 20
+
+    # Compare two result files
+    python loadtest.py compare loadtest_results/old.json loadtest_results/new.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import socket
+import argparse
+import platform
+import threading
+import subprocess
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.getenv('LOADTEST_RESULTS_DIR', os.path.join(BASE_DIR, 'loadtest_results'))
+DEFAULT_CONCURRENCY = '1,8,32'
+DEFAULT_DURATION = 15.0
+WARMUP_SECONDS = 2.0
+REQUEST_TIMEOUT = 30.0
+
+
+def current_week_start(today: Optional[date] = None) -> date:
+    today = today or date.today()
+    return today - timedelta(days=today.weekday())
+
+
+def build_scenarios(weeks_back: Tuple[int, ...] = (1, 4, 26)) -> List[Dict]:
+    """
+    Scenarios: name, path and whether an admin session is needed. Past weeks
+    are counted back from the current week; the seeded data covers them.
+    """
+    this_week = current_week_start()
+    scenarios = []
+    for view in ('table', 'cards'):
+        scenarios.append({'name': f'weekly_results_current_{view}',
+                          'path': f'/weekly-results?view={view}'})
+        for weeks in weeks_back:
+            week = this_week - timedelta(weeks=weeks)
+            scenarios.append({'name': f'weekly_results_past{weeks}w_{view}',
+                              'path': f'/weekly-results?week={week.isoformat()}&view={view}'})
+    scenarios += [
+        {'name': 'register', 'path': '/register'},
+        {'name': 'feedback', 'path': '/feedback'},
+        {'name': 'admin_feedback', 'path': '/admin/feedback', 'admin': True},
+        {'name': 'reports', 'path': '/reports'},
+    ]
+    return scenarios
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    total = len(latencies) + errors
+    return {
+        'requests': total,
+        'errors': errors + sum(count for status, count in statuses.items() if not status.startswith(('2', '3'))),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+        'statuses': statuses
+    }
+
+
+def admin_session(base_url: str, password: Optional[str]) -> requests.Session:
+    """Session logged in through the admin feedback form"""
+    session = requests.Session()
+    if password:
+        session.post(f"{base_url}/admin/feedback", data={'password': password},
+                     allow_redirects=False, timeout=REQUEST_TIMEOUT)
+    return session
+
+
+def run_scenario(base_url: str, scenario: Dict, concurrency: int, duration: float,
+                 admin_password: Optional[str] = None, warmup: float = WARMUP_SECONDS) -> Dict:
+    """
+    Closed-loop load: `concurrency` clients request the page back to back.
+    Requests started in the first `warmup` seconds are not measured.
+    """
+    url = base_url + scenario['path']
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    lock = threading.Lock()
+    measure_from = time.monotonic() + warmup
+    stop_at = measure_from + duration
+
+    def client():
+        nonlocal errors
+        session = admin_session(base_url, admin_password) if scenario.get('admin') else requests.Session()
+        while True:
+            started = time.monotonic()
+            if started >= stop_at:
+                break
+            try:
+                response = session.get(url, allow_redirects=False, timeout=REQUEST_TIMEOUT)
+                response.content
+                failed, status = False, str(response.status_code)
+            except requests.RequestException:
+                failed, status = True, None
+            finished = time.monotonic()
+            if started < measure_from:
+                continue
+            with lock:
+                if failed:
+                    errors += 1
+                else:
+                    latencies.append(finished - started)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + warmup + REQUEST_TIMEOUT)
+    return summarize(latencies, statuses, errors, duration)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def dataset_size(database_url: Optional[str]) -> Optional[Dict]:
+    """Row counts of the seeded tables, recorded with the results"""
+    if not database_url:
+        return None
+    import psycopg2
+    try:
+        conn = psycopg2.connect(database_url)
+    except psycopg2.Error:
+        return None
+    try:
+        cursor = conn.cursor()
+        counts = {}
+        for table in ('users', 'weekly_challenges', 'feedback', 'feature_generations'):
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cursor.fetchone()[0]
+        return counts
+    finally:
+        conn.close()
+
+
+def seed_database(database_url: str, users: int, weeks: int, seed: int = 42):
+    """Replace the data in DATABASE_URL with a deterministic synthetic data set"""
+    import synthetic_data
+    synthetic_data.generate(database_url, users=users, weeks=weeks, feedback=max(users // 3, 100),
+                            generations=max(users // 6, 50), seed=seed, reset=True)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(database_url: str) -> Tuple[subprocess.Popen, str]:
+    """Start gunicorn with the repo config on a free port and wait for /readyz"""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url, PORT=str(port),
+               GUNICORN_BIND=f"127.0.0.1:{port}", GUNICORN_MAX_REQUESTS='0')
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                'running_challenge_app:app'], cwd=BASE_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("Server did not become ready within 60s")
+
+
+def run(args) -> Dict:
+    database_url = args.database_url or os.getenv('DATABASE_URL')
+    if (args.seed or args.start) and not database_url:
+        raise SystemExit("DATABASE_URL (or --database-url) is required for --seed/--start")
+    if args.seed:
+        seed_database(database_url, args.users, args.weeks)
+
+    process = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if args.start:
+        process, base_url = start_server(database_url)
+    if not base_url:
+        raise SystemExit("Give --url of a running app or --start")
+
+    scenarios = build_scenarios()
+    if args.scenarios:
+        wanted = set(args.scenarios.split(','))
+        scenarios = [s for s in scenarios if s['name'] in wanted]
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    results = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'url': base_url,
+        'python': platform.python_version(),
+        'duration_seconds': args.duration,
+        'concurrency': levels,
+        'dataset': dataset_size(database_url),
+        'scenarios': {}
+    }
+    try:
+        for scenario in scenarios:
+            per_level = {}
+            for level in levels:
+                summary = run_scenario(base_url, scenario, level, args.duration, os.getenv('ADMIN_PASSWORD'))
+                per_level[str(level)] = summary
+                print(f"{scenario['name']:<36} c={level:<3} {summary['throughput_rps']:>8.1f} rps  "
+                      f"p50 {summary['p50_ms']}ms  p95 {summary['p95_ms']}ms  p99 {summary['p99_ms']}ms  "
+                      f"errors {summary['errors']}")
+            results['scenarios'][scenario['name']] = {'path': scenario['path'], 'results': per_level}
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(30)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{results['commit'] or 'nogit'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return results
+
+
+def compare(old_path: str, new_path: str):
+    """Print throughput and p95 of two result files side by side"""
+    with open(old_path, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{'scenario':<36} {'c':>3} {'rps old':>9} {'rps new':>9} {'p95 old':>9} {'p95 new':>9} {'Δp95':>7}")
+    for name, scenario in new['scenarios'].items():
+        for level, result in scenario['results'].items():
+            before = old['scenarios'].get(name, {}).get('results', {}).get(level)
+            if before is None:
+                continue
+            change = ''
+            if before['p95_ms'] and result['p95_ms']:
+                change = f"{(result['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%"
+            print(f"{name:<36} {level:>3} {before['throughput_rps']:>9.1f} {result['throughput_rps']:>9.1f} "
+                  f"{before['p95_ms'] or 0:>9.1f} {result['p95_ms'] or 0:>9.1f} {change:>7}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Load test the running challenge app')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the load test')
+    run_parser.add_argument('--url', help='base URL of a running app')
+    run_parser.add_argument('--start', action='store_true', help='start gunicorn on DATABASE_URL')
+    run_parser.add_argument('--seed', action='store_true', help='reset and seed DATABASE_URL first')
+    run_parser.add_argument('--database-url')
+    run_parser.add_argument('--users', type=int, default=2000, help='synthetic users for --seed')
+    run_parser.add_argument('--weeks', type=int, default=104, help='weeks of history for --seed')
+    run_parser.add_argument('--concurrency', default=DEFAULT_CONCURRENCY, help='comma separated levels')
+    run_parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='seconds per level')
+    run_parser.add_argument('--scenarios', help='comma separated scenario names (default: all)')
+    run_parser.add_argument('--output', help='results file (default: loadtest_results/<time>_<commit>.json)')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args.old, args.new)
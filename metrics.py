@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Lightweight Prometheus Metrics for the Running Challenge App
+Counters and histograms kept in process memory and rendered in the
+Prometheus text exposition format by the /metrics endpoint.
+
+When METRICS_MULTIPROC_DIR is set, every process (gunicorn workers, the
+cron crawler) periodically writes a snapshot there and /metrics merges
+them, so a scrape sees totals for the whole deployment. When a process
+exits (a recycled gunicorn worker, a finished crawl) its snapshot is
+folded into one retired-processes file, so the directory does not grow
+with every worker and counters never go backwards.
+"""
+
+import os
+import json
+import time
+import fcntl
+import atexit
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+STAGE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = [[list(key), value] for key, value in self._values.items()]
+        return {'type': self.type, 'help': self.documentation,
+                'labelnames': list(self.labelnames), 'samples': samples}
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            samples = [[list(key), [list(entry[0]), entry[1], entry[2]]]
+                       for key, entry in self._values.items()]
+        return {'type': self.type, 'help': self.documentation,
+                'labelnames': list(self.labelnames), 'buckets': list(self.buckets),
+                'samples': samples}
+
+
+class Registry:
+    """Holds all metrics of this process"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (),
+              buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Application metrics
+REQUEST_SECONDS = histogram(
+    'http_request_duration_seconds', 'HTTP request latency by endpoint',
+    ('endpoint', 'method', 'status'))
+REQUEST_DB_QUERIES = histogram(
+    'http_request_db_queries', 'Number of SQL statements executed per request',
+    ('endpoint',), COUNT_BUCKETS)
+REQUEST_DB_SECONDS = histogram(
+    'http_request_db_seconds', 'Total SQL time per request',
+    ('endpoint',))
+DB_QUERY_SECONDS = histogram(
+    'db_query_duration_seconds', 'Duration of individual SQL statements by unit of work',
+    ('unit',))
+TEMPLATE_RENDER_SECONDS = histogram(
+    'template_render_seconds', 'Jinja template render time',
+    ('template',))
+CRAWLER_STAGE_SECONDS = histogram(
+    'crawler_stage_duration_seconds', 'Duration of each crawler stage',
+    ('stage',), STAGE_BUCKETS)
+CRAWLER_RUNS = counter(
+    'crawler_runs_total', 'Crawler runs by outcome',
+    ('result',))
+
+
+class UnitStats:
+    """Accumulates DB activity of one request or background job"""
+
+    __slots__ = ('name', 'db_queries', 'db_seconds', 'statements')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        # Statement fingerprint -> [count, seconds, rows], filled by query_log
+        self.statements: Dict[str, List] = {}
+
+
+_current_unit: contextvars.ContextVar = contextvars.ContextVar('metrics_unit', default=None)
+
+
+def begin_unit(name: str) -> UnitStats:
+    """Start accounting DB activity for a request or job in this context"""
+    stats = UnitStats(name)
+    _current_unit.set(stats)
+    return stats
+
+
+def end_unit() -> Optional[UnitStats]:
+    """Stop accounting and return what was collected"""
+    stats = _current_unit.get()
+    _current_unit.set(None)
+    return stats
+
+
+def current_unit() -> Optional[UnitStats]:
+    return _current_unit.get()
+
+
+@contextmanager
+def unit(name: str):
+    """Account DB activity of a job to its own unit, restoring the enclosing one after"""
+    stats = UnitStats(name)
+    token = _current_unit.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_unit.reset(token)
+
+
+def observe_db_query(duration: float):
+    """Record one SQL statement against the current unit of work"""
+    stats = _current_unit.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += duration
+    DB_QUERY_SECONDS.observe(duration, unit=stats.name if stats else 'other')
+
+
+@contextmanager
+def crawler_stage(stage: str):
+    """Time one crawler stage"""
+    with CRAWLER_STAGE_SECONDS.time(stage=stage):
+        yield
+
+
+# Multi-process support
+_flusher_pid: Optional[int] = None
+_flusher_lock = threading.Lock()
+# Guards this process's snapshot file; once retired the process stops writing it
+_snapshot_lock = threading.Lock()
+_retired = False
+
+# Metrics of processes that have exited, summed into one file
+RETIRED_SNAPSHOT = 'metrics_retired.json'
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_MULTIPROC_DIR, f"metrics_{pid}.json")
+
+
+def _write_json(path: str, data: Dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def flush_snapshot():
+    """Write this process's metrics to the shared directory"""
+    if not METRICS_MULTIPROC_DIR:
+        return
+    with _snapshot_lock:
+        if _retired:
+            return
+        os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+        _write_json(_snapshot_path(os.getpid()), REGISTRY.snapshot())
+
+
+def retire_snapshot(pid: int) -> bool:
+    """
+    Fold the snapshot of an exited process into the retired file and delete it.
+    Called by the gunicorn master for each worker it reaps.
+    :return: True if there was a snapshot to fold
+    """
+    if not METRICS_MULTIPROC_DIR:
+        return False
+    path = _snapshot_path(pid)
+    if not os.path.exists(path):
+        return False
+    retired_path = os.path.join(METRICS_MULTIPROC_DIR, RETIRED_SNAPSHOT)
+    # Serialises folds from the master and from exiting crawler processes
+    with open(f"{retired_path}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        merged: Dict = {}
+        for source in (retired_path, path):
+            try:
+                with open(source, 'r', encoding='utf-8') as f:
+                    _merge(merged, json.load(f))
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                pass  # a torn snapshot only loses that process's last interval
+        _write_json(retired_path, _as_snapshot(merged))
+        os.remove(path)
+    try:
+        os.remove(f"{path}.{pid}.tmp")  # left behind by a worker killed mid-flush
+    except FileNotFoundError:
+        pass
+    return True
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            flush_snapshot()
+        except OSError:
+            pass
+
+
+def ensure_flusher():
+    """Start the snapshot writer thread once per process"""
+    global _flusher_pid
+
+    if not METRICS_MULTIPROC_DIR or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_loop, name='metrics-flusher', daemon=True).start()
+        atexit.register(flush_snapshot)
+
+
+def retire_self():
+    """Flush and retire this process's snapshot (processes without a gunicorn master, e.g. the crawler)"""
+    global _retired
+
+    if not METRICS_MULTIPROC_DIR:
+        return
+    with _snapshot_lock:
+        if _retired:
+            return
+        _retired = True
+        try:
+            os.makedirs(METRICS_MULTIPROC_DIR, exist_ok=True)
+            _write_json(_snapshot_path(os.getpid()), REGISTRY.snapshot())
+            retire_snapshot(os.getpid())
+        except OSError:
+            pass
+
+
+def _reset_after_fork():
+    """The flusher may hold the lock at fork time; the child starts with its own"""
+    global _snapshot_lock, _retired
+    _snapshot_lock = threading.Lock()
+    _retired = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _merge(target: Dict, snapshot: Dict):
+    for name, metric in snapshot.items():
+        merged = target.setdefault(name, {**metric, 'samples': {}})
+        for labels, value in metric['samples']:
+            key = tuple(labels)
+            if metric['type'] == 'counter':
+                merged['samples'][key] = merged['samples'].get(key, 0) + value
+            else:
+                entry = merged['samples'].get(key)
+                if entry is None or len(entry[0]) != len(value[0]):
+                    merged['samples'][key] = [list(value[0]), value[1], value[2]]
+                else:
+                    entry[0] = [a + b for a, b in zip(entry[0], value[0])]
+                    entry[1] += value[1]
+                    entry[2] += value[2]
+
+
+def _as_snapshot(merged: Dict) -> Dict:
+    """Turn merged metrics back into the on-disk snapshot format"""
+    return {name: {**metric, 'samples': [[list(key), value] for key, value in metric['samples'].items()]}
+            for name, metric in merged.items()}
+
+
+def collect() -> Dict:
+    """Snapshot of this process, merged with sibling processes when configured"""
+    merged: Dict = {}
+    _merge(merged, REGISTRY.snapshot())
+    if METRICS_MULTIPROC_DIR and os.path.isdir(METRICS_MULTIPROC_DIR):
+        own = os.path.basename(_snapshot_path(os.getpid()))
+        for filename in os.listdir(METRICS_MULTIPROC_DIR):
+            if not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(METRICS_MULTIPROC_DIR, filename), 'r', encoding='utf-8') as f:
+                    _merge(merged, json.load(f))
+            except (OSError, ValueError):
+                continue
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: List[str], values: Iterable[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def render_prometheus() -> str:
+    """Render all metrics in the Prometheus text exposition format"""
+    lines = []
+    for name, metric in sorted(collect().items()):
+        names = metric['labelnames']
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        for key, value in sorted(metric['samples'].items()):
+            if metric['type'] == 'counter':
+                lines.append(f"{name}{_labels(names, key)} {value}")
+                continue
+            bucket_counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(metric['buckets'], bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_labels(names, key, ('le', _format_bound(bound)))} {cumulative}")
+            lines.append(f"{name}_bucket{_labels(names, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{name}_sum{_labels(names, key)} {total}")
+            lines.append(f"{name}_count{_labels(names, key)} {count}")
+    return '\n'.join(lines) + '\n'
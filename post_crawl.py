@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Post-Crawl Pipeline for the Running Challenge App
+Runs registered steps, in order, after sync_group_leaderboard has committed
+a crawl: write the week summaries and regenerate the analysis reports.
+The steps run in a background thread so the crawl itself returns as soon
+as its data is written. Each step is timed and retried; a step that still
+fails is logged and the next one runs. Crawls that finish while the
+pipeline is busy are folded into one more run.
+
+Leaderboard materialization and cache warm-up were dropped from the
+original request. The crawler runs from host cron, outside the web
+container, so anything it materialized would land on a filesystem (and
+under a uid) the workers never read. The crawler NOTIFYs every week it
+writes instead; each web worker then reloads the current and last week
+into its cache in the background and saves its own snapshot.
+
+Usage:
+    python post_crawl.py                       # current and last week
+    python post_crawl.py --week 2026-01-05     # given week(s), run now
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import db_pool
+import leaderboard
+import metrics
+import report_engine
+
+logger = logging.getLogger(__name__)
+
+POST_CRAWL_ENABLED = os.getenv('POST_CRAWL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+POST_CRAWL_RETRIES = int(os.getenv('POST_CRAWL_RETRIES', '2'))
+POST_CRAWL_RETRY_SECONDS = float(os.getenv('POST_CRAWL_RETRY_SECONDS', '5'))
+POST_CRAWL_REPORT_TIMEOUT = float(os.getenv('POST_CRAWL_REPORT_TIMEOUT', '600'))
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, '.data')
+TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+SUMMARY_FOLDER = 'weekly_reports'
+
+STEP_SECONDS = metrics.histogram(
+    'post_crawl_step_seconds', 'Duration of one post-crawl step, retries included',
+    ('step',), metrics.STAGE_BUCKETS)
+STEP_RUNS = metrics.counter(
+    'post_crawl_steps_total', 'Post-crawl steps by result (success, retried, error)',
+    ('step', 'result'))
+
+Step = Callable[[Dict], Optional[str]]
+
+
+class Pipeline:
+    """Ordered post-crawl steps, run by at most one background thread per process"""
+
+    def __init__(self, retries: int = POST_CRAWL_RETRIES, retry_seconds: float = POST_CRAWL_RETRY_SECONDS):
+        self.retries = retries
+        self.retry_seconds = retry_seconds
+        self.last_run: Optional[Dict] = None
+        self._steps: List[Tuple[str, Step, int]] = []
+        self._lock = threading.Lock()
+        self._pending: Optional[Dict] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def add_step(self, name: str, step: Step, retries: Optional[int] = None):
+        """Run step(context) after every crawl, after the steps added before it"""
+        self._steps.append((name, step, self.retries if retries is None else retries))
+
+    @property
+    def steps(self) -> List[str]:
+        return [name for name, _, _ in self._steps]
+
+    def run(self, context: Dict) -> Dict:
+        """Run every step now, in order; returns the run with each step's outcome"""
+        context.setdefault('standings', {})
+        started_at = datetime.now()
+        started = time.perf_counter()
+        steps = {name: self._run_step(name, step, retries, context) for name, step, retries in self._steps}
+        run = {
+            'weeks': [str(week) for week in context['weeks']],
+            'started_at': started_at.isoformat(timespec='seconds'),
+            'ms': round((time.perf_counter() - started) * 1000, 1),
+            'steps': steps
+        }
+        self.last_run = run
+        summary = ', '.join(f"{name} {'ok' if result['ok'] else 'failed'} {result['ms']:.0f}ms"
+                            for name, result in steps.items())
+        logger.info(f"Post-crawl pipeline for {', '.join(run['weeks'])} finished in {run['ms']:.0f}ms ({summary})")
+        return run
+
+    def _run_step(self, name: str, step: Step, retries: int, context: Dict) -> Dict:
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = {'ok': True, 'detail': step(context)}
+                break
+            except Exception as e:
+                if attempt > retries:
+                    logger.error(f"Post-crawl step {name} failed after {attempt} attempts: {e}")
+                    result = {'ok': False, 'error': str(e)}
+                    break
+                delay = self.retry_seconds * 2 ** (attempt - 1)
+                logger.warning(f"Post-crawl step {name} failed (attempt {attempt}), retrying in {delay:.0f}s: {e}")
+                time.sleep(delay)
+
+        duration = time.perf_counter() - started
+        result.update(attempts=attempt, ms=round(duration * 1000, 1))
+        STEP_SECONDS.observe(duration, step=name)
+        STEP_RUNS.inc(step=name, result=('success' if attempt == 1 else 'retried') if result['ok'] else 'error')
+        return result
+
+    def trigger(self, weeks: Iterable[date], current_week: date, database_url: Optional[str] = None) -> bool:
+        """
+        Run the pipeline for the crawled weeks in the background. While a run
+        is in progress the weeks are queued for one more run after it.
+        :return: True if a new background run was started
+        """
+        with self._lock:
+            if self._pending is None:
+                self._pending = {'weeks': []}
+            self._pending['weeks'] += [week for week in weeks if week not in self._pending['weeks']]
+            self._pending.update(current_week=current_week, database_url=database_url)
+            if self._thread is not None:
+                return False
+            # Daemon: never holds up a gunicorn worker's shutdown; command line entry points wait()
+            self._thread = threading.Thread(target=self._loop, name='post-crawl', daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for the background run (and any queued run) to finish; True when idle"""
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                context, self._pending = self._pending, None
+                if context is None:
+                    self._thread = None
+                    return
+            try:
+                self.run(context)
+            except Exception as e:
+                logger.error(f"Post-crawl pipeline failed: {e}", exc_info=True)
+
+
+def recent_weeks(current_week: date) -> List[date]:
+    """The current and the last week"""
+    return [current_week, current_week - timedelta(days=7)]
+
+
+def _standings(context: Dict, week: date) -> Dict:
+    """Standings of a week, queried once per run and shared by the later steps"""
+    if week not in context['standings']:
+        conn = db_pool.get_connection(context.get('database_url'))
+        try:
+            cursor = conn.cursor()
+            context['standings'][week] = leaderboard.load_week(cursor, week, context['current_week'])
+            cursor.close()
+        finally:
+            conn.close()
+    return context['standings'][week]
+
+
+# Steps
+
+def week_summary(week: date, results: List[Dict]) -> Dict:
+    """Quick stats of one week plus totals for the coaches"""
+    registered = [r for r in results if r.get('distance_goal')]
+    paces = [r['average_pace'] for r in results if r.get('average_pace')]
+    summary = leaderboard.summarize(results)
+    summary.update({
+        'week': str(week),
+        'registered': len(registered),
+        'completion_rate': round(summary['completed'] / len(registered), 3) if registered else 0,
+        'total_runs': sum(r.get('runs') or 0 for r in results),
+        'total_elevation': round(sum(r.get('elevation_gain') or 0 for r in results)),
+        'avg_pace': round(sum(paces) / len(paces)) if paces else None,
+        'top_distance': [{'name': f"{r['first_name']} {r.get('last_name') or ''}".strip(),
+                          'total_distance': r['total_distance']}
+                         for r in sorted((r for r in results if r.get('total_distance')),
+                                         key=lambda r: -r['total_distance'])[:5]]
+    })
+    return summary
+
+
+def summary_stats(context: Dict) -> str:
+    """Write the summary of each crawled week to .data/weekly_reports for the reports page"""
+    summaries = [week_summary(week, _standings(context, week)['results']) for week in context['weeks']]
+    folder = os.path.join(context.get('data_path', DATA_DIR), SUMMARY_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    generated_at = datetime.now().isoformat(timespec='seconds')
+    for summary in summaries:
+        summary['generated_at'] = generated_at
+        path = os.path.join(folder, f"tong_ket_tuan_{summary['week']}.json")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(temp_path, path)
+    return f"{len(context['weeks'])} week summaries"
+
+
+@lru_cache(maxsize=1)
+def report_environment():
+    """Jinja environment for rendering reports outside the web app (crawler, cron)"""
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+    return Environment(loader=FileSystemLoader(TEMPLATES_DIR), autoescape=select_autoescape(['html']))
+
+
+_report_jobs: Optional[report_engine.ReportJobs] = None
+
+
+def use_report_jobs(jobs: report_engine.ReportJobs):
+    """Regenerate reports through the web app's job runner when the crawl runs inside the app"""
+    global _report_jobs
+    _report_jobs = jobs
+
+
+def regenerate_reports(context: Dict) -> str:
+    """Rebuild the analysis reports whose weeks changed; up-to-date reports are kept as they are"""
+    global _report_jobs
+    if _report_jobs is None:
+        _report_jobs = report_engine.ReportJobs(context.get('database_url'), DATA_DIR, report_environment())
+    outcomes = []
+    for report_type in report_engine.REPORTS:
+        job = _report_jobs.submit(report_type, context['current_week'])
+        if job.get('cached'):
+            outcomes.append(f"{report_type} up to date")
+            continue
+        deadline = time.monotonic() + POST_CRAWL_REPORT_TIMEOUT
+        while job['state'] in ('pending', 'running') and time.monotonic() < deadline:
+            time.sleep(0.5)
+            job = _report_jobs.status(job['id']) or {'state': 'error', 'error': 'job status lost'}
+        if job['state'] != 'success':
+            raise RuntimeError(f"{report_type}: {job.get('error') or job['state']}")
+        outcomes.append(f"{report_type} rebuilt")
+    return ', '.join(outcomes)
+
+
+pipeline = Pipeline()
+pipeline.add_step('summary_stats', summary_stats)
+pipeline.add_step('regenerate_reports', regenerate_reports, retries=1)
+
+
+def after_crawl(weeks: Iterable[date], current_week: date, database_url: Optional[str] = None) -> bool:
+    """Called by the crawler once a crawl is committed; returns at once"""
+    if not POST_CRAWL_ENABLED:
+        return False
+    return pipeline.trigger(weeks, current_week, database_url)
+
+
+def main():
+    """Run the pipeline in the foreground"""
+    parser = argparse.ArgumentParser(description='Run the post-crawl steps now')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--week', action='append', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help='week start (repeatable); default: current and last week')
+    args = parser.parse_args()
+
+    today = date.today()
+    current_week = today - timedelta(days=today.weekday())
+    run = pipeline.run({'weeks': args.week or recent_weeks(current_week), 'current_week': current_week,
+                        'database_url': args.database_url})
+    for name, result in run['steps'].items():
+        outcome = result.get('detail') if result['ok'] else f"FAILED: {result['error']}"
+        print(f"{'✅' if result['ok'] else '❌'} {name} ({result['ms']:.0f}ms, {result['attempts']} attempt(s)): {outcome}")
+    return 0 if all(result['ok'] for result in run['steps'].values()) else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+On-Demand Request Profiling for the Running Challenge App
+An authenticated admin adds `?_profile=1` (or the header `X-Profile: 1`) to
+any page; that single request runs under cProfile and the result is saved
+in PROFILE_DIR with a JSON summary (SQL, template and total time). Requests
+without the switch only pay one query-string check.
+
+pstats loads .prof files with marshal, so a planted file is unsafe to open:
+PROFILE_DIR is app-owned by default, and a directory owned by another user
+is neither written nor read.
+"""
+
+import os
+import re
+import io
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from flask import request, g
+
+import metrics
+import query_log
+
+logger = logging.getLogger(__name__)
+
+# App-owned by default, never a world-writable /tmp
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.data', 'profiles'))
+PROFILE_RETAIN = int(os.getenv('PROFILE_RETAIN', '50'))
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_SORTS = ('cumulative', 'tottime', 'ncalls')
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}_[A-Za-z0-9_.-]+$')
+
+# One profiled request at a time per process (newer Pythons allow a single active profiler)
+_profile_lock = threading.Lock()
+
+
+def requested() -> bool:
+    """Cheap check for the profiling switch on the current request"""
+    if request.headers.get(PROFILE_HEADER) == '1':
+        return True
+    return PROFILE_PARAM.encode() in request.query_string and request.args.get(PROFILE_PARAM) == '1'
+
+
+def start_profile() -> bool:
+    """Profile the current request unless another one is being profiled"""
+    if not _profile_lock.acquire(blocking=False):
+        return False
+    profiler = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profiler = profiler
+    profiler.enable()
+    return True
+
+
+def stop_profile() -> Optional[cProfile.Profile]:
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+    return profiler
+
+
+def finish_profile(response):
+    """Stop the profiler, save the profile and point the response at it"""
+    profiler = stop_profile()
+    if profiler is None:
+        return response
+    duration = time.perf_counter() - g.pop('profile_started')
+
+    stats = metrics.current_unit()
+    summary = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 1),
+        'db_queries': stats.db_queries if stats else None,
+        'db_ms': round(stats.db_seconds * 1000, 1) if stats else None,
+        'template_ms': round(g.get('template_seconds', 0.0) * 1000, 1),
+        'statements': query_log.top_statements(stats) if stats else [],
+        'pid': os.getpid()
+    }
+    try:
+        profile_id = save_profile(profiler, summary)
+        response.headers['X-Profile-Id'] = profile_id
+        logger.info(f"Profiled {summary['path']} in {summary['duration_ms']}ms -> {profile_id}")
+    except OSError as e:
+        logger.warning(f"Could not save request profile: {e}")
+    return response
+
+
+def profile_dir(create: bool = False) -> Optional[str]:
+    """PROFILE_DIR when it exists (or was created) and is owned by this process's user, else None"""
+    try:
+        if create:
+            os.makedirs(PROFILE_DIR, mode=0o700, exist_ok=True)
+        owner = os.stat(PROFILE_DIR).st_uid
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"Request profiles disabled, cannot use {PROFILE_DIR}: {e}")
+        return None
+    if hasattr(os, 'getuid') and owner != os.getuid():
+        logger.warning(f"Request profiles disabled, {PROFILE_DIR} is owned by uid {owner}")
+        return None
+    return PROFILE_DIR
+
+
+def save_profile(profiler: cProfile.Profile, summary: Dict) -> str:
+    if profile_dir(create=True) is None:
+        raise PermissionError(f"{PROFILE_DIR} is owned by another user")
+    endpoint = re.sub(r'[^A-Za-z0-9_.-]', '_', summary['endpoint'] or 'unknown')
+    profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{endpoint}_{uuid.uuid4().hex[:6]}"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, f"{profile_id}.prof"))
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.json"), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    prune_profiles()
+    return profile_id
+
+
+def prune_profiles(retain: Optional[int] = None):
+    """Keep only the newest `retain` profiles (default PROFILE_RETAIN)"""
+    retain = PROFILE_RETAIN if retain is None else retain
+    for profile_id in [p['id'] for p in list_profiles()][retain:]:
+        for suffix in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> List[Dict]:
+    """Saved profiles, newest first"""
+    if profile_dir() is None or not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for filename in os.listdir(PROFILE_DIR):
+        if not filename.endswith('.json'):
+            continue
+        path = os.path.join(PROFILE_DIR, filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+            modified = os.path.getmtime(path)
+        except (OSError, ValueError):
+            continue
+        summary['id'] = filename[:-len('.json')]
+        profiles.append((modified, summary))
+    profiles.sort(key=lambda item: item[0], reverse=True)
+    return [summary for _, summary in profiles]
+
+
+def profile_file(profile_id: str) -> Optional[str]:
+    """Path of a saved .prof file, None for unknown or malformed ids"""
+    if not PROFILE_ID_PATTERN.match(profile_id) or profile_dir() is None:
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.prof")
+    return path if os.path.exists(path) else None
+
+
+def render_stats(profile_id: str, sort: str = 'cumulative', limit: int = 60) -> Optional[str]:
+    """pstats text report of a saved profile"""
+    path = profile_file(profile_id)
+    if path is None:
+        return None
+    if sort not in PROFILE_SORTS:
+        sort = 'cumulative'
+    output = io.StringIO()
+    report = pstats.Stats(path, stream=output)
+    report.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
+
+
+def init_app(app, is_admin: Callable[[], bool]):
+    """Install the profiling switch; only requests from admins are profiled"""
+
+    @app.before_request
+    def maybe_start_profile():
+        if requested() and is_admin() and not start_profile():
+            g.profile_skipped = True
+
+    @app.after_request
+    def maybe_finish_profile(response):
+        if 'profiler' in g:
+            return finish_profile(response)
+        if g.get('profile_skipped'):
+            response.headers['X-Profile-Id'] = 'busy'
+        return response
+
+    @app.teardown_request
+    def stop_abandoned_profile(exc):
+        # The view raised before after_request ran
+        stop_profile()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+SQL Instrumentation for the Running Challenge App
+A db_pool query listener that groups statements by fingerprint (literals and
+parameters replaced by ?) within the current unit of work (a request or a
+crawler job), logs statements slower than SLOW_QUERY_MS together with their
+EXPLAIN plan, and warns when one statement shape repeats QUERY_REPEAT_THRESHOLD
+times in a unit, the usual sign of an N+1 loop.
+"""
+
+import os
+import re
+import logging
+import contextvars
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+import db_pool
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_EXPLAIN = os.getenv('SLOW_QUERY_EXPLAIN', '1') == '1'
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '10'))
+
+SLOW_QUERIES = metrics.counter(
+    'db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS',
+    ('unit',))
+REPEATED_STATEMENTS = metrics.counter(
+    'db_repeated_statements_total', 'Statement shapes repeated past QUERY_REPEAT_THRESHOLD in one unit',
+    ('unit',))
+
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete')
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_PARAMS = re.compile(r'%\(\w+\)s|%s')
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUE_ROWS = re.compile(r'(\(\?\.\.\.\))(?:\s*,\s*\(\?\.\.\.\))+')
+_SPACES = re.compile(r'\s+')
+
+# Set while the EXPLAIN of a slow statement runs so it is not recorded itself
+_explaining: contextvars.ContextVar = contextvars.ContextVar('query_log_explaining', default=False)
+
+
+@lru_cache(maxsize=512)
+def fingerprint(statement: str) -> str:
+    """Statement shape: comments dropped, literals and parameters as ?, lists collapsed"""
+    text = _COMMENTS.sub(' ', statement)
+    text = _STRINGS.sub('?', text)
+    text = _PARAMS.sub('?', text)
+    text = _NUMBERS.sub('?', text)
+    text = _LISTS.sub('(?...)', text)
+    text = _VALUE_ROWS.sub(r'\1', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+def _statement_text(statement) -> str:
+    if isinstance(statement, bytes):
+        return statement.decode('utf-8', 'replace')
+    return statement if isinstance(statement, str) else str(statement)
+
+
+def explain(cursor) -> Optional[str]:
+    """
+    EXPLAIN the statement the cursor just ran, on the same connection so
+    temporary state is visible. Inside a transaction it runs in a savepoint
+    so a failing EXPLAIN cannot abort the caller's work.
+    """
+    query = getattr(cursor, 'query', None)
+    conn = getattr(cursor, 'connection', None)
+    if not query or conn is None:
+        return None
+    query = _statement_text(query)
+    if not query.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+
+    status = conn.get_transaction_status()
+    savepoint = status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    if not savepoint and not (conn.autocommit and status == psycopg2.extensions.TRANSACTION_STATUS_IDLE):
+        return None
+
+    token = _explaining.set(True)
+    plan_cursor = conn.cursor()
+    try:
+        if savepoint:
+            plan_cursor.execute('SAVEPOINT query_log_explain')
+        try:
+            plan_cursor.execute('EXPLAIN ' + query)
+            rows = plan_cursor.fetchall()
+        except psycopg2.Error as e:
+            if savepoint:
+                plan_cursor.execute('ROLLBACK TO SAVEPOINT query_log_explain')
+            return f"(EXPLAIN failed: {e})"
+        finally:
+            if savepoint:
+                plan_cursor.execute('RELEASE SAVEPOINT query_log_explain')
+        return '\n'.join(str(next(iter(row.values())) if isinstance(row, dict) else row[0]) for row in rows)
+    finally:
+        plan_cursor.close()
+        _explaining.reset(token)
+
+
+def observe_query(statement, duration: float, rowcount: int, cursor=None):
+    """db_pool query listener: record, log slow statements, detect repeats"""
+    if _explaining.get():
+        return
+    metrics.observe_db_query(duration)
+    shape = fingerprint(_statement_text(statement))
+    stats = metrics.current_unit()
+    unit_name = stats.name if stats else 'other'
+
+    if stats is not None:
+        entry = stats.statements.get(shape)
+        if entry is None:
+            entry = stats.statements[shape] = [0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += duration
+        entry[2] += max(rowcount or 0, 0)
+        if entry[0] == QUERY_REPEAT_THRESHOLD:
+            REPEATED_STATEMENTS.inc(unit=unit_name)
+            logger.warning(f"Possible N+1 in {unit_name}: statement ran {entry[0]} times: {shape[:300]}")
+
+    duration_ms = duration * 1000
+    if duration_ms >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(unit=unit_name)
+        plan = None
+        if SLOW_QUERY_EXPLAIN and cursor is not None:
+            try:
+                plan = explain(cursor)
+            except Exception as e:
+                plan = f"(EXPLAIN failed: {e})"
+        message = f"Slow query in {unit_name}: {duration_ms:.0f}ms, {rowcount} rows: {shape[:500]}"
+        logger.warning(message + (f"\n{plan}" if plan else ''))
+
+
+def repeated_statements(stats: metrics.UnitStats,
+                        threshold: Optional[int] = None) -> List[Tuple[str, int, float]]:
+    """(fingerprint, count, seconds) of the shapes that ran at least threshold times"""
+    threshold = QUERY_REPEAT_THRESHOLD if threshold is None else threshold
+    rows = [(shape, entry[0], entry[1]) for shape, entry in stats.statements.items() if entry[0] >= threshold]
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def top_statements(stats: metrics.UnitStats, limit: int = 10) -> List[Dict]:
+    """Statement shapes of a unit by total time, for profiles and reports"""
+    rows = sorted(stats.statements.items(), key=lambda item: item[1][1], reverse=True)[:limit]
+    return [{'statement': shape, 'count': count, 'ms': round(seconds * 1000, 1), 'rows': rows_total}
+            for shape, (count, seconds, rows_total) in rows]
+
+
+def report_unit(stats: Optional[metrics.UnitStats]):
+    """Summarise a finished unit: one line per statement shape that repeated"""
+    if stats is None:
+        return
+    repeated = repeated_statements(stats)
+    if repeated:
+        summary = '; '.join(f"{count}x {seconds * 1000:.0f}ms {shape[:120]}" for shape, count, seconds in repeated)
+        logger.info(f"Unit {stats.name}: {stats.db_queries} queries, {stats.db_seconds * 1000:.0f}ms; repeated: {summary}")
+
+
+@contextmanager
+def unit(name: str):
+    """Run a job as its own unit of work and report its repeated statements at the end"""
+    with metrics.unit(name) as stats:
+        yield stats
+    report_unit(stats)
+
+
+def install():
+    """Register the listener on db_pool cursors (idempotent)"""
+    db_pool.add_query_listener(observe_query)
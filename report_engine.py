@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+Report Engine for the Running Challenge App
+Builds the analysis reports (interactive Vietnamese report, actionable
+insights) inside the app from weekly_challenges instead of running the
+report scripts in a new interpreter. Aggregation uses pandas when it is
+installed and an equivalent pure-Python pass otherwise. Jobs run in a
+background thread pool; their status is kept as small JSON files next to
+the reports so every worker can answer the page's polling.
+
+A built report remembers the data versions (leaderboard_versions) of the
+weeks it covers. Asking for it again while those versions are unchanged
+returns it at once, and concurrent requests for a stale report share one
+job through a lock file, across workers.
+"""
+
+import os
+import re
+import json
+import hashlib
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, List, Optional
+
+import compression
+import db_pool
+import leaderboard
+import metrics
+import query_log
+import reports_manifest
+
+logger = logging.getLogger(__name__)
+
+REPORT_WEEKS = int(os.getenv('REPORT_WEEKS', '12'))
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '1'))
+REPORT_JOB_RETAIN = int(os.getenv('REPORT_JOB_RETAIN', '50'))
+REPORT_LOCK_SECONDS = float(os.getenv('REPORT_LOCK_SECONDS', '600'))
+# Part of every data key: bump when the analytics or templates change so built reports are redone
+REPORT_FORMAT = 1
+RECENT_WEEKS = 4
+JOBS_FOLDER = '.report_jobs'
+
+# Report type -> .data folder, output file name (without extension), template
+REPORTS = {
+    'interactive_vietnamese': {
+        'title': 'Báo Cáo Tương Tác Tiếng Việt',
+        'folder': 'enhanced_interactive_report',
+        'basename': 'bao_cao_strava_tuong_tac',
+        'template': 'report_interactive.html'
+    },
+    'actionable_insights': {
+        'title': 'Báo Cáo Khuyến Nghị & Hành Động',
+        'folder': 'user_insights',
+        'basename': 'actionable_insights_summary',
+        'template': 'report_insights.html'
+    }
+}
+
+JOB_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}_[a-z_]+_[0-9a-f]{6}$')
+
+REPORT_SECONDS = metrics.histogram(
+    'report_generation_seconds', 'Time to build one report (query, analysis, render)',
+    ('report',))
+REPORT_RUNS = metrics.counter(
+    'report_generation_total', 'Report builds by result',
+    ('report', 'result'))
+REPORT_REQUESTS = metrics.counter(
+    'report_requests_total', 'Report requests by outcome (fresh, coalesced, rebuild)',
+    ('report', 'result'))
+
+ROWS_QUERY = '''
+    SELECT wc.user_id, u.first_name, u.last_name, u.username, wc.start_date,
+           wc.distance_goal, wc.total_distance, wc.runs, wc.average_pace, wc.elevation_gain
+    FROM weekly_challenges wc
+    JOIN users u ON u.id = wc.user_id
+    WHERE wc.start_date BETWEEN %s AND %s
+'''
+
+NUMERIC_COLUMNS = ('distance_goal', 'total_distance', 'runs', 'average_pace', 'elevation_gain')
+# Decimals kept from the aggregated sums, far below the report's 0.1 km precision
+SUM_DECIMALS = 6
+
+CATEGORIES = ('Chủ lực', 'Bền bỉ', 'Tăng tốc', 'Đang phát triển', 'Cần động lực')
+
+
+@lru_cache(maxsize=1)
+def pandas_module():
+    """pandas, imported on the first report so app startup stays light; None when not installed"""
+    try:
+        import pandas
+    except ImportError:  # pandas is optional; the pure-Python pass gives the same numbers
+        return None
+    return pandas
+
+
+def report_weeks(end_week: date, weeks: int = REPORT_WEEKS) -> List[date]:
+    """Week starts covered by a report, oldest first, ending with end_week"""
+    return [end_week - timedelta(weeks=i) for i in range(weeks - 1, -1, -1)]
+
+
+def data_key(report_type: str, weeks: List[date], versions: Dict[date, int]) -> str:
+    """Identity of the data a report covers: format, period and the version of every week"""
+    parts = [str(REPORT_FORMAT), report_type] + [f"{week.isoformat()}={versions.get(week, 0)}" for week in weeks]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+
+def load_rows(cursor, weeks: List[date]) -> List[Dict]:
+    cursor.execute(ROWS_QUERY, (weeks[0], weeks[-1]))
+    return [dict(row) for row in cursor.fetchall()]
+
+
+# Aggregation: per athlete and per week sums, the only part that depends on pandas
+
+def _aggregate_python(rows: List[Dict], recent_start: date, last2_start: date):
+    athletes: Dict[int, Dict] = {}
+    weekly: Dict[date, Dict] = {}
+    for row in rows:
+        values = {column: row[column] or 0 for column in NUMERIC_COLUMNS}
+        distance = values['total_distance']
+        has_goal = values['distance_goal'] > 0
+        completed = has_goal and distance >= values['distance_goal']
+        paced = distance if values['average_pace'] > 0 else 0
+
+        athlete = athletes.get(row['user_id'])
+        if athlete is None:
+            athlete = athletes[row['user_id']] = {
+                'first_name': row['first_name'], 'last_name': row['last_name'], 'username': row['username'],
+                'total_km': 0.0, 'weeks_active': 0, 'total_runs': 0, 'elevation': 0.0, 'goal_weeks': 0,
+                'completed': 0, 'goal_sum': 0.0, 'pace_km': 0.0, 'pace_weighted': 0.0,
+                'recent_km': 0.0, 'last2_km': 0.0}
+        athlete['total_km'] += distance
+        athlete['weeks_active'] += distance > 0
+        athlete['total_runs'] += values['runs']
+        athlete['elevation'] += values['elevation_gain']
+        athlete['goal_weeks'] += has_goal
+        athlete['completed'] += completed
+        athlete['goal_sum'] += values['distance_goal']
+        athlete['pace_km'] += paced
+        athlete['pace_weighted'] += paced * values['average_pace']
+        if row['start_date'] >= recent_start:
+            athlete['recent_km'] += distance
+        if row['start_date'] >= last2_start:
+            athlete['last2_km'] += distance
+
+        week = weekly.get(row['start_date'])
+        if week is None:
+            week = weekly[row['start_date']] = {'athletes': 0, 'total_km': 0.0, 'total_runs': 0,
+                                                'goal_weeks': 0, 'completed': 0}
+        week['athletes'] += distance > 0
+        week['total_km'] += distance
+        week['total_runs'] += values['runs']
+        week['goal_weeks'] += has_goal
+        week['completed'] += completed
+    return athletes, weekly
+
+
+def _aggregate_pandas(rows: List[Dict], recent_start: date, last2_start: date):
+    frame = pandas_module().DataFrame.from_records(rows)
+    frame[list(NUMERIC_COLUMNS)] = frame[list(NUMERIC_COLUMNS)].fillna(0).astype(float)
+    distance = frame['total_distance']
+    frame['active'] = distance > 0
+    frame['has_goal'] = frame['distance_goal'] > 0
+    frame['completed'] = frame['has_goal'] & (distance >= frame['distance_goal'])
+    frame['pace_km'] = distance.where(frame['average_pace'] > 0, 0.0)
+    frame['pace_weighted'] = frame['pace_km'] * frame['average_pace']
+    frame['recent_km'] = distance.where(frame['start_date'] >= recent_start, 0.0)
+    frame['last2_km'] = distance.where(frame['start_date'] >= last2_start, 0.0)
+
+    per_athlete = frame.groupby('user_id', sort=False).agg(
+        first_name=('first_name', 'first'), last_name=('last_name', 'first'), username=('username', 'first'),
+        total_km=('total_distance', 'sum'), weeks_active=('active', 'sum'), total_runs=('runs', 'sum'),
+        elevation=('elevation_gain', 'sum'), goal_weeks=('has_goal', 'sum'), completed=('completed', 'sum'),
+        goal_sum=('distance_goal', 'sum'), pace_km=('pace_km', 'sum'), pace_weighted=('pace_weighted', 'sum'),
+        recent_km=('recent_km', 'sum'), last2_km=('last2_km', 'sum'))
+    per_week = frame.groupby('start_date', sort=False).agg(
+        athletes=('active', 'sum'), total_km=('total_distance', 'sum'), total_runs=('runs', 'sum'),
+        goal_weeks=('has_goal', 'sum'), completed=('completed', 'sum'))
+    return per_athlete.to_dict('index'), per_week.to_dict('index')
+
+
+def _settle(sums: Dict[Hashable, Dict]) -> Dict[Hashable, Dict]:
+    """
+    Round float sums to SUM_DECIMALS. pandas and the loop add floats in a
+    different order, so their sums can differ in the last bits and a value
+    on a .x5 boundary would then round differently in the report.
+    """
+    return {key: {name: round(value, SUM_DECIMALS) if isinstance(value, float) else value
+                  for name, value in group.items()}
+            for key, group in sums.items()}
+
+
+def aggregate(rows: List[Dict], recent_start: date, last2_start: date, engine: Optional[str] = None):
+    """(athletes by user_id, weeks by start date) sums; engine 'pandas' or 'python' (default: best available)"""
+    engine = engine or ('pandas' if pandas_module() is not None else 'python')
+    if engine == 'pandas' and rows:
+        athletes, weekly = _aggregate_pandas(rows, recent_start, last2_start)
+    else:
+        athletes, weekly = _aggregate_python(rows, recent_start, last2_start)
+    return _settle(athletes), _settle(weekly)
+
+
+# Analysis shared by both aggregation paths
+
+def _r1(value) -> float:
+    return round(float(value), 1)
+
+
+def _ratio(part, whole) -> float:
+    return round(float(part) / float(whole), 3) if whole else 0.0
+
+
+def classify(athlete: Dict) -> str:
+    if athlete['avg_km'] >= 40 and athlete['consistency'] >= 0.75:
+        return 'Chủ lực'
+    if athlete['consistency'] >= 0.75:
+        return 'Bền bỉ'
+    if athlete['trend'] is not None and athlete['trend'] >= 0.2:
+        return 'Tăng tốc'
+    if athlete['consistency'] < 0.4:
+        return 'Cần động lực'
+    return 'Đang phát triển'
+
+
+def recommend(athlete: Dict) -> List[str]:
+    """Personal recommendations in Vietnamese, most important first"""
+    tips = []
+    if athlete['weeks_active'] >= 3 and athlete['last2_km'] == 0:
+        tips.append('Chưa có buổi chạy nào trong 2 tuần gần nhất — bắt đầu lại với 2-3 buổi chạy nhẹ.')
+    if athlete['goal_weeks'] >= 3 and athlete['completion_rate'] < 0.5:
+        tips.append(f"Chỉ hoàn thành {athlete['completion_rate']:.0%} số tuần đăng ký — cân nhắc mục tiêu "
+                    f"khoảng {max(5, round(athlete['avg_km'] / 5) * 5)} km/tuần.")
+    elif athlete['goal_weeks'] >= 3 and athlete['completion_rate'] == 1 and athlete['avg_km'] >= 1.5 * athlete['avg_goal']:
+        tips.append(f"Luôn vượt xa mục tiêu {athlete['avg_goal']:.0f} km — có thể nâng lên khoảng "
+                    f"{round(athlete['avg_km'] / 5) * 5} km/tuần.")
+    if athlete['trend'] is not None and athlete['trend'] <= -0.3:
+        tips.append(f"Quãng đường {RECENT_WEEKS} tuần gần đây giảm {-athlete['trend']:.0%} so với trước — "
+                    f"giữ nhịp đều thay vì dồn vào cuối tuần.")
+    if athlete['weeks_active'] and athlete['total_runs'] / athlete['weeks_active'] < 2:
+        tips.append('Trung bình dưới 2 buổi/tuần — thêm một buổi chạy nhẹ giúp tăng sức bền.')
+    return tips or ['Duy trì nhịp tập hiện tại.']
+
+
+def build_report(rows: List[Dict], weeks: List[date], engine: Optional[str] = None) -> Dict:
+    """Analytics of the covered weeks, JSON-serializable"""
+    recent_start = weeks[-RECENT_WEEKS] if len(weeks) > RECENT_WEEKS else weeks[0]
+    last2_start = weeks[-2] if len(weeks) > 1 else weeks[0]
+    previous_weeks = len(weeks) - RECENT_WEEKS if len(weeks) > RECENT_WEEKS else 0
+    sums_by_athlete, sums_by_week = aggregate(rows, recent_start, last2_start, engine)
+
+    athletes = []
+    for user_id, sums in sums_by_athlete.items():
+        weeks_active = int(sums['weeks_active'])
+        recent_avg = sums['recent_km'] / min(RECENT_WEEKS, len(weeks))
+        previous_avg = (sums['total_km'] - sums['recent_km']) / previous_weeks if previous_weeks else 0.0
+        athlete = {
+            'user_id': int(user_id),
+            'name': f"{sums['first_name']} {sums['last_name'] or ''}".strip(),
+            'username': sums['username'],
+            'weeks_active': weeks_active,
+            'total_km': _r1(sums['total_km']),
+            'avg_km': _r1(sums['total_km'] / weeks_active) if weeks_active else 0.0,
+            'total_runs': int(sums['total_runs']),
+            'elevation': _r1(sums['elevation']),
+            'avg_pace': round(sums['pace_weighted'] / sums['pace_km']) if sums['pace_km'] else 0,
+            'goal_weeks': int(sums['goal_weeks']),
+            'avg_goal': _r1(sums['goal_sum'] / sums['goal_weeks']) if sums['goal_weeks'] else 0.0,
+            'completion_rate': _ratio(sums['completed'], sums['goal_weeks']),
+            'consistency': _ratio(weeks_active, len(weeks)),
+            'recent_avg_km': _r1(recent_avg),
+            'previous_avg_km': _r1(previous_avg),
+            'trend': round(recent_avg / previous_avg - 1, 3) if previous_avg > 0 else None,
+            'last2_km': _r1(sums['last2_km'])
+        }
+        athlete['category'] = classify(athlete)
+        athlete['recommendations'] = recommend(athlete)
+        athletes.append(athlete)
+    athletes.sort(key=lambda a: (-a['total_km'], a['name']))
+
+    weekly = []
+    for week in weeks:
+        sums = sums_by_week.get(week)
+        weekly.append({
+            'week': week.isoformat(),
+            'athletes': int(sums['athletes']) if sums else 0,
+            'total_km': _r1(sums['total_km']) if sums else 0.0,
+            'avg_km': _r1(sums['total_km'] / sums['athletes']) if sums and sums['athletes'] else 0.0,
+            'total_runs': int(sums['total_runs']) if sums else 0,
+            'completion_rate': _ratio(sums['completed'], sums['goal_weeks']) if sums else 0.0
+        })
+
+    categories = {category: 0 for category in CATEGORIES}
+    for athlete in athletes:
+        categories[athlete['category']] += 1
+    total_goal_weeks = sum(int(s['goal_weeks']) for s in sums_by_week.values())
+    active_weeks = sum(a['weeks_active'] for a in athletes)
+    return {
+        'weeks': [week.isoformat() for week in weeks],
+        'summary': {
+            'athletes': len(athletes),
+            'active_athletes': sum(1 for a in athletes if a['weeks_active']),
+            'total_km': _r1(sum(a['total_km'] for a in athletes)),
+            'total_runs': sum(a['total_runs'] for a in athletes),
+            'total_elevation': _r1(sum(a['elevation'] for a in athletes)),
+            'avg_km_per_active_week': _r1(sum(a['total_km'] for a in athletes) / active_weeks) if active_weeks else 0.0,
+            'completion_rate': _ratio(sum(int(s['completed']) for s in sums_by_week.values()), total_goal_weeks)
+        },
+        'weekly': weekly,
+        'categories': categories,
+        'athletes': athletes,
+        'insights': {
+            'at_risk': [a for a in athletes if a['weeks_active'] >= 3 and a['last2_km'] == 0][:20],
+            'improvers': sorted((a for a in athletes if a['trend'] is not None and a['recent_avg_km'] >= 10),
+                                key=lambda a: -a['trend'])[:10],
+            'raise_goal': [a for a in athletes if a['goal_weeks'] >= 3 and a['completion_rate'] == 1
+                           and a['avg_km'] >= 1.5 * a['avg_goal']][:20],
+            'lower_goal': [a for a in athletes if a['goal_weeks'] >= 3 and a['completion_rate'] < 0.5][:20],
+            'top_distance': athletes[:10],
+            'top_elevation': sorted(athletes, key=lambda a: -a['elevation'])[:10]
+        }
+    }
+
+
+# Output
+
+def _write_atomic(path: str, content: str):
+    _write_bytes_atomic(path, content.encode('utf-8'))
+
+
+def _write_bytes_atomic(path: str, content: bytes):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _write_with_siblings(path: str, content: str):
+    """Write a report file, then its .br/.gz copies so /reports/view can send them as-is"""
+    data = content.encode('utf-8')
+    _write_bytes_atomic(path, data)
+    for encoding in compression.available_encodings():
+        _write_bytes_atomic(path + reports_manifest.PRECOMPRESSED_SUFFIXES[encoding],
+                            compression.compress_bytes(data, encoding))
+
+
+def write_report(report_type: str, analytics: Dict, html: str, data_path: str) -> List[str]:
+    """Write the HTML report and its JSON data; returns paths relative to data_path"""
+    spec = REPORTS[report_type]
+    folder = os.path.join(data_path, spec['folder'])
+    os.makedirs(folder, exist_ok=True)
+    _write_with_siblings(os.path.join(folder, f"{spec['basename']}.html"), html)
+    _write_with_siblings(os.path.join(folder, f"{spec['basename']}.json"),
+                         json.dumps(analytics, ensure_ascii=False, indent=2))
+    return [f"{spec['folder']}/{spec['basename']}.html", f"{spec['folder']}/{spec['basename']}.json"]
+
+
+def generate(report_type: str, database_url: Optional[str], data_path: str, jinja_env,
+             end_week: date, generated_at: Optional[datetime] = None, key: Optional[str] = None) -> Dict:
+    """Query, analyse, render and write one report; returns its metadata"""
+    spec = REPORTS[report_type]
+    started = time.perf_counter()
+    weeks = report_weeks(end_week)
+    with query_log.unit(f"report.{report_type}"):
+        conn = db_pool.get_connection(database_url)
+        try:
+            rows = load_rows(conn.cursor(), weeks)
+        finally:
+            conn.close()
+    loaded = time.perf_counter()
+
+    analytics = build_report(rows, weeks)
+    engine = 'pandas' if pandas_module() is not None else 'python'
+    analytics['meta'] = {
+        'report': report_type,
+        'title': spec['title'],
+        'generated_at': (generated_at or datetime.now()).isoformat(timespec='seconds'),
+        'engine': engine,
+        'rows': len(rows),
+        'data_key': key,
+        'query_ms': round((loaded - started) * 1000, 1),
+        'analysis_ms': round((time.perf_counter() - loaded) * 1000, 1)
+    }
+    html = jinja_env.get_template(spec['template']).render(report=spec, analytics=analytics)
+    files = write_report(report_type, analytics, html, data_path)
+    duration = time.perf_counter() - started
+    REPORT_SECONDS.observe(duration, report=report_type)
+    return dict(analytics['meta'], files=files, duration_ms=round(duration * 1000, 1))
+
+
+# Background jobs
+
+class ReportJobs:
+    """Runs report generation in a thread pool and records job status on disk"""
+
+    def __init__(self, database_url: Optional[str], data_path: str, jinja_env,
+                 on_generated: Optional[Callable[[], None]] = None, workers: int = REPORT_WORKERS):
+        self.database_url = database_url
+        self.data_path = data_path
+        self.jinja_env = jinja_env
+        self.on_generated = on_generated
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def jobs_path(self) -> str:
+        return os.path.join(self.data_path, JOBS_FOLDER)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Created lazily per process: threads do not survive the gunicorn fork
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _save(self, job: Dict):
+        os.makedirs(self.jobs_path, exist_ok=True)
+        _write_atomic(os.path.join(self.jobs_path, f"{job['id']}.json"), json.dumps(job, ensure_ascii=False))
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Job status from any worker, None for unknown or malformed ids"""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.jobs_path, f"{job_id}.json"), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def week_versions(self, weeks: List[date]) -> Dict[date, int]:
+        conn = db_pool.get_connection(self.database_url)
+        try:
+            return leaderboard.get_week_versions(conn.cursor(), weeks[0], weeks[-1])
+        finally:
+            conn.close()
+
+    def current(self, report_type: str) -> Optional[Dict]:
+        """Metadata of the last report built, with the data key it was built from"""
+        try:
+            with open(os.path.join(self.jobs_path, f"{report_type}.current"), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _is_fresh(self, current: Optional[Dict], key: str) -> bool:
+        return (current is not None and current.get('data_key') == key
+                and all(os.path.exists(os.path.join(self.data_path, path)) for path in current['files']))
+
+    def submit(self, report_type: str, end_week: date, generated_at: Optional[datetime] = None) -> Dict:
+        """
+        The finished report when its data did not change since it was built,
+        else the job already rebuilding it, else a new job
+        """
+        if report_type not in REPORTS:
+            raise ValueError(f"Unknown report type: {report_type}")
+        weeks = report_weeks(end_week)
+        key = data_key(report_type, weeks, self.week_versions(weeks))
+        current = self.current(report_type)
+        if self._is_fresh(current, key):
+            REPORT_REQUESTS.inc(report=report_type, result='fresh')
+            return {'id': current['job_id'], 'report': report_type, 'state': 'success',
+                    'cached': True, 'result': current}
+
+        job = {
+            'id': f"{datetime.now().strftime('%Y%m%dT%H%M%S')}_{report_type}_{uuid.uuid4().hex[:6]}",
+            'report': report_type,
+            'state': 'pending',
+            'data_key': key,
+            'submitted_at': datetime.now().isoformat(timespec='seconds')
+        }
+        # Saved before claiming, so whoever finds the lock can read the holder's status
+        self._save(job)
+        running = self._claim(report_type, job['id'])
+        if running is not None:
+            os.remove(os.path.join(self.jobs_path, f"{job['id']}.json"))
+            REPORT_REQUESTS.inc(report=report_type, result='coalesced')
+            return running
+        REPORT_REQUESTS.inc(report=report_type, result='rebuild')
+        self._get_executor().submit(self._run, job, end_week, generated_at)
+        self._prune()
+        return job
+
+    def _lock_path(self, report_type: str) -> str:
+        return os.path.join(self.jobs_path, f"{report_type}.lock")
+
+    def _lock_holder(self, report_type: str) -> Optional[Dict]:
+        """The unfinished job holding the lock; None when the lock is free or stale"""
+        path = self._lock_path(report_type)
+        try:
+            with open(path, encoding='utf-8') as f:
+                job_id = f.read().strip()
+            age = time.time() - os.path.getmtime(path)
+        except OSError:
+            return None
+        job = self.status(job_id)
+        if job is not None and job['state'] in ('pending', 'running') and age < REPORT_LOCK_SECONDS:
+            return job
+        return None
+
+    def _claim(self, report_type: str, job_id: str) -> Optional[Dict]:
+        """Take the report's lock for job_id; returns the running job instead when another holds it"""
+        path = self._lock_path(report_type)
+        # The id is written first and the lock published with link(), which fails if it
+        # exists: a concurrent claim never reads a lock without its holder's id
+        temp_path = f"{path}.{job_id}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(job_id)
+        try:
+            for _ in range(2):
+                try:
+                    os.link(temp_path, path)
+                except FileExistsError:
+                    holder = self._lock_holder(report_type)
+                    if holder is not None:
+                        return holder
+                    # Left by a finished, failed or crashed job
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                    continue
+                return None
+            return self._lock_holder(report_type)
+        finally:
+            os.remove(temp_path)
+
+    def _release(self, report_type: str, job_id: str):
+        path = self._lock_path(report_type)
+        try:
+            with open(path, encoding='utf-8') as f:
+                if f.read().strip() != job_id:
+                    return
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _run(self, job: Dict, end_week: date, generated_at: Optional[datetime]):
+        job = dict(job, state='running', started_at=datetime.now().isoformat(timespec='seconds'))
+        self._save(job)
+        try:
+            result = generate(job['report'], self.database_url, self.data_path, self.jinja_env,
+                              end_week, generated_at, job['data_key'])
+            _write_atomic(os.path.join(self.jobs_path, f"{job['report']}.current"),
+                          json.dumps(dict(result, job_id=job['id']), ensure_ascii=False))
+            job.update(state='success', result=result)
+            REPORT_RUNS.inc(report=job['report'], result='success')
+            logger.info(f"Report {job['report']} built in {result['duration_ms']}ms "
+                        f"({result['rows']} rows, {result['engine']})")
+            if self.on_generated:
+                self.on_generated()
+        except Exception as e:
+            job.update(state='error', error=str(e))
+            REPORT_RUNS.inc(report=job['report'], result='error')
+            logger.error(f"Report {job['report']} failed: {e}", exc_info=True)
+        job['finished_at'] = datetime.now().isoformat(timespec='seconds')
+        self._release(job['report'], job['id'])
+        self._save(job)
+        return job
+
+    def _prune(self):
+        """Keep the status files of the newest REPORT_JOB_RETAIN jobs"""
+        try:
+            names = sorted(name for name in os.listdir(self.jobs_path)
+                           if name.endswith('.json') and JOB_ID_PATTERN.match(name[:-len('.json')]))
+        except OSError:
+            return
+        for name in names[:-REPORT_JOB_RETAIN]:
+            try:
+                os.remove(os.path.join(self.jobs_path, name))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Reports Manifest for the Running Challenge App
+Keeps the listing of the report files in .data in process memory. A folder
+is listed again only when its mtime changes (a report was added, removed or
+renamed), and a file's metadata is rebuilt only when its size or mtime
+changes, so /reports no longer stats every file on every page view. Files
+rewritten in place do not touch the folder mtime; they are picked up by the
+periodic revalidation or an explicit invalidate().
+
+send_report() serves one report file straight from disk: conditional
+(ETag/Last-Modified) and Range requests are handled by werkzeug, the body
+goes out through the WSGI file wrapper (sendfile under gunicorn) and an
+up-to-date .br/.gz sibling is preferred when the client accepts it.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from flask import request, send_file
+from werkzeug.security import safe_join
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+REPORTS_MANIFEST_CHECK_SECONDS = float(os.getenv('REPORTS_MANIFEST_CHECK_SECONDS', '2'))
+REPORTS_MANIFEST_REVALIDATE_SECONDS = float(os.getenv('REPORTS_MANIFEST_REVALIDATE_SECONDS', '300'))
+
+# .data subfolder -> key of the reports page section
+REPORT_CATEGORIES = {
+    'enhanced_interactive_report': 'interactive_reports',
+    'performance_analysis': 'performance_analysis',
+    'user_insights': 'user_insights',
+    'weekly_reports': 'weekly_reports'
+}
+REPORT_EXTENSIONS = ('.html', '.json')
+REPORT_MIMETYPES = {'.html': 'text/html', '.json': 'application/json'}
+# Content-Encoding -> suffix of the precompressed sibling, in server preference order
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+MANIFEST_SCANS = metrics.counter(
+    'reports_manifest_scans_total', 'Report folder listings by reason',
+    ('reason',))
+
+FILE_DESCRIPTIONS = {
+    'bao_cao_strava_tuong_tac.html': 'Báo cáo tương tác tiếng Việt với biểu đồ, phân loại vận động viên và khuyến nghị cá nhân hóa',
+    'strava_enhanced_analysis.html': 'Phân tích hiệu suất chi tiết với khuyến nghị cá nhân, so sánh cộng đồng và xu hướng',
+    'actionable_insights_summary.html': 'Tóm tắt khuyến nghị thông minh và hành động cụ thể cho HLV và vận động viên',
+    'strava_analysis_report.html': 'Báo cáo tổng quan hiệu suất hàng tuần với thống kê cơ bản và bảng xếp hạng'
+}
+
+
+def format_file_size(size_bytes):
+    """Format file size in human readable format"""
+    if size_bytes < 1024:
+        return f"{size_bytes} B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f} KB"
+    else:
+        return f"{size_bytes / (1024 * 1024):.1f} MB"
+
+
+def get_file_description(filename):
+    """Get description for different report files"""
+    if filename.startswith('tong_ket_tuan_'):
+        return 'Tổng kết tuần (số người chạy, tổng km, tỷ lệ hoàn thành) được tạo sau mỗi lần crawl'
+    return FILE_DESCRIPTIONS.get(filename, 'Báo cáo phân tích hiệu suất chạy bộ')
+
+
+def describe_file(folder: str, name: str, stat: os.stat_result) -> Dict:
+    """Metadata of one report file as shown on the reports page"""
+    return {
+        'name': name,
+        'path': f"{folder}/{name}",
+        'size': format_file_size(stat.st_size),
+        'size_bytes': stat.st_size,
+        'modified': datetime.fromtimestamp(stat.st_mtime).strftime('%d/%m/%Y %H:%M'),
+        'modified_at': stat.st_mtime,
+        'type': 'HTML Report' if name.endswith('.html') else 'JSON Data',
+        'description': get_file_description(name)
+    }
+
+
+class _FolderListing:
+    """Files of one category folder, keyed by name with the stat they were built from"""
+
+    def __init__(self, mtime_ns: Optional[int], files: Dict[str, Tuple[Tuple[int, int], Dict]]):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        # Newest first; ties (same second) in name order so the page is stable
+        self.reports = sorted((meta for _, meta in files.values()),
+                              key=lambda meta: (-meta['modified_at'], meta['name']))
+
+
+class ReportsManifest:
+    """Cached, categorised listing of the report files under one .data folder"""
+
+    def __init__(self, data_path: str, check_seconds: float = REPORTS_MANIFEST_CHECK_SECONDS,
+                 revalidate_seconds: float = REPORTS_MANIFEST_REVALIDATE_SECONDS):
+        self.data_path = data_path
+        self.check_seconds = check_seconds
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._folders: Dict[str, _FolderListing] = {}
+        self._checked_at: Optional[float] = None
+        self._revalidated_at = 0.0
+
+    def get(self) -> Dict:
+        """Reports by category, newest first; {'error': ...} is added when the folder cannot be read"""
+        with self._lock:
+            try:
+                self._update()
+            except OSError as e:
+                logger.error(f"Error scanning reports folder: {str(e)}")
+                self._checked_at = None
+                reports = self._snapshot()
+                reports['error'] = str(e)
+                return reports
+            return self._snapshot()
+
+    def invalidate(self):
+        """Revalidate every file on the next get(), e.g. after a report was regenerated"""
+        with self._lock:
+            self._checked_at = None
+            self._revalidated_at = 0.0
+
+    def _snapshot(self) -> Dict:
+        # Listings are replaced, never mutated, so sharing the lists is safe
+        reports = {category: [] for category in REPORT_CATEGORIES.values()}
+        for folder, category in REPORT_CATEGORIES.items():
+            listing = self._folders.get(folder)
+            if listing is not None:
+                reports[category] = listing.reports
+        return reports
+
+    def _update(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_seconds:
+            return
+        revalidate = now - self._revalidated_at >= self.revalidate_seconds
+        for folder in REPORT_CATEGORIES:
+            folder_path = os.path.join(self.data_path, folder)
+            try:
+                mtime_ns = os.stat(folder_path).st_mtime_ns
+            except FileNotFoundError:
+                mtime_ns = None
+            listing = self._folders.get(folder)
+            if listing is None:
+                reason = 'initial'
+            elif listing.mtime_ns != mtime_ns:
+                reason = 'folder_changed'
+            elif revalidate:
+                reason = 'revalidate'
+            else:
+                continue
+            MANIFEST_SCANS.inc(reason=reason)
+            self._folders[folder] = self._scan(folder, folder_path, mtime_ns, listing)
+        if revalidate:
+            self._revalidated_at = now
+        self._checked_at = now
+
+    @staticmethod
+    def _scan(folder: str, folder_path: str, mtime_ns: Optional[int],
+              previous: Optional[_FolderListing]) -> _FolderListing:
+        """List a folder, reusing the metadata of files whose size and mtime did not change"""
+        files = {}
+        if mtime_ns is not None:
+            known = previous.files if previous is not None else {}
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(REPORT_EXTENSIONS):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    key = (stat.st_mtime_ns, stat.st_size)
+                    cached = known.get(entry.name)
+                    meta = cached[1] if cached is not None and cached[0] == key else describe_file(folder, entry.name, stat)
+                    files[entry.name] = (key, meta)
+        return _FolderListing(mtime_ns, files)
+
+
+def precompressed_sibling(path: str, accept_encodings) -> Optional[Tuple[str, str]]:
+    """(encoding, path) of the best .br/.gz copy the client accepts, ignoring copies older than the file"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    siblings = {}
+    for encoding, suffix in PRECOMPRESSED_SUFFIXES.items():
+        try:
+            if os.stat(path + suffix).st_mtime_ns >= mtime_ns:
+                siblings[encoding] = path + suffix
+        except OSError:
+            continue
+    if not siblings:
+        return None
+    best = accept_encodings.best_match(list(siblings))
+    if best and accept_encodings.quality(best) > 0:
+        return best, siblings[best]
+    return None
+
+
+def send_report(data_path: str, report_path: str):
+    """Stream a report file with ETag, Range and precompressed variants; never loads it into memory"""
+    mimetype = REPORT_MIMETYPES.get(os.path.splitext(report_path)[1])
+    if mimetype is None:
+        return "Unsupported file type", 400
+    full_path = safe_join(data_path, report_path)
+    if full_path is None or not os.path.isfile(full_path):
+        return "Report not found", 404
+
+    sibling = precompressed_sibling(full_path, request.accept_encodings)
+    if sibling is not None:
+        # Each variant is its own file, so it gets its own ETag and byte ranges
+        response = send_file(sibling[1], mimetype=mimetype, conditional=True, etag=True)
+        response.headers['Content-Encoding'] = sibling[0]
+    else:
+        response = send_file(full_path, mimetype=mimetype, conditional=True, etag=True)
+    # Reports are regenerated in place: always revalidate, the ETag makes that a 304
+    response.cache_control.no_cache = True
+    response.vary.add('Accept-Encoding')
+    return response
@@ -1,90 +1,138 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
-from datetime import datetime, timedelta
-import pytz
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, g, has_request_context, Response
+from flask import before_render_template, template_rendered, stream_with_context
+from jinja2 import FileSystemBytecodeCache
+from datetime import datetime, timedelta, timezone
 import psycopg2
 import psycopg2.extras
 import os
 from werkzeug.security import generate_password_hash
 import logging
-from logging.handlers import TimedRotatingFileHandler
 from dotenv import load_dotenv
-import io
-import subprocess
+import time
 import json
+import itertools
+import db_pool
+import leaderboard
+import report_engine
+import export
+import post_crawl
+from live_updates import LeaderboardBroker, diff_rows, parse_event_id, sse_stream
+from leaderboard_cache import LeaderboardCache
+from reports_manifest import ReportsManifest, send_report
+import metrics
+import static_assets
+import compression
+import health
+import profiling
+import query_log
+from app_logging import setup_logging, should_log_access, log_access, recent_crawler_events, capture_logs
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'dev-key-only-not-for-production')
+# Compiled templates are kept on disk, shared by workers and reused after restarts
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(os.getenv('JINJA_CACHE_DIR') or None)
+static_assets.init_app(app)
 
 # Timezone configuration for UTC+7 (Vietnam/Ho Chi Minh)
-VIETNAM_TZ = pytz.timezone('Asia/Ho_Chi_Minh')
-UTC_TZ = pytz.UTC
+# Vietnam has no DST, so a fixed offset is exact (pytz.timezone() scanned the whole
+# tz database at import and pytz was never a declared dependency)
+VIETNAM_TZ = timezone(timedelta(hours=7), 'Asia/Ho_Chi_Minh')
+UTC_TZ = timezone.utc
 
 # Configuration
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")  # Password for registration access
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Optional bearer token for /metrics
 DATABASE_URL = os.getenv('DATABASE_URL')
 LOG_DIR = os.getenv('LOG_DIR', os.path.dirname(os.path.abspath(__file__)))
 LOG_FILE = os.path.join(LOG_DIR, '.log')
 
-# Set up logging with 7-day rotation
-def setup_logging():
-    """Configure logging with file rotation (7 days)"""
-    # Create log directory if it doesn't exist
-    os.makedirs(LOG_DIR, exist_ok=True)
-    
-    # Create logger
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    # Clear existing handlers
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
-    
-    # Create file handler with daily rotation, keep 7 days
-    file_handler = TimedRotatingFileHandler(
-        LOG_FILE,
-        when='midnight',
-        interval=1,
-        backupCount=7,
-        encoding='utf-8'
-    )
-    file_handler.setLevel(logging.INFO)
-    
-    # Create console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
+# Initialize logging (7-day rotation, written by a background thread)
+logger = setup_logging(LOG_FILE)
 
-# Initialize logging
-logger = setup_logging()
-
-# Log Flask app startup
 @app.before_request
 def log_request():
-    """Log each request for debugging"""
-    logger.info(f"Request: {request.method} {request.url} - IP: {request.remote_addr} - User-Agent: {request.headers.get('User-Agent', 'Unknown')}")
+    """Remember when the request started for the access log"""
+    g.request_started = time.perf_counter()
 
 @app.after_request 
 def log_response(response):
-    """Log response status for debugging"""
-    logger.info(f"Response: {response.status_code} for {request.method} {request.url}")
+    """Queue one structured (optionally sampled) access log record"""
+    started = g.get('request_started')
+    duration_ms = (time.perf_counter() - started) * 1000 if started else 0.0
+    if request.endpoint in health.PROBE_ENDPOINTS and response.status_code < 400:
+        return response  # successful probes every few seconds are noise
+    if should_log_access(response.status_code, duration_ms):
+        log_access({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 1),
+            'ip': request.remote_addr,
+            'user_agent': request.headers.get('User-Agent', 'Unknown')
+        })
     return response
 
+# Request instrumentation: SQL timings for /metrics, statement fingerprints
+# per request, slow-query log with EXPLAIN and N+1 warnings (query_log.py)
+query_log.install()
+
+@app.before_request
+def start_request_metrics():
+    """Start accounting DB activity for this request"""
+    metrics.ensure_flusher()
+    metrics.begin_unit(request.endpoint or 'unknown')
+
+@app.after_request
+def record_request_metrics(response):
+    """Record latency and DB usage of the finished request"""
+    endpoint = request.endpoint or 'unknown'
+    started = g.get('request_started')
+    if started:
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                        method=request.method, status=response.status_code)
+    stats = metrics.current_unit()
+    if stats is not None:
+        metrics.REQUEST_DB_QUERIES.observe(stats.db_queries, endpoint=endpoint)
+        metrics.REQUEST_DB_SECONDS.observe(stats.db_seconds, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def end_request_metrics(exc):
+    """Detach the accounting so pooled threads start clean"""
+    query_log.report_unit(metrics.end_unit())
+
+def _template_render_started(sender, template, context, **extra):
+    g.setdefault('template_render_started', []).append(time.perf_counter())
+
+def _template_render_finished(sender, template, context, **extra):
+    starts = g.get('template_render_started')
+    if starts:
+        elapsed = time.perf_counter() - starts.pop()
+        metrics.TEMPLATE_RENDER_SECONDS.observe(elapsed, template=template.name or 'inline')
+        g.template_seconds = g.get('template_seconds', 0.0) + elapsed
+
+before_render_template.connect(_template_render_started, app)
+template_rendered.connect(_template_render_finished, app)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# Registered after the other after_request hooks so it runs first and the
+# recorded latency includes compression time
+compression.init_app(app)
+
+# Liveness/readiness probes for Docker, deploy.sh and DockerManager
+health.init_app(app, DATABASE_URL)
+
+# Admins can profile a single request with ?_profile=1 (see /admin/profiles)
+profiling.init_app(app, lambda: 'authenticated' in session)
+
 def init_db():
     """Initialize the database with required tables"""
     try:
@@ -160,6 +208,9 @@ def init_db():
             )
         ''')
         
+        logger.info("Creating leaderboard version tracking...")
+        leaderboard.ensure_schema(cursor)
+        
         conn.commit()
         cursor.close()
         conn.close()
@@ -169,16 +220,25 @@ def init_db():
         raise
 
 def get_db_connection():
-    """Get database connection"""
+    """Get a pooled database connection (close() returns it to the pool)"""
     try:
-        conn = psycopg2.connect(DATABASE_URL)
-        conn.cursor_factory = psycopg2.extras.RealDictCursor
-        logger.debug("Database connection established successfully")
+        conn = db_pool.get_connection(DATABASE_URL)
+        if has_request_context():
+            # Remember checkouts so early returns cannot leak pool slots
+            g.setdefault('db_connections', []).append(conn)
+        logger.debug("Database connection checked out from pool")
         return conn
     except Exception as e:
         logger.error(f"Failed to connect to database: {str(e)}")
         raise
 
+@app.teardown_request
+def release_db_connections(exc):
+    """Return any connections a view forgot to close back to the pool"""
+    for conn in g.pop('db_connections', []):
+        if not conn.closed:
+            conn.close()
+
 def get_vietnam_time():
     """Get current time in Vietnam timezone (UTC+7)"""
     return datetime.now(VIETNAM_TZ)
@@ -198,7 +258,7 @@ def format_vietnam_time(dt, format_str='%d/%m/%Y %H:%M:%S'):
     
     # If datetime is naive, assume it's UTC
     if dt.tzinfo is None:
-        dt = UTC_TZ.localize(dt)
+        dt = dt.replace(tzinfo=UTC_TZ)
     
     # Convert to Vietnam timezone
     vietnam_dt = dt.astimezone(VIETNAM_TZ)
@@ -239,37 +299,74 @@ def create_or_update_challenge(user_id, distance_goal):
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Check if challenge exists
+    # Check if challenge exists (and whether the goal actually changes)
     cursor.execute('''
-        SELECT * FROM weekly_challenges 
+        SELECT *, distance_goal IS DISTINCT FROM %s::real AS changed
+        FROM weekly_challenges 
         WHERE user_id = %s AND start_date = %s
-    ''', (user_id, week_start))
+    ''', (distance_goal, user_id, week_start))
     existing = cursor.fetchone()
     
     if existing:
         # Update existing challenge
+        data_version = leaderboard.bump_week_version(cursor, week_start) if existing['changed'] else existing['data_version']
         cursor.execute('''
             UPDATE weekly_challenges 
-            SET distance_goal = %s, updated_at = CURRENT_TIMESTAMP
+            SET distance_goal = %s, updated_at = CURRENT_TIMESTAMP, data_version = %s
             WHERE user_id = %s AND start_date = %s
-        ''', (distance_goal, user_id, week_start))
+        ''', (distance_goal, data_version, user_id, week_start))
     else:
         # Create new challenge
+        data_version = leaderboard.bump_week_version(cursor, week_start)
         cursor.execute('''
             INSERT INTO weekly_challenges 
-            (user_id, start_date, end_date, distance_goal)
-            VALUES (%s, %s, %s, %s)
-        ''', (user_id, week_start, week_end, distance_goal))
+            (user_id, start_date, end_date, distance_goal, data_version)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', (user_id, week_start, week_end, distance_goal, data_version))
     
+    leaderboard.notify_leaderboard_changed(cursor, week_start)
     conn.commit()
     cursor.close()
     conn.close()
+    week_cache.invalidate(week_start)
 
 @app.route('/')
 def home():
     """Home page redirects to weekly results"""
     return redirect(url_for('weekly_results'))
 
+def load_week_leaderboard(week_start):
+    """Query everything the weekly results page shows for one week"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        current_week_start, _ = get_current_week_range()
+        logger.info(f"Fetching leaderboard for week {week_start}...")
+        week_data = leaderboard.load_week(cursor, week_start, current_week_start)
+        logger.info(f"Found {len(week_data['results'])} leaderboard rows, "
+                    f"{len(week_data['available_weeks'])} available weeks, last update {week_data['last_update']}")
+        cursor.close()
+    finally:
+        conn.close()
+    return week_data
+
+week_cache = LeaderboardCache(load_week_leaderboard)
+
+def prime_current_week():
+    """Warmup step: load the current week so the first visitor hits the cache"""
+    week_start, _ = get_current_week_range()
+    return f"{len(week_cache.get(week_start).value['results'])} rows for {week_start}"
+
+health.add_warmup_step('leaderboard_cache', prime_current_week)
+
+def invalidate_week_cache(week_start):
+    """Drop cached weeks when the leaderboard changes (None: all weeks); reload the current and last week at once"""
+    week_cache.invalidate(week_start)
+    current_week_start, _ = get_current_week_range()
+    for week in (current_week_start, current_week_start - timedelta(days=7)):
+        if week_start is None or week_start == week:
+            week_cache.refresh(week)
+
 @app.route('/weekly-results')
 def weekly_results():
     """Display weekly challenge results with optional week filter"""
@@ -293,113 +390,168 @@ def weekly_results():
             week_start, week_end = get_current_week_range()
             logger.info(f"Using current week: {week_start} to {week_end}")
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get available weeks for the filter dropdown
-        logger.info("Fetching available weeks for filter dropdown...")
-        cursor.execute('''
-            SELECT DISTINCT start_date, end_date 
-            FROM weekly_challenges 
-            ORDER BY start_date DESC
-            LIMIT 10
-        ''')
-        available_weeks_raw = cursor.fetchall()
-        logger.info(f"Found {len(available_weeks_raw)} available weeks")
-        
-        # Convert string dates to date objects for template
-        available_weeks = []
-        for week in available_weeks_raw:
-            start_date = week['start_date'] if isinstance(week['start_date'], datetime) else datetime.strptime(str(week['start_date']), '%Y-%m-%d').date()
-            end_date = week['end_date'] if isinstance(week['end_date'], datetime) else datetime.strptime(str(week['end_date']), '%Y-%m-%d').date()
-            available_weeks.append({
-                'start_date': start_date,
-                'end_date': end_date,
-                'start_date_str': str(week['start_date'])  # Keep string for form value
-            })
-        
-        # Get users with registered challenges
-        logger.info(f"Fetching registered challenges for week {week_start}...")
-        cursor.execute('''
-            SELECT u.first_name, u.last_name, u.username, u.is_external, 'https://www.strava.com/athletes/'||replace(u.username,'strava_','') AS strava_url,
-                   wc.distance_goal, wc.total_distance, wc.runs, 
-                   wc.average_pace, wc.elevation_gain,
-                   CASE WHEN COALESCE(wc.distance_goal,0)=0 THEN 0 ELSE 
-                    ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) END as progress_percentage,
-                   CASE 
-                       WHEN COALESCE(wc.distance_goal,0)=0 THEN 'Chạy chui'
-                       WHEN current_date > end_date and ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) < 100 THEN 'Đóng phạt'
-                       WHEN ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) < 100 THEN 'Cần bào thêm nữa'
-                       WHEN ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) BETWEEN 100 AND 120 THEN 'Hoàn thành kế hoạch'
-                       WHEN ROUND(CAST((wc.total_distance / wc.distance_goal) * 100 AS NUMERIC), 1) > 120 THEN 'Chạy hơi lố'
-                   END as status
-            FROM users u
-            JOIN weekly_challenges wc ON u.id = wc.user_id
-            WHERE wc.start_date = %s
-            ORDER BY case when COALESCE(wc.distance_goal,0)>0 then 0 else 1 end, 
-                       progress_percentage desc, wc.total_distance DESC
-        ''', (week_start,))
-        results = cursor.fetchall()
-        logger.info(f"Found {len(results)} registered challenges")
-        
-        # For current week only, show unregistered users
-        current_week_start, _ = get_current_week_range()
-        unregistered_users = []
-        if week_start == current_week_start:
-            logger.info("Fetching unregistered users for current week...")
-            cursor.execute('''
-                SELECT u.first_name, u.last_name, u.username, u.is_external,
-                       NULL as distance_goal, 
-                       NULL as total_distance, 
-                       NULL as runs,
-                       NULL as average_pace, 
-                       NULL as elevation_gain,
-                       NULL as progress_percentage,
-                       'Chạy chui' as status
-                FROM users u
-                WHERE u.id NOT IN (
-                    SELECT DISTINCT wc.user_id 
-                    FROM weekly_challenges wc 
-                    WHERE wc.start_date = %s
-                )
-                ORDER BY u.first_name
-            ''', (week_start,))
-            unregistered_users = cursor.fetchall()
-            logger.info(f"Found {len(unregistered_users)} unregistered users")
-        
-        # Combine results
-        all_results = list(results) + list(unregistered_users)
+        # Cached per week; concurrent misses share one load, expired entries refresh in the background
+        leaderboard_broker.start()  # LISTEN for changes so cached weeks are invalidated
+        try:
+            week_entry = week_cache.get(week_start)
+        except Exception as e:
+            # No cached or saved copy of this week: show an error page instead of redirecting
+            # to home, which redirects straight back here
+            logger.error(f"Leaderboard unavailable for week {week_start}: {str(e)}", exc_info=True)
+            flash('Không thể kết nối database. Vui lòng thử lại sau ít phút.', 'error')
+            return render_template('weekly_results.html',
+                                 results=[],
+                                 week_start=week_start,
+                                 week_end=week_end,
+                                 available_weeks=[],
+                                 selected_week=week_start.strftime('%Y-%m-%d'),
+                                 view_mode=view_mode,
+                                 last_update=None,
+                                 unavailable=True,
+                                 format_vietnam_time=format_vietnam_time), 503
+        
+        week_data = week_entry.value
+        all_results = week_data['results']
         logger.info(f"Total results to display: {len(all_results)}")
         
-        # Get last crawl success timestamp
-        logger.info("Fetching last crawl success timestamp...")
-        cursor.execute('''
-            SELECT MAX(updated_at) as last_update
-            FROM weekly_challenges 
-            WHERE start_date = %s
-        ''', (week_start,))
-        last_update_result = cursor.fetchone()
-        last_update = last_update_result['last_update'] if last_update_result and last_update_result['last_update'] else None
-        logger.info(f"Last update timestamp: {last_update}")
-        
-        cursor.close()
-        conn.close()
+        stale_since = None
+        if week_entry.degraded:
+            logger.warning(f"Serving degraded leaderboard for {week_start}: {week_entry.last_error}")
+            stale_since = format_vietnam_time(datetime.fromtimestamp(week_entry.loaded_at, UTC_TZ), '%H:%M:%S %d/%m/%Y')
         
         logger.info(f"Rendering weekly_results.html with view_mode: {view_mode}")
         return render_template('weekly_results.html', 
                              results=all_results, 
                              week_start=week_start, 
                              week_end=week_end,
-                             available_weeks=available_weeks,
+                             available_weeks=week_data['available_weeks'],
                              selected_week=week_start.strftime('%Y-%m-%d'),
                              view_mode=view_mode,
-                             last_update=last_update,
+                             last_update=week_data['last_update'],
+                             data_version=max((row.get('data_version') or 0 for row in all_results), default=0),
+                             stale_since=stale_since,
                              format_vietnam_time=format_vietnam_time)
     
     except Exception as e:
         logger.error(f"Error in weekly_results: {str(e)}", exc_info=True)
-        flash('Đã xảy ra lỗi khi tải kết quả. Vui lòng thử lại.', 'error')
-        return redirect(url_for('home'))
+        # Plain response: redirecting to home would bounce straight back here
+        return Response('Đã xảy ra lỗi khi tải kết quả. Vui lòng thử lại.', status=500,
+                        mimetype='text/plain')
+
+def render_leaderboard_event(week_start, version, rows, removed, order, results, last_update):
+    """Live update event: changed rows pre-rendered for both views, the ranking and quick stats"""
+    with app.app_context():
+        macros = app.jinja_env.get_template('_leaderboard_rows.html').module
+        changed = [{
+            'username': row['username'],
+            'table_html': str(macros.table_row(row)),
+            'card_html': str(macros.card(row))
+        } for row in rows]
+
+    return {
+        'week': str(week_start),
+        'version': version,
+        'changed': changed,
+        'removed': removed,
+        'order': order,
+        'summary': leaderboard.summarize(results),
+        'last_update': format_vietnam_time(last_update, '%d/%m/%Y lúc %H:%M:%S') if last_update else None
+    }
+
+def compute_leaderboard_delta(week_start, snapshot):
+    """Render the rows of a week that changed since the last broadcast"""
+    current_week_start, _ = get_current_week_range()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Read first: every row up to this version is visible to the queries below
+        version = leaderboard.get_week_version(cursor, week_start)
+        results = leaderboard.get_week_results(cursor, week_start, include_unregistered=week_start == current_week_start)
+        last_update = leaderboard.get_last_update(cursor, week_start)
+        cursor.close()
+    finally:
+        conn.close()
+
+    delta = diff_rows(snapshot, [dict(row) for row in results])
+    if not delta['changed'] and not delta['removed'] and not delta['order_changed']:
+        return None
+    return render_leaderboard_event(week_start, version, delta['changed'], delta['removed'], delta['order'],
+                                    results, last_update)
+
+def compute_leaderboard_replay(week_start, since):
+    """Rows of a week changed after data version `since`, as one event; None when the client is current"""
+    current_week_start, _ = get_current_week_range()
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        changes = leaderboard.get_changes_since(cursor, week_start, since)
+        if not changes['rows'] and not changes['full']:
+            cursor.close()
+            return None
+        results = leaderboard.get_week_results(cursor, week_start, include_unregistered=week_start == current_week_start)
+        last_update = leaderboard.get_last_update(cursor, week_start)
+        cursor.close()
+    finally:
+        conn.close()
+
+    return render_leaderboard_event(week_start, changes['version'], [dict(row) for row in changes['rows']], [],
+                                    changes['order'], results, last_update)
+
+leaderboard_broker = LeaderboardBroker(DATABASE_URL, compute_leaderboard_delta)
+leaderboard_broker.add_notification_listener(invalidate_week_cache)
+
+@app.route('/weekly-results/stream')
+def weekly_results_stream():
+    """Server-Sent Events stream of leaderboard deltas for one week"""
+    try:
+        week_start = datetime.strptime(request.args.get('week', ''), '%Y-%m-%d').date()
+    except ValueError:
+        week_start, _ = get_current_week_range()
+
+    subscriber = leaderboard_broker.subscribe(week_start)
+    if subscriber is None:
+        return jsonify({'success': False, 'message': 'Quá nhiều kết nối trực tiếp'}), 503, {'Retry-After': '60'}
+
+    # Reconnects send the last event id (the week's data version): replay what was missed.
+    # Subscribed first, so nothing published meanwhile is lost (a row may arrive twice).
+    replay = None
+    since = parse_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    if since is not None:
+        try:
+            replay = compute_leaderboard_replay(week_start, since)
+        except Exception as e:
+            logger.warning(f"Could not replay leaderboard changes since {since} for {week_start}: {e}")
+
+    return Response(sse_stream(leaderboard_broker, week_start, subscriber, replay),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/weekly-results/changes')
+def weekly_results_changes():
+    """Challenge rows of a week changed since data version `since` (JSON)"""
+    try:
+        week_start = datetime.strptime(request.args.get('week', ''), '%Y-%m-%d').date()
+    except ValueError:
+        week_start, _ = get_current_week_range()
+    since = request.args.get('since', 0, type=int)
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        changes = leaderboard.get_changes_since(cursor, week_start, since)
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        logger.error(f"Error in weekly_results_changes: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'message': 'Không thể tải dữ liệu thay đổi'}), 500
+
+    logger.info(f"Leaderboard changes for {week_start} since v{since}: {len(changes['rows'])} rows (v{changes['version']})")
+    return jsonify({
+        'success': True,
+        'week': str(week_start),
+        'since': since,
+        **changes
+    })
 
 @app.route('/register', methods=['GET', 'POST'])
 def register_challenge():
@@ -478,42 +630,24 @@ def sync_strava():
         
         logger.info("Importing crawler and setting up log capture...")
         
-        # Capture logs during crawler execution
-        log_capture = io.StringIO()
-        
-        # Create a custom handler to capture logs
-        log_handler = logging.StreamHandler(log_capture)
-        log_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(levelname)s - %(message)s',
-            datefmt='%H:%M:%S'
-        )
-        log_handler.setFormatter(formatter)
-        
-        # Add handler to root logger temporarily
-        root_logger = logging.getLogger()
-        root_logger.addHandler(log_handler)
-        
-        logger.info("Manual Strava sync triggered via web interface")
-        logger.info("Starting crawler execution...")
-        
-        # Run the crawler synchronously with detailed logging
-        logger.info("Calling get_new_data_if_needed(force_refresh=True)...")
-        runners = get_new_data_if_needed(force_refresh=True)
-        logger.info(f"Crawler execution completed. Result type: {type(runners)}, Length: {len(runners) if runners else 0}")
-        
-        # Log the actual runners data for debugging
-        if runners:
-            logger.info(f"First few runners: {runners[:2] if len(runners) >= 2 else runners}")
-        else:
-            logger.info("No runners data returned from crawler")
-        
-        # Remove the temporary handler
-        root_logger.removeHandler(log_handler)
+        # Capture only this request's logs; concurrent syncs stay separate
+        with capture_logs() as log_capture:
+            logger.info("Manual Strava sync triggered via web interface")
+            logger.info("Starting crawler execution...")
+            
+            # Run the crawler synchronously with detailed logging
+            logger.info("Calling get_new_data_if_needed(force_refresh=True)...")
+            runners = get_new_data_if_needed(force_refresh=True)
+            logger.info(f"Crawler execution completed. Result type: {type(runners)}, Length: {len(runners) if runners else 0}")
+            
+            # Log the actual runners data for debugging
+            if runners:
+                logger.info(f"First few runners: {runners[:2] if len(runners) >= 2 else runners}")
+            else:
+                logger.info("No runners data returned from crawler")
         
         # Get captured logs
         log_output = log_capture.getvalue()
-        log_capture.close()
         
         if runners and len(runners) > 0:
             message = f"Đã xử lý thành công {len(runners)} vận động viên từ Strava"
@@ -556,14 +690,9 @@ def sync_strava_status():
         last_update = result['last_update'] if result and result['last_update'] else None
         total_users = result['total_users'] if result else 0
         
-        # Read recent logs from file
-        recent_logs = ""
+        # Recent crawler events from the log file shared by all workers and the cron crawler
         try:
-            with open(LOG_FILE, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                # Get last 10 lines that contain crawler info
-                crawler_lines = [line for line in lines[-50:] if 'strava' in line.lower() or 'crawler' in line.lower() or 'sync' in line.lower()]
-                recent_logs = ''.join(crawler_lines[-10:])
+            recent_logs = ''.join(f"{line}\n" for line in recent_crawler_events(LOG_FILE, 10))
         except FileNotFoundError:
             recent_logs = "Log file không tồn tại"
         
@@ -571,7 +700,8 @@ def sync_strava_status():
             'success': True,
             'last_update': format_vietnam_time(last_update) if last_update else 'Chưa có',
             'total_users': total_users,
-            'recent_logs': recent_logs
+            'recent_logs': recent_logs,
+            'post_crawl': post_crawl.pipeline.last_run
         })
         
     except Exception as e:
@@ -673,6 +803,64 @@ def admin_feedback():
         flash('Đã xảy ra lỗi khi tải danh sách phản hồi.', 'error')
         return render_template('admin_feedback.html', authenticated=False)
 
+@app.route('/admin/profiles')
+def admin_profiles():
+    """List saved request profiles (admin only)"""
+    if 'authenticated' not in session:
+        return redirect(url_for('admin_feedback'))
+    return render_template('admin_profiles.html', profiles=profiling.list_profiles(),
+                           profile_dir=profiling.PROFILE_DIR, retain=profiling.PROFILE_RETAIN)
+
+@app.route('/admin/profiles/<profile_id>')
+def admin_profile_view(profile_id):
+    """Show a saved profile as a pstats report (admin only)"""
+    if 'authenticated' not in session:
+        return redirect(url_for('admin_feedback'))
+    report = profiling.render_stats(profile_id, request.args.get('sort', 'cumulative'),
+                                    request.args.get('limit', 60, type=int))
+    if report is None:
+        return 'Profile không tồn tại', 404
+    return Response(report, mimetype='text/plain')
+
+@app.route('/admin/profiles/<profile_id>/download')
+def admin_profile_download(profile_id):
+    """Download the raw .prof file for snakeviz/pstats (admin only)"""
+    if 'authenticated' not in session:
+        return redirect(url_for('admin_feedback'))
+    path = profiling.profile_file(profile_id)
+    if path is None:
+        return 'Profile không tồn tại', 404
+    return send_file(path, as_attachment=True, download_name=f"{profile_id}.prof",
+                     mimetype='application/octet-stream')
+
+@app.route('/admin/export/challenges.<fmt>')
+def admin_export_challenges(fmt):
+    """Stream weekly_challenges joined with users as CSV or Parquet (admin only)"""
+    if 'authenticated' not in session:
+        return redirect(url_for('admin_feedback'))
+    if fmt not in export.FORMATS:
+        return 'Định dạng không được hỗ trợ', 404
+    if fmt == 'parquet' and export.pyarrow_modules() is None:
+        return 'Xuất Parquet cần cài pyarrow', 501
+    try:
+        filters = export.parse_filters(request.args.get('from_week'), request.args.get('to_week'),
+                                       request.args.get('club'))
+    except ValueError as e:
+        return f'Tham số không hợp lệ: {e}', 400
+
+    chunks = export.export_chunks(DATABASE_URL, filters, fmt)
+    try:
+        # Run the query before the headers go out so a database error is still a proper status
+        first = next(chunks)
+    except psycopg2.Error as e:
+        logger.error(f"Export failed: {str(e)}")
+        return 'Không thể xuất dữ liệu lúc này, vui lòng thử lại', 503
+    weeks = '_'.join(str(filters[key]) for key in ('from_week', 'to_week') if filters[key])
+    filename = f"challenges{'_' + weeks if weeks else ''}_{filters['club']}.{fmt}"
+    return Response(stream_with_context(itertools.chain([first], chunks)), mimetype=export.FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
+
 @app.route('/admin/generate-feature/<int:feedback_id>', methods=['POST'])
 def generate_feature(feedback_id):
     """Generate feature from feedback using AI"""
@@ -912,12 +1100,17 @@ def create_templates():
     pass 
 
 # Reports routes
+REPORTS_DATA_DIR = os.path.join(os.path.dirname(__file__), '.data')
+reports_manifest = ReportsManifest(REPORTS_DATA_DIR)
+report_jobs = report_engine.ReportJobs(DATABASE_URL, REPORTS_DATA_DIR, app.jinja_env,
+                                       on_generated=reports_manifest.invalidate)
+post_crawl.use_report_jobs(report_jobs)
+
 @app.route('/reports')
 def reports():
     """Show reports listing page"""
     try:
-        # Scan .data folder for available reports
-        reports_data = scan_reports_folder()
+        reports_data = reports_manifest.get()
         return render_template('reports.html', reports=reports_data)
     except Exception as e:
         logger.error(f"Error loading reports page: {str(e)}")
@@ -931,133 +1124,45 @@ def view_report(report_path):
         if '..' in report_path or report_path.startswith('/'):
             return "Access denied", 403
         
-        full_path = os.path.join(os.path.dirname(__file__), '.data', report_path)
-        
-        if not os.path.exists(full_path):
-            return "Report not found", 404
-        
-        # For HTML files, serve directly
-        if report_path.endswith('.html'):
-            return send_file(full_path)
-        
-        # For JSON files, return as JSON
-        elif report_path.endswith('.json'):
-            with open(full_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            return jsonify(data)
-        
-        else:
-            return "Unsupported file type", 400
-            
+        # Streamed from disk (or its .br/.gz copy) with ETag and Range support
+        return send_report(REPORTS_DATA_DIR, report_path)
+
     except Exception as e:
         logger.error(f"Error viewing report {report_path}: {str(e)}")
         return f"Error loading report: {str(e)}", 500
 
 @app.route('/reports/generate/<report_type>')
 def generate_report(report_type):
-    """Generate a new report"""
+    """Return an up-to-date report at once or start (or join) a background build the page polls"""
+    if report_type not in report_engine.REPORTS:
+        return jsonify({'status': 'error', 'message': 'Loại báo cáo không được hỗ trợ'})
     try:
-        if report_type == 'interactive_vietnamese':
-            # Run the Vietnamese interactive report generator
-            script_path = os.path.join(os.path.dirname(__file__), '.data', 'enhanced_interactive_report', 'generate_interactive_vietnamese_report.py')
-            if os.path.exists(script_path):
-                result = subprocess.run(['python', script_path], capture_output=True, text=True, cwd=os.path.dirname(script_path))
-                if result.returncode == 0:
-                    return jsonify({'status': 'success', 'message': 'Báo cáo đã được tạo thành công'})
-                else:
-                    return jsonify({'status': 'error', 'message': f'Lỗi tạo báo cáo: {result.stderr}'})
-            else:
-                return jsonify({'status': 'error', 'message': 'Script không tồn tại'})
-        
-        elif report_type == 'actionable_insights':
-            # Run the insights summary generator
-            script_path = os.path.join(os.path.dirname(__file__), '.data', 'scripts', 'generate_insights_summary.py')
-            if os.path.exists(script_path):
-                result = subprocess.run(['python', script_path], capture_output=True, text=True, cwd=os.path.dirname(script_path))
-                if result.returncode == 0:
-                    return jsonify({'status': 'success', 'message': 'Báo cáo insights đã được tạo thành công'})
-                else:
-                    return jsonify({'status': 'error', 'message': f'Lỗi tạo báo cáo: {result.stderr}'})
-            else:
-                return jsonify({'status': 'error', 'message': 'Script không tồn tại'})
-        
-        else:
-            return jsonify({'status': 'error', 'message': 'Loại báo cáo không được hỗ trợ'})
-            
+        week_start, _ = get_current_week_range()
+        job = report_jobs.submit(report_type, week_start, get_vietnam_time())
+        if job['state'] == 'success':
+            generated_at = datetime.fromisoformat(job['result']['generated_at'])
+            return jsonify({'status': 'success', 'job_id': job['id'], 'cached': True,
+                            'message': f"Báo cáo đã là bản mới nhất (dữ liệu chưa thay đổi từ lúc tạo "
+                                       f"{generated_at.strftime('%d/%m/%Y %H:%M')})."})
+        return jsonify({'status': 'pending', 'job_id': job['id'],
+                        'message': f"Đang tạo {report_engine.REPORTS[report_type]['title']}"}), 202
     except Exception as e:
         logger.error(f"Error generating report {report_type}: {str(e)}")
         return jsonify({'status': 'error', 'message': f'Lỗi: {str(e)}'})
 
-def scan_reports_folder():
-    """Scan .data folder and categorize reports"""
-    reports = {
-        'interactive_reports': [],
-        'performance_analysis': [],
-        'user_insights': [],
-        'weekly_reports': []
-    }
-    
-    try:
-        data_path = os.path.join(os.path.dirname(__file__), '.data')
-        
-        if not os.path.exists(data_path):
-            return reports
-        
-        # Scan each category folder
-        categories = {
-            'enhanced_interactive_report': 'interactive_reports',
-            'performance_analysis': 'performance_analysis',
-            'user_insights': 'user_insights',
-            'weekly_reports': 'weekly_reports'
-        }
-        
-        for folder, category in categories.items():
-            folder_path = os.path.join(data_path, folder)
-            if os.path.exists(folder_path):
-                for file in os.listdir(folder_path):
-                    if file.endswith(('.html', '.json')):
-                        file_path = os.path.join(folder_path, file)
-                        file_stats = os.stat(file_path)
-                        
-                        reports[category].append({
-                            'name': file,
-                            'path': f"{folder}/{file}",
-                            'size': format_file_size(file_stats.st_size),
-                            'modified': datetime.fromtimestamp(file_stats.st_mtime).strftime('%d/%m/%Y %H:%M'),
-                            'type': 'HTML Report' if file.endswith('.html') else 'JSON Data',
-                            'description': get_file_description(file)
-                        })
-        
-        # Sort by modification time (newest first)
-        for category in reports.values():
-            if isinstance(category, list):
-                category.sort(key=lambda x: x['modified'], reverse=True)
-        
-    except Exception as e:
-        logger.error(f"Error scanning reports folder: {str(e)}")
-        reports['error'] = str(e)
-    
-    return reports
-
-def format_file_size(size_bytes):
-    """Format file size in human readable format"""
-    if size_bytes < 1024:
-        return f"{size_bytes} B"
-    elif size_bytes < 1024 * 1024:
-        return f"{size_bytes / 1024:.1f} KB"
-    else:
-        return f"{size_bytes / (1024 * 1024):.1f} MB"
-
-def get_file_description(filename):
-    """Get description for different report files"""
-    descriptions = {
-        'bao_cao_strava_tuong_tac.html': 'Báo cáo tương tác tiếng Việt với biểu đồ, phân loại vận động viên và khuyến nghị cá nhân hóa',
-        'strava_enhanced_analysis.html': 'Phân tích hiệu suất chi tiết với khuyến nghị cá nhân, so sánh cộng đồng và xu hướng',
-        'actionable_insights_summary.html': 'Tóm tắt khuyến nghị thông minh và hành động cụ thể cho HLV và vận động viên',
-        'strava_analysis_report.html': 'Báo cáo tổng quan hiệu suất hàng tuần với thống kê cơ bản và bảng xếp hạng'
-    }
-    
-    return descriptions.get(filename, 'Báo cáo phân tích hiệu suất chạy bộ')
+@app.route('/reports/jobs/<job_id>')
+def report_job_status(job_id):
+    """Status of a report job started from the reports page"""
+    job = report_jobs.status(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Không tìm thấy yêu cầu tạo báo cáo'}), 404
+    if job['state'] == 'success':
+        seconds = job['result']['duration_ms'] / 1000
+        return jsonify({'status': 'success', 'job': job,
+                        'message': f'Báo cáo đã được tạo thành công trong {seconds:.1f} giây.'})
+    if job['state'] == 'error':
+        return jsonify({'status': 'error', 'job': job, 'message': f"Lỗi tạo báo cáo: {job.get('error')}"})
+    return jsonify({'status': 'pending', 'job': job, 'message': 'Đang tạo báo cáo'})
 
 if __name__ == '__main__':
     # Initialize logging first
@@ -1069,6 +1174,7 @@ if __name__ == '__main__':
         logger.info("Database initialization completed")
         create_templates()
         logger.info("Template creation completed")
+        health.start_warmup()
     except Exception as e:
         logger.error(f"Initialization failed: {str(e)}", exc_info=True)
         exit(1)
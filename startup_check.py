@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Startup Time Check for the Running Challenge App
+Imports the web app in a fresh interpreter with `python -X importtime`,
+prints the slowest modules and fails when the import exceeds the budget or
+pulls in modules that only optional features need (crawler, Selenium,
+pandas, AI/Docker tooling). Container restarts in
+DockerManager.deploy_feature pay this cost on every deployment.
+
+Usage:
+    python startup_check.py                 # check with the default budget
+    python startup_check.py --budget-ms 400 --runs 5 --top 20
+"""
+
+import os
+import re
+import sys
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STARTUP_BUDGET_MS = float(os.getenv('STARTUP_BUDGET_MS', '800'))
+APP_MODULE = 'running_challenge_app'
+
+# Loaded on demand by the features that need them, never at web startup
+FORBIDDEN_MODULES = (
+    'strava_leaderboard_crawler', 'selenium', 'bs4', 'requests', 'pandas', 'numpy', 'pyarrow',
+    'ai_feature_generator', 'docker_manager', 'pytz'
+)
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def profile_import(module: str = APP_MODULE) -> Tuple[Dict[str, Tuple[int, int, int]], int]:
+    """
+    Import a module in a fresh interpreter.
+    :return: ({module: (self_us, cumulative_us, depth)}, total_us of the module)
+    """
+    env = dict(os.environ)
+    env.setdefault('LOG_DIR', os.path.join(tempfile.gettempdir(), 'strava_startup_check'))
+    os.makedirs(env['LOG_DIR'], exist_ok=True)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    if module not in modules:
+        raise RuntimeError(f"No import time reported for {module}")
+    return modules, modules[module][1]
+
+
+def top_modules(modules: Dict[str, Tuple[int, int, int]], limit: int) -> List[Tuple[str, int, int]]:
+    """Direct dependencies of the app (depth <= 1) with the largest cumulative time"""
+    rows = [(name, self_us, cumulative_us) for name, (self_us, cumulative_us, depth) in modules.items()
+            if depth <= 1]
+    return sorted(rows, key=lambda row: row[2], reverse=True)[:limit]
+
+
+def check(budget_ms: float = STARTUP_BUDGET_MS, runs: int = 3, top: int = 15, verbose: bool = True) -> List[str]:
+    """Run the import profile and return the list of violations (empty when OK)"""
+    totals = []
+    modules = {}
+    for _ in range(runs):
+        modules, total_us = profile_import()
+        totals.append(total_us / 1000)
+    median_ms = statistics.median(totals)
+
+    if verbose:
+        print(f"Import of {APP_MODULE}: median {median_ms:.0f}ms over {runs} runs "
+              f"({', '.join(f'{t:.0f}' for t in totals)} ms), budget {budget_ms:.0f}ms")
+        print(f"{'module':<40} {'self ms':>9} {'total ms':>9}")
+        for name, self_us, cumulative_us in top_modules(modules, top):
+            print(f"{name:<40} {self_us / 1000:>9.1f} {cumulative_us / 1000:>9.1f}")
+
+    violations = []
+    if median_ms > budget_ms:
+        violations.append(f"startup import took {median_ms:.0f}ms (budget {budget_ms:.0f}ms)")
+    for name in FORBIDDEN_MODULES:
+        if name in modules:
+            violations.append(f"{name} is imported at startup; import it where the feature runs")
+    return violations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check web app startup import time')
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    problems = check(args.budget_ms, args.runs, args.top)
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ Startup within budget")
+    sys.exit(1 if problems else 0)
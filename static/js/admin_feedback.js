@@ -0,0 +1,100 @@
+function generateFeature(feedbackId) {
+    const modal = new bootstrap.Modal(document.getElementById('loadingModal'));
+    document.getElementById('loadingText').textContent = 'AI đang tạo kế hoạch triển khai...';
+    modal.show();
+
+    fetch(`/admin/generate-feature/${feedbackId}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        modal.hide();
+
+        const resultModal = new bootstrap.Modal(document.getElementById('resultModal'));
+        document.getElementById('resultModalTitle').textContent = 'Kế Hoạch Triển Khai AI';
+
+        if (data.success) {
+            document.getElementById('resultModalBody').innerHTML = `
+                <div class="alert alert-success">
+                    <i class="fas fa-check-circle me-2"></i>${data.message}
+                </div>
+                <div class="mt-3">
+                    <h6>Kế hoạch triển khai:</h6>
+                    <pre class="bg-light p-3 rounded" style="white-space: pre-wrap; font-size: 0.9rem;">${data.plan}</pre>
+                </div>
+            `;
+            // Refresh page after 2 seconds
+            setTimeout(() => location.reload(), 2000);
+        } else {
+            document.getElementById('resultModalBody').innerHTML = `
+                <div class="alert alert-danger">
+                    <i class="fas fa-exclamation-triangle me-2"></i>${data.message}
+                </div>
+            `;
+        }
+
+        resultModal.show();
+    })
+    .catch(error => {
+        modal.hide();
+        alert('Đã xảy ra lỗi: ' + error.message);
+    });
+}
+
+function deployFeature(feedbackId) {
+    const modal = new bootstrap.Modal(document.getElementById('loadingModal'));
+    document.getElementById('loadingText').textContent = 'Đang triển khai tính năng và khởi động lại hệ thống...';
+    modal.show();
+
+    fetch(`/admin/deploy-feature/${feedbackId}`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        modal.hide();
+
+        const resultModal = new bootstrap.Modal(document.getElementById('resultModal'));
+        document.getElementById('resultModalTitle').textContent = 'Kết Quả Triển Khai';
+
+        let alertClass = data.success ? 'alert-success' : 'alert-danger';
+        let icon = data.success ? 'fas fa-check-circle' : 'fas fa-exclamation-triangle';
+
+        document.getElementById('resultModalBody').innerHTML = `
+            <div class="alert ${alertClass}">
+                <i class="${icon} me-2"></i>${data.message}
+            </div>
+            ${data.log ? `
+            <div class="mt-3">
+                <h6>Log triển khai:</h6>
+                <pre class="bg-light p-3 rounded" style="white-space: pre-wrap; font-size: 0.85rem;">${data.log}</pre>
+            </div>
+            ` : ''}
+        `;
+
+        resultModal.show();
+
+        // Refresh page after successful deployment
+        if (data.success && data.status === 'deployed') {
+            setTimeout(() => location.reload(), 3000);
+        }
+    })
+    .catch(error => {
+        modal.hide();
+        alert('Đã xảy ra lỗi: ' + error.message);
+    });
+}
+
+function viewDetails(feedbackId) {
+    const detailsDiv = document.getElementById(`details-${feedbackId}`);
+    if (detailsDiv.style.display === 'none') {
+        detailsDiv.style.display = 'block';
+    } else {
+        detailsDiv.style.display = 'none';
+    }
+}
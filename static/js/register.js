@@ -0,0 +1,142 @@
+// Strava sync functionality
+function syncStravaData() {
+    const syncBtn = document.getElementById('syncBtn');
+    const originalText = syncBtn.innerHTML;
+
+    // Show loading state
+    syncBtn.disabled = true;
+    syncBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> <span class="d-none d-sm-inline">Đang xử lý...</span>';
+
+    // Show logs modal
+    const modal = new bootstrap.Modal(document.getElementById('syncLogsModal'));
+    modal.show();
+
+    // Show progress bar
+    document.getElementById('syncProgress').style.display = 'block';
+    document.getElementById('syncResult').innerHTML = '';
+    document.querySelector('#syncLogs pre').textContent = 'Đang khởi tạo quá trình đồng bộ...';
+
+    // Make AJAX request
+    fetch('/sync-strava', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        // Hide progress bar
+        document.getElementById('syncProgress').style.display = 'none';
+
+        // Show results
+        const resultDiv = document.getElementById('syncResult');
+        if (data.success) {
+            resultDiv.innerHTML = `
+                <div class="alert alert-success">
+                    <i class="fas fa-check-circle"></i> <strong>Thành công!</strong><br>
+                    ${data.message}
+                    ${data.runners_count > 0 ? `<br><small>Đã xử lý ${data.runners_count} vận động viên</small>` : ''}
+                </div>
+            `;
+        } else {
+            resultDiv.innerHTML = `
+                <div class="alert alert-danger">
+                    <i class="fas fa-exclamation-circle"></i> <strong>Lỗi!</strong><br>
+                    ${data.message}
+                </div>
+            `;
+        }
+
+        // Show logs
+        document.querySelector('#syncLogs pre').textContent = data.logs || 'Không có log';
+
+        // Reload sync status
+        loadSyncStatus();
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        document.getElementById('syncProgress').style.display = 'none';
+        document.getElementById('syncResult').innerHTML = `
+            <div class="alert alert-danger">
+                <i class="fas fa-exclamation-circle"></i> <strong>Lỗi kết nối!</strong><br>
+                Không thể kết nối đến server. Vui lòng thử lại.
+            </div>
+        `;
+    })
+    .finally(() => {
+        // Reset button
+        syncBtn.disabled = false;
+        syncBtn.innerHTML = originalText;
+    });
+}
+
+function loadSyncStatus() {
+    const statusDiv = document.getElementById('syncStatus');
+    statusDiv.innerHTML = `
+        <div class="d-flex justify-content-center">
+            <div class="spinner-border spinner-border-sm" role="status">
+                <span class="visually-hidden">Loading...</span>
+            </div>
+        </div>
+    `;
+
+    fetch('/sync-strava-status')
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            statusDiv.innerHTML = `
+                <div class="row text-center">
+                    <div class="col-md-4">
+                        <div class="mb-2">
+                            <i class="fas fa-clock text-primary"></i>
+                            <div class="small"><strong>Lần cuối cập nhật</strong></div>
+                            <div class="text-muted">${data.last_update}</div>
+                        </div>
+                    </div>
+                    <div class="col-md-4">
+                        <div class="mb-2">
+                            <i class="fas fa-users text-success"></i>
+                            <div class="small"><strong>Tổng số user</strong></div>
+                            <div class="text-muted">${data.total_users}</div>
+                        </div>
+                    </div>
+                    <div class="col-md-4">
+                        <div class="mb-2">
+                            <i class="fas fa-file-alt text-info"></i>
+                            <div class="small"><strong>Trạng thái</strong></div>
+                            <div class="text-muted">Hoạt động</div>
+                        </div>
+                    </div>
+                </div>
+                ${data.recent_logs ? `
+                    <div class="mt-3">
+                        <h6>Log gần đây:</h6>
+                        <pre class="bg-light p-2 rounded" style="max-height: 150px; overflow-y: auto; font-size: 0.8rem;">${data.recent_logs}</pre>
+                    </div>
+                ` : ''}
+            `;
+        } else {
+            statusDiv.innerHTML = `
+                <div class="alert alert-warning mb-0">
+                    <i class="fas fa-exclamation-triangle"></i> Không thể tải trạng thái: ${data.message}
+                </div>
+            `;
+        }
+    })
+    .catch(error => {
+        console.error('Error loading status:', error);
+        statusDiv.innerHTML = `
+            <div class="alert alert-danger mb-0">
+                <i class="fas fa-exclamation-circle"></i> Lỗi kết nối khi tải trạng thái
+            </div>
+        `;
+    });
+}
+
+// Load status when page loads
+document.addEventListener('DOMContentLoaded', function() {
+    // Only load if authenticated section is visible
+    if (document.getElementById('syncStatus')) {
+        loadSyncStatus();
+    }
+});
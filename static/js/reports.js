@@ -0,0 +1,80 @@
+function generateReport(reportType) {
+    const statusDiv = document.getElementById('generation-status');
+    statusDiv.style.display = 'block';
+
+    let reportName = '';
+    switch(reportType) {
+        case 'interactive_vietnamese':
+            reportName = 'Báo Cáo Tương Tác Tiếng Việt';
+            break;
+        case 'actionable_insights':
+            reportName = 'Báo Cáo Khuyến Nghị & Hành Động';
+            break;
+        default:
+            reportName = 'Báo Cáo';
+    }
+
+    statusDiv.innerHTML = `<div class="alert alert-info">
+        <i class="fas fa-spinner fa-spin"></i> 
+        Đang tạo ${reportName}... Vui lòng đợi trong giây lát.
+    </div>`;
+
+    fetch(`/reports/generate/${reportType}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'pending') {
+                pollReportJob(data.job_id, statusDiv);
+            } else {
+                showReportResult(data, statusDiv);
+            }
+        })
+        .catch(error => showConnectionError(error, statusDiv));
+}
+
+// The report is built in the background; check its job once a second
+function pollReportJob(jobId, statusDiv) {
+    fetch(`/reports/jobs/${jobId}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.status === 'pending') {
+                setTimeout(() => pollReportJob(jobId, statusDiv), 1000);
+            } else {
+                showReportResult(data, statusDiv);
+            }
+        })
+        .catch(error => showConnectionError(error, statusDiv));
+}
+
+function showReportResult(data, statusDiv) {
+    if (data.status === 'success') {
+        statusDiv.innerHTML = `<div class="alert alert-success">
+            <i class="fas fa-check"></i> 
+            ${data.message} Trang sẽ tự động làm mới sau 2 giây.
+        </div>`;
+        // Reload page after 2 seconds to show new report
+        setTimeout(() => {
+            window.location.reload();
+        }, 2000);
+    } else {
+        statusDiv.innerHTML = `<div class="alert alert-danger">
+            <i class="fas fa-exclamation-triangle"></i> 
+            <strong>Lỗi tạo báo cáo:</strong> ${data.message}
+        </div>`;
+    }
+}
+
+function showConnectionError(error, statusDiv) {
+    statusDiv.innerHTML = `<div class="alert alert-danger">
+        <i class="fas fa-exclamation-triangle"></i> 
+        <strong>Lỗi kết nối:</strong> Không thể kết nối đến server. Vui lòng thử lại.
+    </div>`;
+    console.error('Error:', error);
+}
+
+// Auto-hide status messages after 15 seconds
+setTimeout(() => {
+    const statusDiv = document.getElementById('generation-status');
+    if (statusDiv.style.display === 'block') {
+        statusDiv.style.display = 'none';
+    }
+}, 15000);
@@ -0,0 +1,82 @@
+// Live leaderboard: apply deltas pushed over Server-Sent Events in place
+(function() {
+    const config = document.getElementById('liveLeaderboard');
+    const container = document.getElementById('leaderboardRows');
+    if (!config || !container || !window.EventSource) {
+        return;
+    }
+
+    const view = config.dataset.view === 'cards' ? 'card_html' : 'table_html';
+
+    function parseRow(html) {
+        const template = document.createElement('template');
+        template.innerHTML = html.trim();
+        return template.content.firstElementChild;
+    }
+
+    function findRow(username) {
+        return container.querySelector(`[data-username="${CSS.escape(username)}"]`);
+    }
+
+    function setText(id, value) {
+        const element = document.getElementById(id);
+        if (element && value !== undefined && value !== null) {
+            element.textContent = value;
+        }
+    }
+
+    function applyDelta(delta) {
+        delta.removed.forEach(function(username) {
+            const row = findRow(username);
+            if (row) {
+                row.remove();
+            }
+        });
+
+        delta.changed.forEach(function(item) {
+            const fresh = parseRow(item[view]);
+            const existing = findRow(item.username);
+            if (existing) {
+                existing.replaceWith(fresh);
+            } else {
+                container.appendChild(fresh);
+            }
+            fresh.classList.add('table-info');
+            setTimeout(function() { fresh.classList.remove('table-info'); }, 2000);
+        });
+
+        // Re-rank: appending an existing node moves it
+        delta.order.forEach(function(username) {
+            const row = findRow(username);
+            if (row) {
+                container.appendChild(row);
+            }
+        });
+
+        setText('statParticipants', delta.summary.participants);
+        setText('statTotalKm', delta.summary.total_km);
+        setText('statCompleted', delta.summary.completed);
+        if (delta.last_update) {
+            setText('lastUpdateText', `${delta.last_update} (UTC+7)`);
+        }
+    }
+
+    function connect() {
+        const source = new EventSource(config.dataset.streamUrl);
+        source.addEventListener('delta', function(event) {
+            try {
+                applyDelta(JSON.parse(event.data));
+            } catch (error) {
+                console.error('Không thể cập nhật bảng xếp hạng:', error);
+            }
+        });
+        // A 503 (server at its stream limit) closes the EventSource for good: try again later
+        source.addEventListener('error', function() {
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(connect, 60000);
+            }
+        });
+    }
+
+    connect();
+})();
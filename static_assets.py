@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Static Asset Pipeline for the Running Challenge App
+Build step: copies static/css and static/js into static/dist with a
+content hash in the file name, precompresses them (gzip, brotli) and
+writes a manifest. Runtime: resolves asset names through the manifest
+and serves fingerprinted files with immutable cache headers.
+
+Usage:
+    python static_assets.py          # build static/dist
+"""
+
+import os
+import sys
+import json
+import gzip
+import shutil
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from flask import request, send_from_directory, url_for, abort
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip siblings are still produced
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+SOURCE_DIRS = ('css', 'js')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+# Content-Encoding -> suffix of the precompressed sibling, in server preference order
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+_manifest: Optional[Dict[str, str]] = None
+
+
+def fingerprint(content: bytes) -> str:
+    """Short content hash used in built file names"""
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+def build(source_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> Dict[str, str]:
+    """Fingerprint and precompress every CSS/JS source file"""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for folder in SOURCE_DIRS:
+        folder_path = os.path.join(source_dir, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for filename in sorted(os.listdir(folder_path)):
+            with open(os.path.join(folder_path, filename), 'rb') as f:
+                content = f.read()
+
+            stem, ext = os.path.splitext(filename)
+            built_name = f"{folder}/{stem}.{fingerprint(content)}{ext}"
+            built_path = os.path.join(dist_dir, built_name)
+            os.makedirs(os.path.dirname(built_path), exist_ok=True)
+            with open(built_path, 'wb') as f:
+                f.write(content)
+
+            sizes = [len(content)]
+            if ext in COMPRESSIBLE_EXTENSIONS:
+                gz = gzip.compress(content, compresslevel=9, mtime=0)
+                with open(f"{built_path}.gz", 'wb') as f:
+                    f.write(gz)
+                sizes.append(len(gz))
+                if brotli is not None:
+                    br = brotli.compress(content, quality=11)
+                    with open(f"{built_path}.br", 'wb') as f:
+                        f.write(br)
+                    sizes.append(len(br))
+
+            manifest[f"{folder}/{filename}"] = built_name
+            print(f"  {folder}/{filename} -> {built_name} ({' / '.join(str(s) for s in sizes)} bytes)")
+
+    with open(os.path.join(dist_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if brotli is None:
+        print("⚠️  brotli not installed, only gzip variants were written")
+    return manifest
+
+
+def load_manifest() -> Dict[str, str]:
+    """Read the build manifest once; empty when assets were not built"""
+    global _manifest
+
+    if _manifest is None:
+        try:
+            with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("Static manifest not found, serving unversioned assets (run: python static_assets.py)")
+            _manifest = {}
+    return _manifest
+
+
+def asset_url(name: str) -> str:
+    """URL of a built asset, falling back to the plain static file in development"""
+    built_name = load_manifest().get(name)
+    if built_name:
+        return url_for('static_asset', filename=built_name)
+    return url_for('static', filename=name)
+
+
+def send_asset(filename: str):
+    """Serve a fingerprinted file, preferring a precompressed sibling"""
+    if filename not in load_manifest().values():
+        abort(404)
+
+    # Parsed with q-values: "br;q=0" refuses brotli, a plain substring test would not
+    available = [encoding for encoding, suffix in PRECOMPRESSED_SUFFIXES.items()
+                 if os.path.exists(os.path.join(DIST_DIR, filename + suffix))]
+    encoding = request.accept_encodings.best_match(available) if available else None
+    if encoding and request.accept_encodings.quality(encoding) > 0:
+        response = send_from_directory(DIST_DIR, filename + PRECOMPRESSED_SUFFIXES[encoding], max_age=31536000)
+        response.headers['Content-Encoding'] = encoding
+        response.mimetype = _mimetype(filename)
+    else:
+        response = send_from_directory(DIST_DIR, filename, max_age=31536000)
+
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _mimetype(filename: str) -> str:
+    if filename.endswith('.css'):
+        return 'text/css'
+    if filename.endswith('.js'):
+        return 'text/javascript'
+    return 'application/octet-stream'
+
+
+def init_app(app):
+    """Register the fingerprinted asset route and the asset_url() template helper"""
+    app.add_url_rule('/assets/<path:filename>', 'static_asset', send_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+
+if __name__ == "__main__":
+    print(f"Building static assets into {DIST_DIR}")
+    result = build()
+    print(f"✅ Built {len(result)} assets")
+    sys.exit(0)
@@ -1,18 +1,19 @@
-import requests
-from bs4 import BeautifulSoup
-import re
 import os
-import selenium
+import time
 import psycopg2
 import psycopg2.extras
 from datetime import datetime, timedelta
-import pickle
 from dotenv import load_dotenv
+import metrics
+import db_pool
+import query_log
+import leaderboard
+import post_crawl
 
 load_dotenv()
 
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import app_logging
 
 LOG_DIR = os.getenv('LOG_DIR', os.path.dirname(os.path.abspath(__file__)))
 LOG_DIR = f"{LOG_DIR}/.logs"
@@ -21,51 +22,54 @@ if 'hieusv' in LOG_DIR:
 else:
     LOG_FILE = os.path.join(LOG_DIR, '.log')
 
-# Set up logging with 7-day rotation
+# Importing this module must not touch logging configuration: the web app
+# owns it. Standalone runs configure it once in __main__.
+logger = logging.getLogger(__name__)
+
+# Set once this process has checked the leaderboard schema (see ensure_schema)
+_schema_ready = False
+
 def setup_logging():
-    """Configure logging with file rotation (7 days)"""
-    # Create log directory if it doesn't exist
-    os.makedirs(LOG_DIR, exist_ok=True)
-    
-    # Create logger
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
-    # Clear existing handlers
-    for handler in logger.handlers[:]:
-        logger.removeHandler(handler)
-    
-    # Create file handler with daily rotation, keep 7 days
-    file_handler = TimedRotatingFileHandler(
-        LOG_FILE,
-        when='midnight',
-        interval=1,
-        backupCount=7,
-        encoding='utf-8'
-    )
-    file_handler.setLevel(logging.INFO)
-    
-    # Create console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
+    """Configure logging with file rotation (7 days) for standalone crawler runs"""
+    return app_logging.setup_logging(LOG_FILE)
+
+def parse_leaderboard_rows(table_html, week_start, week_end):
+    """Parse the rows of the Strava club leaderboard table body into runner dicts"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(table_html, "html.parser")
+    runners = []
     
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    def get_average_pace_in_seconds(minute_second):
+        if minute_second == "--":
+            return 0.0
+        else:
+            minute = minute_second.split(":")[0]
+            second = minute_second.split(":")[1]
+            return 60 * float(minute) + float(second)
     
-    return logger
-
-# Initialize logging
-logger = setup_logging()
+    def get_elevation_gain(text):
+        if text == "--":
+            return 0.0
+        else:
+            return float(text.split()[0].replace(",", ""))
+
+    for row in soup.find_all("tr"):
+        runner = {
+            "id": int(row.find("td", class_="athlete").find("a")["href"].split("/")[-1]),
+            "name": row.find("a", class_="athlete-name").text.strip(),
+            "distance": float(str(row.find("td", class_="distance").text.split()[0]).replace("km","").replace(",",".")),
+            "runs": int(row.find("td", class_="num-activities").text),
+            "longest_run": 0,
+            "average_pace": get_average_pace_in_seconds(
+                row.find("td", class_="average-pace").text.split("/")[0].strip()),
+            "elevation_gain": get_elevation_gain(row.find("td", class_="elev-gain").text.strip()),
+            "week_start": week_start,
+            "week_end": week_end
+        }
+        runners.append(runner)
+
+    return runners
 
 class StravaLeaderboardCrawler:
     """
@@ -83,6 +87,8 @@ class StravaLeaderboardCrawler:
 
     def get_chrome_driver(self):
         """Initialize Chrome WebDriver with proper configuration"""
+        # Selenium is imported here so the web app can import this module cheaply
+        import selenium
         from selenium import webdriver
         
         chrome_options = webdriver.ChromeOptions()
@@ -128,40 +134,7 @@ class StravaLeaderboardCrawler:
         from selenium.webdriver.common.by import By
         
         table = driver.find_element(By.CSS_SELECTOR, "div.leaderboard > table > tbody").get_attribute("innerHTML")
-        soup = BeautifulSoup(table, "html.parser")
-
-        runners = []
-        
-        def get_average_pace_in_seconds(minute_second):
-            if minute_second == "--":
-                return 0.0
-            else:
-                minute = minute_second.split(":")[0]
-                second = minute_second.split(":")[1]
-                return 60 * float(minute) + float(second)
-        
-        def get_elevation_gain(text):
-            if text == "--":
-                return 0.0
-            else:
-                return float(text.split()[0].replace(",", ""))
-
-        for row in soup.find_all("tr"):
-            runner = {
-                "id": int(row.find("td", class_="athlete").find("a")["href"].split("/")[-1]),
-                "name": row.find("a", class_="athlete-name").text.strip(),
-                "distance": float(str(row.find("td", class_="distance").text.split()[0]).replace("km","").replace(",",".")),
-                "runs": int(row.find("td", class_="num-activities").text),
-                "longest_run": 0,
-                "average_pace": get_average_pace_in_seconds(
-                    row.find("td", class_="average-pace").text.split("/")[0].strip()),
-                "elevation_gain": get_elevation_gain(row.find("td", class_="elev-gain").text.strip()),
-                "week_start": week_start,
-                "week_end": week_end
-            }
-            runners.append(runner)
-
-        return runners
+        return parse_leaderboard_rows(table, week_start, week_end)
 
     def crawl_leaderboard(self, include_last_week=True):
         """
@@ -177,25 +150,28 @@ class StravaLeaderboardCrawler:
             from selenium.webdriver.support import expected_conditions
             from selenium.webdriver.support.wait import WebDriverWait
 
-            driver = self.get_chrome_driver()
+            with metrics.crawler_stage('browser_start'):
+                driver = self.get_chrome_driver()
 
             # Navigate to Strava and load cookies
-            driver.get("https://www.strava.com/")
-            self.load_strava_cookies(driver)
-            driver.get("https://www.strava.com/clubs/hienvuong")
-            
-            # Wait for page to load
-            try:
-                WebDriverWait(driver, 30).until(expected_conditions.presence_of_element_located(
-                    (By.CSS_SELECTOR, "div.page")))
-            except TimeoutException:
-                logger.warning("Request timed out waiting for page to load")
+            with metrics.crawler_stage('page_load'):
+                driver.get("https://www.strava.com/")
+                self.load_strava_cookies(driver)
+                driver.get("https://www.strava.com/clubs/hienvuong")
+                
+                # Wait for page to load
+                try:
+                    WebDriverWait(driver, 30).until(expected_conditions.presence_of_element_located(
+                        (By.CSS_SELECTOR, "div.page")))
+                except TimeoutException:
+                    logger.warning("Request timed out waiting for page to load")
 
             # Get current week's data
             week_start, week_end = self.get_current_week_range()
             logger.info(f"Fetching current week data: {week_start} to {week_end}")
             
-            this_week_runners = self.get_data_from_driver(driver, week_start, week_end)
+            with metrics.crawler_stage('parse_current_week'):
+                this_week_runners = self.get_data_from_driver(driver, week_start, week_end)
             logger.info(f"Found {len(this_week_runners)} runners for current week")
             
             last_week_runners = []
@@ -216,7 +192,8 @@ class StravaLeaderboardCrawler:
                     last_week_start, last_week_end = self.get_last_week_range()
                     logger.info(f"Fetching last week data: {last_week_start} to {last_week_end}")
                     
-                    last_week_runners = self.get_data_from_driver(driver, last_week_start, last_week_end)
+                    with metrics.crawler_stage('parse_last_week'):
+                        last_week_runners = self.get_data_from_driver(driver, last_week_start, last_week_end)
                     logger.info(f"Found {len(last_week_runners)} runners for last week")
                     
                 except Exception as e:
@@ -225,7 +202,8 @@ class StravaLeaderboardCrawler:
             driver.quit()
             
             # Process current week data
-            self.process_athletes(this_week_runners, week_start, week_end)
+            with metrics.crawler_stage('ingest_current_week'):
+                self.process_athletes(this_week_runners, week_start, week_end)
             
             return this_week_runners, last_week_runners
 
@@ -256,7 +234,7 @@ class StravaLeaderboardCrawler:
 
     def get_db_connection(self):
         """Get database connection"""
-        conn = psycopg2.connect(self.database_url)
+        conn = psycopg2.connect(self.database_url, connection_factory=db_pool.InstrumentedConnection)
         conn.cursor_factory = psycopg2.extras.RealDictCursor
         return conn
 
@@ -326,38 +304,79 @@ class StravaLeaderboardCrawler:
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
-        # Check if challenge exists
+        # Check if challenge exists (and whether the crawled numbers differ)
         cursor.execute('''
-            SELECT * FROM weekly_challenges 
+            SELECT *, (total_distance, runs, average_pace, elevation_gain)
+                      IS DISTINCT FROM (%s::real, %s::integer, %s::real, %s::real) AS changed
+            FROM weekly_challenges 
             WHERE user_id = %s AND start_date = %s
-        ''', (user_id, week_start))
+        ''', (athlete_details['distance'], athlete_details['runs'],
+              athlete_details['average_pace'], athlete_details['elevation_gain'],
+              user_id, week_start))
         existing = cursor.fetchone()
         
         if existing:
-            # Update existing challenge
+            # Update existing challenge; only real changes get a new data version
+            data_version = leaderboard.bump_week_version(cursor, week_start) if existing['changed'] else existing['data_version']
             cursor.execute('''
                 UPDATE weekly_challenges 
                 SET total_distance = %s, runs = %s, 
-                    average_pace = %s, elevation_gain = %s, updated_at = CURRENT_TIMESTAMP
+                    average_pace = %s, elevation_gain = %s, updated_at = CURRENT_TIMESTAMP,
+                    data_version = %s
                 WHERE user_id = %s AND start_date = %s
             ''', (athlete_details['distance'], athlete_details['runs'],
                   athlete_details['average_pace'], athlete_details['elevation_gain'],
-                  user_id, week_start))
+                  data_version, user_id, week_start))
         else:
             # Create new challenge
+            data_version = leaderboard.bump_week_version(cursor, week_start)
             cursor.execute('''
                 INSERT INTO weekly_challenges 
-                (user_id, start_date, end_date, distance_goal, total_distance, runs, average_pace, elevation_gain)
-                VALUES (%s, %s, %s, %s, %s, %s,%s, %s)
+                (user_id, start_date, end_date, distance_goal, total_distance, runs, average_pace, elevation_gain, data_version)
+                VALUES (%s, %s, %s, %s, %s, %s,%s, %s, %s)
             ''', (user_id, week_start, week_end, 0, athlete_details['distance'],
-                  athlete_details['runs'], athlete_details['average_pace'], athlete_details['elevation_gain']))
+                  athlete_details['runs'], athlete_details['average_pace'], athlete_details['elevation_gain'],
+                  data_version))
         
         conn.commit()
         cursor.close()
         conn.close()
 
+    def ensure_schema(self):
+        """Make sure the data version columns exist (the crawler may run before the app); once per process"""
+        global _schema_ready
+        if _schema_ready:
+            return
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            leaderboard.ensure_schema(cursor)
+            conn.commit()
+            cursor.close()
+            _schema_ready = True
+        finally:
+            conn.close()
+
+    def notify_leaderboard_changed(self, week_start):
+        """Tell live leaderboard listeners that the week was updated"""
+        conn = self.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            leaderboard.notify_leaderboard_changed(cursor, week_start)
+            conn.commit()
+            cursor.close()
+        except psycopg2.Error as e:
+            logger.warning(f"Could not notify leaderboard listeners: {e}")
+        finally:
+            conn.close()
+
     def process_athletes(self, runners, week_start, week_end):
         """Process each athlete and update database"""
+        # Own unit of work so query_log reports its statements (and N+1 repeats) per run
+        with query_log.unit('crawler.process_athletes'):
+            self._process_athletes(runners, week_start, week_end)
+
+    def _process_athletes(self, runners, week_start, week_end):
         for athlete_details in runners:
             username = "strava_" + str(athlete_details['id'])
             
@@ -392,6 +411,9 @@ class StravaLeaderboardCrawler:
 
             logger.info(f"Processed external user {athlete_details['name']}: {athlete_details['distance']}km")
 
+        if runners:
+            self.notify_leaderboard_changed(week_start)
+
 # Usage functions
 def sync_group_leaderboard(group_url="https://www.strava.com/clubs/hienvuong", database_url=None, time_aware=False):
     """
@@ -410,6 +432,10 @@ def sync_group_leaderboard(group_url="https://www.strava.com/clubs/hienvuong", d
             return [], []
     
     crawler = StravaLeaderboardCrawler(group_url, database_url)
+    crawler.ensure_schema()
+    metrics.ensure_flusher()
+    query_log.install()
+    sync_started = time.perf_counter()
     
     # Always get and process current week data
     logger.info("Fetching Strava Leaderboards")
@@ -419,17 +445,28 @@ def sync_group_leaderboard(group_url="https://www.strava.com/clubs/hienvuong", d
     # Always process this week data (this week data is always updated)
     # Last week data processing is conditional based on should_update_last_week_leaderboard()
     
+    this_week_start, _ = crawler.get_current_week_range()
+    crawled_weeks = [this_week_start] if this_week_runners else []
+
     # Check if we should process last week data (conditional update)
     if last_week_runners and crawler.should_update_last_week_leaderboard():
         logger.info("Updating Last Week Progress Table") 
         last_week_start, last_week_end = crawler.get_last_week_range()
-        crawler.process_athletes(last_week_runners, last_week_start, last_week_end)
+        with metrics.crawler_stage('ingest_last_week'):
+            crawler.process_athletes(last_week_runners, last_week_start, last_week_end)
+        crawled_weeks.append(last_week_start)
         logger.info("Last week leaderboard update complete")
     elif last_week_runners:
         logger.info("Skipping last week leaderboard update (already updated this week)")
     else:
         logger.info("No last week data available")
     
+    metrics.CRAWLER_STAGE_SECONDS.observe(time.perf_counter() - sync_started, stage='total')
+    metrics.CRAWLER_RUNS.inc(result='success' if this_week_runners else 'empty')
+
+    # Summaries and reports run in the background
+    if crawled_weeks:
+        post_crawl.after_crawl(crawled_weeks, this_week_start, crawler.database_url)
     return this_week_runners, last_week_runners
 
 def get_new_data_if_needed(database_url=None, force_refresh=False, time_aware=False):
@@ -511,6 +548,8 @@ def demo_enhanced_features():
     print("✓ Improved code structure with better separation of concerns")
 
 if __name__ == "__main__":
+    setup_logging()
+
     # Check if running in demo mode
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == '--demo':
@@ -527,4 +566,9 @@ if __name__ == "__main__":
             else:
                 print("No last week data updated")
         else:
-            print("No update needed")
\ No newline at end of file
+            print("No update needed")
+
+        # The pipeline thread is a daemon: finish the summaries and reports before exiting
+        post_crawl.pipeline.wait()
+        # No gunicorn master reaps this process: fold its metrics into the retired total
+        metrics.retire_self()
\ No newline at end of file
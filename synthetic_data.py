@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data Generator for the Running Challenge App
+Bulk-loads users, weekly_challenges, feedback and feature_generations with
+COPY so load tests and benchmarks run at production-plus volume (for example
+10k users x 300 weeks). Output is deterministic: the same --seed and
+--end-week always produce the same rows.
+
+Every runner gets a personal profile (weekly volume, pace, climbing per km,
+how often they take part); each week varies around it, so distance, pace and
+elevation follow skewed, realistic distributions instead of uniform noise.
+
+Usage:
+    python synthetic_data.py --database-url postgresql://localhost/strava_perf --reset
+    python synthetic_data.py --users 10000 --weeks 300 --feedback 5000 --generations 2000 \\
+        --seed 42 --end-week 2026-01-05 --reset
+"""
+
+import os
+import io
+import csv
+import json
+import time
+import random
+import argparse
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence
+
+import psycopg2
+
+CHALLENGE_GOALS = [35, 45, 55, 65, 75, 85, 100]
+
+SURNAMES = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng',
+            'Bùi', 'Đỗ', 'Hồ', 'Ngô', 'Dương', 'Lý']
+MIDDLE_NAMES = ['Văn', 'Thị', 'Hữu', 'Minh', 'Ngọc', 'Thanh', 'Đức', 'Quang', 'Thu', 'Hoàng']
+GIVEN_NAMES = ['An', 'Bình', 'Chi', 'Dũng', 'Giang', 'Hà', 'Hải', 'Hiếu', 'Hùng', 'Hương',
+               'Khánh', 'Lan', 'Linh', 'Long', 'Mai', 'Nam', 'Nga', 'Phong', 'Phương', 'Quân',
+               'Sơn', 'Tâm', 'Thảo', 'Trang', 'Trung', 'Tú', 'Tuấn', 'Việt', 'Vy', 'Yến']
+
+FEEDBACK_TYPES = [('suggestion', 5), ('feature', 3), ('bug', 2), ('other', 1)]
+PRIORITIES = [('low', 3), ('medium', 5), ('high', 2)]
+STATUSES = [('pending', 5), ('reviewed', 3), ('implemented', 1), ('rejected', 1)]
+DEPLOYMENT_STATUSES = [('pending', 3), ('generated', 3), ('deployed', 2), ('failed', 1)]
+FEEDBACK_SENTENCES = ['Mong muốn cải thiện {topic} để theo dõi thử thách dễ hơn.',
+                      'Hiện tại {topic} tải khá chậm vào tối Chủ nhật.',
+                      'Đề xuất thêm bộ lọc cho {topic}.',
+                      'Trên điện thoại {topic} hiển thị chưa đẹp.',
+                      'Cảm ơn team, {topic} rất hữu ích!']
+FEEDBACK_TOPICS = ['bảng xếp hạng', 'biểu đồ tiến độ', 'trang đăng ký', 'thông báo', 'báo cáo tuần',
+                   'giao diện mobile', 'đồng bộ Strava', 'mục tiêu km', 'xuất dữ liệu', 'chế độ tối']
+
+# Columns loaded per table, in COPY order
+USER_COLUMNS = ('id', 'username', 'first_name', 'last_name', 'is_external', 'created_at')
+CHALLENGE_COLUMNS = ('user_id', 'start_date', 'end_date', 'distance_goal', 'total_distance', 'runs',
+                     'average_pace', 'elevation_gain', 'created_at', 'updated_at', 'data_version')
+FEEDBACK_COLUMNS = ('id', 'user_name', 'email', 'feedback_type', 'title', 'description', 'priority',
+                    'status', 'admin_notes', 'implementation_status', 'created_at', 'updated_at')
+GENERATION_COLUMNS = ('feedback_id', 'generated_code', 'file_changes', 'deployment_status',
+                      'deployment_log', 'created_at', 'deployed_at')
+
+TABLES = ('feature_generations', 'feedback', 'weekly_challenges', 'users', 'leaderboard_versions')
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _rng(seed: int, *key) -> random.Random:
+    """Independent generator per entity so rows do not depend on generation order"""
+    return random.Random(':'.join(str(part) for part in (seed,) + key))
+
+
+def _weighted(rng: random.Random, choices: Sequence) -> str:
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def distance_goal(distance: float) -> int:
+    """Same goal rule as the crawler"""
+    return next((goal for goal in CHALLENGE_GOALS if goal >= distance), 100)
+
+
+def runner_profile(seed: int, user_id: int) -> Dict:
+    """Long-term habits of one runner"""
+    rng = _rng(seed, 'runner', user_id)
+    return {
+        'weekly_km': rng.lognormvariate(3.1, 0.55),            # median ~22 km, long tail past 80
+        'run_km': min(max(rng.gauss(8, 2.5), 3), 21),           # typical run length
+        'pace': min(max(rng.gauss(375, 50), 230), 600),         # seconds per km
+        'climb_per_km': rng.lognormvariate(2.0, 0.7),           # meters gained per km
+        'participation': rng.betavariate(4, 1.5)                # share of weeks with runs
+    }
+
+
+def generate_users(users: int, seed: int, end_week: date, weeks: int) -> Iterator[tuple]:
+    for user_id in range(1, users + 1):
+        rng = _rng(seed, 'user', user_id)
+        name = f"{rng.choice(SURNAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(GIVEN_NAMES)}"
+        joined = end_week - timedelta(weeks=rng.randrange(weeks), days=rng.randrange(7))
+        yield (user_id, f"strava_{10_000_000 + user_id}", name, '', True,
+               datetime.combine(joined, datetime.min.time()) + timedelta(seconds=rng.randrange(86400)))
+
+
+def generate_challenges(users: int, weeks: int, seed: int, end_week: date) -> Iterator[tuple]:
+    """One row per runner and active week, oldest week first within a runner"""
+    for user_id in range(1, users + 1):
+        profile = runner_profile(seed, user_id)
+        rng = _rng(seed, 'weeks', user_id)
+        active_weeks = rng.randint(1, weeks)
+        for weeks_ago in range(active_weeks - 1, -1, -1):
+            if rng.random() > profile['participation']:
+                continue
+            start = end_week - timedelta(weeks=weeks_ago)
+            distance = round(profile['weekly_km'] * rng.lognormvariate(0, 0.35), 1)
+            if distance < 1:
+                continue
+            runs = max(1, min(14, round(distance / profile['run_km'] + rng.uniform(-0.5, 0.5))))
+            pace = round(profile['pace'] * rng.gauss(1, 0.04))
+            elevation = round(distance * profile['climb_per_km'] * rng.lognormvariate(0, 0.3))
+            updated = datetime.combine(start + timedelta(days=6), datetime.min.time()) + timedelta(hours=rng.randrange(24))
+            yield (user_id, start, start + timedelta(days=6), distance_goal(distance), distance, runs,
+                   pace, elevation, updated - timedelta(days=rng.randrange(7)), updated, 1)
+
+
+def generate_feedback(count: int, seed: int, end_week: date) -> Iterator[tuple]:
+    for feedback_id in range(1, count + 1):
+        rng = _rng(seed, 'feedback', feedback_id)
+        topic = rng.choice(FEEDBACK_TOPICS)
+        kind = _weighted(rng, FEEDBACK_TYPES)
+        status = _weighted(rng, STATUSES)
+        sentences = [rng.choice(FEEDBACK_SENTENCES).format(topic=topic) for _ in range(rng.randint(1, 12))]
+        created = datetime.combine(end_week, datetime.min.time()) - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+        yield (feedback_id, f"Runner {rng.randrange(100000)}", f"runner{feedback_id}@example.com", kind,
+               f"{kind.capitalize()}: {topic} #{feedback_id}", ' '.join(sentences), _weighted(rng, PRIORITIES),
+               status, 'Đã xem' if status != 'pending' else None,
+               'completed' if status == 'implemented' else 'not_started',
+               created, created + timedelta(hours=rng.randrange(240)))
+
+
+def generate_generations(count: int, feedback: int, seed: int, end_week: date) -> Iterator[tuple]:
+    """AI feature generations, attached to random feedback rows (several per row possible)"""
+    if not feedback:
+        return
+    for generation_id in range(1, count + 1):
+        rng = _rng(seed, 'generation', generation_id)
+        feedback_id = rng.randint(1, feedback)
+        files = [f"templates/feature_{generation_id}_{i}.html" for i in range(rng.randint(1, 4))]
+        code = '\n'.join(f"# {path}\n" + "def handler():\n    return render_template('page.html')\n" * rng.randint(5, 60)
+                         for path in files)
+        status = _weighted(rng, DEPLOYMENT_STATUSES)
+        created = datetime.combine(end_week, datetime.min.time()) - timedelta(minutes=rng.randrange(365 * 24 * 60))
+        yield (feedback_id, code, json.dumps({'files': files}), status,
+               'Build OK\n' * rng.randint(1, 40) if status in ('deployed', 'failed') else None,
+               created, created + timedelta(minutes=rng.randint(2, 90)) if status == 'deployed' else None)
+
+
+class CopyStream(io.RawIOBase):
+    """File-like CSV view of a row iterator, so COPY streams without building the file"""
+
+    def __init__(self, rows: Iterable[tuple], on_row: Optional[Callable[[], None]] = None):
+        self._rows = iter(rows)
+        self._buffer = bytearray()
+        self._on_row = on_row
+        self._text = io.StringIO()
+        self._writer = csv.writer(self._text, lineterminator='\n')
+
+    def readable(self) -> bool:
+        return True
+
+    def _encode(self, row: tuple) -> bytes:
+        self._text.seek(0)
+        self._text.truncate()
+        self._writer.writerow(['\\N' if value is None else value for value in row])
+        return self._text.getvalue().encode('utf-8')
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += self._encode(row)
+            if self._on_row:
+                self._on_row()
+        if size < 0:
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.read(size)
+
+
+def copy_rows(cursor, table: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    """COPY rows into table; returns the number of rows loaded"""
+    count = 0
+
+    def counted():
+        nonlocal count
+        count += 1
+
+    cursor.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+        CopyStream(rows, counted), size=1 << 16)
+    return count
+
+
+def generate(database_url: str, users: int = 10000, weeks: int = 300, feedback: int = 3000,
+             generations: int = 1500, seed: int = 42, end_week: Optional[date] = None,
+             reset: bool = False, verbose: bool = True) -> Dict[str, int]:
+    """
+    Load a deterministic data set. The schema is created if needed; existing
+    rows are removed only with reset=True, otherwise non-empty tables abort.
+    :return: rows loaded per table
+    """
+    end_week = week_start(end_week or date.today())
+    os.environ['DATABASE_URL'] = database_url
+    import running_challenge_app
+    running_challenge_app.init_db()
+
+    conn = psycopg2.connect(database_url)
+    loaded = {}
+    try:
+        cursor = conn.cursor()
+        if reset:
+            cursor.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY")
+        else:
+            for table in TABLES:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table})")
+                if cursor.fetchone()[0]:
+                    raise ValueError(f"Table {table} is not empty; use --reset to replace its data")
+
+        steps = [
+            ('users', USER_COLUMNS, generate_users(users, seed, end_week, weeks)),
+            ('weekly_challenges', CHALLENGE_COLUMNS, generate_challenges(users, weeks, seed, end_week)),
+            ('feedback', FEEDBACK_COLUMNS, generate_feedback(feedback, seed, end_week)),
+            ('feature_generations', GENERATION_COLUMNS, generate_generations(generations, feedback, seed, end_week)),
+        ]
+        for table, columns, rows in steps:
+            started = time.perf_counter()
+            loaded[table] = copy_rows(cursor, table, columns, rows)
+            if verbose:
+                elapsed = time.perf_counter() - started
+                print(f"{table:<22} {loaded[table]:>10,} rows in {elapsed:6.1f}s "
+                      f"({loaded[table] / elapsed if elapsed else 0:,.0f} rows/s)")
+
+        # Explicit ids were loaded: move the sequences past them
+        for table in ('users', 'weekly_challenges', 'feedback', 'feature_generations'):
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                           f"GREATEST((SELECT MAX(id) FROM {table}), 1))")
+        cursor.execute('''
+            INSERT INTO leaderboard_versions (start_date, version)
+            SELECT DISTINCT start_date, 1 FROM weekly_challenges
+        ''')
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Fresh statistics so the planner sees the real volume right away
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        for table in TABLES:
+            cursor.execute(f"ANALYZE {table}")
+    finally:
+        conn.close()
+    return loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bulk-load deterministic synthetic data with COPY')
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL'))
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--weeks', type=int, default=300)
+    parser.add_argument('--feedback', type=int, default=3000)
+    parser.add_argument('--generations', type=int, default=1500)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--end-week', type=lambda value: datetime.strptime(value, '%Y-%m-%d').date(),
+                        help='last week of data, YYYY-MM-DD (default: current week)')
+    parser.add_argument('--reset', action='store_true', help='truncate the tables first')
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error('DATABASE_URL or --database-url is required')
+
+    started = time.perf_counter()
+    try:
+        counts = generate(args.database_url, args.users, args.weeks, args.feedback, args.generations,
+                          args.seed, args.end_week, args.reset)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Loaded {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test script for the logging pipeline helpers
+Validates the tail reader, crawler events from the shared log, per-context log capture,
+the non-blocking queue handler, the formatters and access log sampling
+"""
+
+import os
+import sys
+import json
+import queue
+import logging
+import tempfile
+import threading
+
+import app_logging
+
+
+def test_tail_lines():
+    """Tail returns the last lines across block boundaries"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'app.log')
+        with open(path, 'w', encoding='utf-8') as f:
+            for i in range(1000):
+                f.write(f"dòng {i} strava crawler\n")
+
+        lines = app_logging.tail_lines(path, 5, block_size=64)
+        assert lines == [f"dòng {i} strava crawler" for i in range(995, 1000)], lines
+        assert len(app_logging.tail_lines(path, 5000)) == 1000
+        assert app_logging.tail_lines(path, 0) == []
+
+        empty = os.path.join(tmp, 'empty.log')
+        open(empty, 'w').close()
+        assert app_logging.tail_lines(empty, 10) == []
+    print("✅ Tail reader returns the expected lines")
+
+
+def test_crawler_events_from_shared_log():
+    """Crawler lines written by any process are read back from the shared file, newest last"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'app.log')
+        # Two workers and the crawler each hold their own handle on the same file
+        writers = {}
+        for name, fmt in (('worker1', 'text'), ('worker2', 'json'), ('strava_leaderboard_crawler', 'text')):
+            handler = logging.FileHandler(path, encoding='utf-8')
+            handler.setFormatter(app_logging.make_formatter(fmt))
+            writers[name] = handler
+
+        def write(name, message, logger=None):
+            record = logging.LogRecord(logger or name, logging.INFO, __file__, 1, message, None, None)
+            writers[name].handle(record)
+
+        write('worker1', 'Weekly results requested')
+        write('strava_leaderboard_crawler', 'Đã lưu 42 runner')
+        write('worker2', 'Manual Strava sync started')
+        write('worker1', 'request /sync-strava-status', logger='access')
+        for i in range(3):
+            write('worker1', f"Crawler step {i}")
+        for handler in writers.values():
+            handler.close()
+
+        events = app_logging.recent_crawler_events(path, limit=4)
+        assert len(events) == 4, events
+        assert 'Manual Strava sync started' in events[0] and json.loads(events[0])['logger'] == 'worker2'
+        assert [event.rsplit(' - ', 1)[1] for event in events[1:]] == [f"Crawler step {i}" for i in range(3)]
+
+        everything = app_logging.recent_crawler_events(path, limit=10)
+        assert 'Đã lưu 42 runner' in everything[0] and len(everything) == 5, everything
+        assert app_logging.recent_crawler_events(path, limit=10, scan=2) == everything[-2:]
+    print("✅ Crawler events read from the log file shared by all processes")
+
+
+def test_capture_logs_is_context_scoped():
+    """Concurrent captures only see records from their own thread"""
+    logger = logging.getLogger('test_capture')
+    logger.setLevel(logging.INFO)
+    outputs = {}
+    barrier = threading.Barrier(2)
+
+    def job(name):
+        with app_logging.capture_logs(fmt='%(message)s') as capture:
+            barrier.wait()
+            for i in range(3):
+                logger.info(f"{name} {i}")
+            barrier.wait()
+        outputs[name] = capture.getvalue()
+
+    threads = [threading.Thread(target=job, args=(name,)) for name in ('a', 'b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outputs['a'] == 'a 0\na 1\na 2\n', outputs
+    assert outputs['b'] == 'b 0\nb 1\nb 2\n', outputs
+    print("✅ Log capture is scoped to its own context")
+
+
+def test_crawler_import_keeps_handlers():
+    """Importing the crawler must not replace the root handlers"""
+    root = logging.getLogger()
+    sentinel = logging.NullHandler()
+    root.addHandler(sentinel)
+    try:
+        import strava_leaderboard_crawler  # noqa: F401
+    except ImportError as e:
+        print(f"⚠️  Crawler dependencies missing, skipping: {e}")
+        return
+    finally:
+        still_attached = sentinel in root.handlers
+        root.removeHandler(sentinel)
+    assert still_attached
+    print("✅ Crawler import leaves logging configuration alone")
+
+
+def _record(message, args=None, fields=None, exc_info=None):
+    record = logging.LogRecord('running_challenge_app', logging.WARNING, __file__, 42, message, args, exc_info,
+                               func='weekly_results')
+    if fields is not None:
+        record.fields = fields
+    return record
+
+
+def test_queue_handler_drops_when_full():
+    """A full queue drops records instead of blocking the request thread"""
+    log_queue = queue.Queue(maxsize=2)
+    handler = app_logging.NonBlockingQueueHandler(log_queue)
+    for i in range(5):
+        handler.handle(_record('tuần %s', (i,)))
+    assert log_queue.qsize() == 2 and handler.dropped == 3
+    queued = log_queue.get_nowait()
+    # Formatting is left to the writer thread
+    assert queued.msg == 'tuần %s' and queued.args == (0,) and queued.getMessage() == 'tuần 0'
+
+    root = logging.getLogger()
+    root.addHandler(handler)
+    try:
+        assert app_logging.dropped_records() >= 3
+    finally:
+        root.removeHandler(handler)
+    print("✅ Queue handler drops records when the queue is full")
+
+
+def test_formatters():
+    """JSON lines carry the standard keys, extra fields and the traceback; text appends key=value"""
+    try:
+        raise ValueError('hỏng')
+    except ValueError:
+        exc_info = sys.exc_info()
+    record = _record('Chạy %s km', (5,), fields={'status': 200, 'path': '/weekly-results'}, exc_info=exc_info)
+
+    line = app_logging.JsonFormatter().format(record)
+    assert '\n' not in line and 'Chạy' in line
+    payload = json.loads(line)
+    assert payload['level'] == 'WARNING' and payload['logger'] == 'running_challenge_app'
+    assert payload['func'] == 'weekly_results' and payload['line'] == 42 and payload['message'] == 'Chạy 5 km'
+    assert payload['status'] == 200 and payload['path'] == '/weekly-results'
+    assert 'ValueError: hỏng' in payload['exc'] and len(payload['ts']) == 19
+
+    text = app_logging.TextFormatter('%(levelname)s %(message)s').format(_record('xong', fields={'rows': 3}))
+    assert text == 'WARNING xong rows=3', text
+    assert isinstance(app_logging.make_formatter('json'), app_logging.JsonFormatter)
+    assert isinstance(app_logging.make_formatter('text'), app_logging.TextFormatter)
+    print("✅ JSON and text formatters include the extra fields")
+
+
+def test_access_log_sampling():
+    """Errors and slow requests are always logged; fast successes are sampled"""
+    rate, slow_ms = app_logging.ACCESS_LOG_SAMPLE_RATE, app_logging.ACCESS_LOG_SLOW_MS
+    try:
+        app_logging.ACCESS_LOG_SLOW_MS = 1000
+        app_logging.ACCESS_LOG_SAMPLE_RATE = 0.0
+        assert app_logging.should_log_access(500, 5) and app_logging.should_log_access(404, 5)
+        assert app_logging.should_log_access(200, 1000)
+        assert not any(app_logging.should_log_access(200, 5) for _ in range(100))
+
+        app_logging.ACCESS_LOG_SAMPLE_RATE = 1.0
+        assert all(app_logging.should_log_access(200, 5) for _ in range(100))
+
+        app_logging.ACCESS_LOG_SAMPLE_RATE = 0.25
+        kept = sum(app_logging.should_log_access(200, 5) for _ in range(4000))
+        assert 800 < kept < 1200, kept
+    finally:
+        app_logging.ACCESS_LOG_SAMPLE_RATE, app_logging.ACCESS_LOG_SLOW_MS = rate, slow_ms
+    print("✅ Access log sampling keeps errors and slow requests")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_tail_lines, test_crawler_events_from_shared_log, test_capture_logs_is_context_scoped,
+             test_crawler_import_keeps_handlers, test_queue_handler_drops_when_full, test_formatters,
+             test_access_log_sampling]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
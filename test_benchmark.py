@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script for the performance regression gate
+Validates the leaderboard parser on the benchmark fixture and the verdicts
+of the baseline comparison
+"""
+
+import os
+import sys
+import json
+import tempfile
+from datetime import date
+
+import benchmark
+from strava_leaderboard_crawler import parse_leaderboard_rows
+
+
+def _timings(calibration_ms, **benchmarks):
+    return {'calibration_ms': calibration_ms,
+            'benchmarks': {name: {benchmark.GATE_STAT: ms} for name, ms in benchmarks.items()}}
+
+
+def test_parse_leaderboard_fixture():
+    """The benchmark HTML parses into the runner dicts the crawler stores"""
+    week_start, week_end = date(2026, 1, 5), date(2026, 1, 11)
+    runners = parse_leaderboard_rows(benchmark.leaderboard_html(300), week_start, week_end)
+    assert len(runners) == 300
+    second = runners[1]
+    assert second['id'] == 1000001 and second['name'] == 'Runner 1'
+    assert second['distance'] == 8.1 and second['runs'] == 2
+    assert second['average_pace'] == 361.0 and second['elevation_gain'] == 13.0
+    assert second['week_start'] == week_start and second['week_end'] == week_end
+    # Thousands separators in the elevation column
+    assert runners[100]['elevation_gain'] == 1300.0 and runners[200]['elevation_gain'] == 1100.0
+    print("✅ Leaderboard fixture parses into runner rows")
+
+
+def test_compare_verdicts():
+    """Regressions, speedups, skipped and new benchmarks get their status"""
+    baseline = _timings(20.0, parser=100.0, render=10.0, scan=10.0, query=5.0)
+    current = _timings(20.0, parser=130.0, render=7.0, scan=11.0, ingest=50.0)
+    rows = {row['name']: row for row in benchmark.compare(current, baseline, 0.25)}
+    assert rows['parser']['status'] == 'REGRESSION' and round(rows['parser']['change'], 2) == 0.3
+    assert rows['render']['status'] == 'faster'
+    assert rows['scan']['status'] == 'ok'
+    assert rows['query']['status'] == 'skipped' and rows['query']['current_ms'] is None
+    assert rows['ingest']['status'] == 'new' and rows['ingest']['baseline_ms'] is None
+    print("✅ Comparison gives one verdict per benchmark")
+
+
+def test_calibration_scaling():
+    """A slower machine scales the baseline instead of failing the gate"""
+    baseline = _timings(20.0, parser=100.0)
+    rows = benchmark.compare(_timings(30.0, parser=140.0), baseline, 0.25)
+    assert rows[0]['baseline_ms'] == 150.0 and rows[0]['status'] == 'ok'
+    rows = benchmark.compare(_timings(10.0, parser=70.0), baseline, 0.25)
+    assert rows[0]['status'] == 'REGRESSION'
+    # Per-benchmark tolerance in the baseline wins over the default
+    baseline['benchmarks']['parser']['tolerance'] = 0.5
+    assert benchmark.compare(_timings(10.0, parser=70.0), baseline, 0.25)[0]['status'] == 'ok'
+    print("✅ Baselines are scaled by the calibration loop")
+
+
+def test_write_baseline_keeps_skipped():
+    """Updating keeps benchmarks that did not run, rescaled, and their tolerance"""
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'baseline.json')
+        baseline = _timings(20.0, parser=100.0, query=40.0)
+        baseline['benchmarks']['parser']['tolerance'] = 0.4
+        benchmark.write_baseline(_timings(10.0, parser=45.0), baseline, path)
+        with open(path, encoding='utf-8') as f:
+            written = json.load(f)
+    assert written['calibration_ms'] == 10.0
+    assert written['benchmarks']['parser'] == {benchmark.GATE_STAT: 45.0, 'tolerance': 0.4}
+    assert written['benchmarks']['query'] == {benchmark.GATE_STAT: 20.0}
+    print("✅ Baseline update merges with the previous baseline")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_parse_leaderboard_fixture, test_compare_verdicts, test_calibration_scaling,
+             test_write_baseline_keeps_skipped]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
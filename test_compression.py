@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test script for response compression
+Validates Accept-Encoding negotiation (q-values, identity), the responses
+that are left alone and chunk-by-chunk compression of streamed bodies
+"""
+
+import io
+import sys
+import gzip
+import zlib
+
+from flask import Flask, Response, send_file
+
+import compression
+
+BODY = ('<tr><td>Nguyễn Văn An</td><td>42.5 km</td></tr>\n' * 100).encode('utf-8')
+
+
+def _client():
+    app = Flask(__name__)
+    compression.init_app(app)
+
+    @app.route('/page')
+    def page():
+        return Response(BODY, mimetype='text/html')
+
+    @app.route('/small')
+    def small():
+        return Response('ok', mimetype='text/plain')
+
+    @app.route('/image')
+    def image():
+        return Response(b'\x89PNG' + BODY, mimetype='image/png')
+
+    @app.route('/encoded')
+    def encoded():
+        return Response(gzip.compress(BODY), mimetype='text/html', headers={'Content-Encoding': 'gzip'})
+
+    @app.route('/file')
+    def file():
+        return send_file(io.BytesIO(BODY), mimetype='text/html')
+
+    @app.route('/events')
+    def events():
+        return Response((f"data: {i}\n\n" for i in range(3)), mimetype='text/event-stream')
+
+    @app.route('/stream')
+    def stream():
+        return Response((BODY[i:i + 1000] for i in range(0, len(BODY), 1000)), mimetype='text/csv')
+
+    @app.route('/etag')
+    def etag():
+        response = Response(BODY, mimetype='application/json')
+        response.set_etag('v1')
+        return response
+
+    return app.test_client()
+
+
+def _decode(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return compression.brotli.decompress(data)
+    return gzip.decompress(data)
+
+
+def test_negotiation():
+    """Client q-values pick the encoding; q=0 and identity get the plain body"""
+    client = _client()
+    best = 'br' if compression.brotli is not None else 'gzip'
+    cases = [
+        ('gzip, deflate, br', best),
+        ('gzip', 'gzip'),
+        ('br;q=0, gzip', 'gzip'),
+        ('br;q=0.5, gzip;q=0.9', 'gzip'),
+        ('gzip;q=0, br;q=0', None),
+        ('identity', None),
+        ('deflate', None),
+        ('', None),
+        ('*', best),
+    ]
+    for header, expected in cases:
+        response = client.get('/page', headers={'Accept-Encoding': header})
+        assert response.headers.get('Content-Encoding') == expected, (header, response.headers)
+        assert 'Accept-Encoding' in response.vary
+        body = _decode(response.data, expected) if expected else response.data
+        assert body == BODY, header
+        if expected:
+            assert int(response.headers['Content-Length']) == len(response.data) < len(BODY)
+    print("✅ Encoding negotiated from Accept-Encoding q-values")
+
+
+def test_skipped_responses():
+    """Small bodies, non-text types, SSE, file passthrough and encoded bodies are left alone"""
+    client = _client()
+    headers = {'Accept-Encoding': 'gzip, br'}
+    for path in ('/small', '/image', '/file'):
+        response = client.get(path, headers=headers)
+        assert 'Content-Encoding' not in response.headers, path
+        response.close()
+
+    encoded = client.get('/encoded', headers=headers)
+    assert encoded.headers['Content-Encoding'] == 'gzip' and gzip.decompress(encoded.data) == BODY
+
+    events = client.get('/events', headers=headers)
+    assert 'Content-Encoding' not in events.headers and events.data == b'data: 0\n\ndata: 1\n\ndata: 2\n\n'
+    print("✅ Responses that must not be compressed are untouched")
+
+
+def test_streamed_compression():
+    """Streamed bodies are compressed and flushed chunk by chunk"""
+    client = _client()
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+    assert response.headers['Content-Encoding'] == 'gzip' and 'Content-Length' not in response.headers
+    chunks = list(response.response)
+    response.close()
+    assert len(chunks) > 1
+    # Each chunk ends on a sync flush, so the prefix received so far is decodable
+    decoder = zlib.decompressobj(31)
+    first = decoder.decompress(chunks[0])
+    assert first == BODY[:1000], len(first)
+    assert first + decoder.decompress(b''.join(chunks[1:])) == BODY
+
+    assert list(compression.compress_stream(['', 'a' * 10, b''], 'gzip'))
+    print("✅ Streamed responses compressed chunk by chunk")
+
+
+def test_etag_weakened():
+    """A compressed body keeps its validator, made weak and tagged with the encoding"""
+    response = _client().get('/etag', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == 'W/"v1-gzip"', response.headers['ETag']
+    print("✅ ETag weakened for compressed bodies")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_negotiation, test_skipped_responses, test_streamed_compression, test_etag_weakened]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Test script for the PostgreSQL connection pool
+Validates checkout/return (rollback, broken connections), waiting on a
+full pool, the reset after a worker fork and the gunicorn hooks, with
+stub connections instead of a database
+"""
+
+import os
+import sys
+import time
+import types
+import threading
+import importlib.util
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+import db_pool
+
+IDLE = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+INTRANS = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+
+class StubCursor:
+    def __init__(self):
+        self.closed = False
+
+    def execute(self, query, vars=None):
+        self.query = query
+
+    def close(self):
+        self.closed = True
+
+
+class StubConnection:
+    """Just enough of a psycopg2 connection for the pool"""
+
+    def __init__(self):
+        self.closed = 0
+        self.status = IDLE
+        self.rollbacks = 0
+        self.broken = False
+        self.info = self
+
+    @property
+    def transaction_status(self):
+        return self.status
+
+    def get_transaction_status(self):
+        if self.broken:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        return self.status
+
+    def cursor(self, *args, **kwargs):
+        self.status = INTRANS
+        return StubCursor()
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class StubPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool handing out stub connections"""
+
+    def __init__(self, minconn=1, maxconn=3):
+        self.opened = []
+        super().__init__(minconn, maxconn)
+
+    def _connect(self, key=None):
+        conn = StubConnection()
+        self.opened.append(conn)
+        if key is not None:
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+        else:
+            self._pool.append(conn)
+        return conn
+
+
+def _install(pool):
+    db_pool._pool, db_pool._pool_pid = pool, os.getpid()
+    return pool
+
+
+def test_checkout_and_return():
+    """A returned connection goes back idle, rolled back; the proxy is unusable afterwards"""
+    pool = _install(StubPool())
+    try:
+        conn = db_pool.get_connection()
+        assert db_pool.pool_status() == {'initialized': True, 'in_use': 1, 'idle': 0, 'max': 3}
+        conn.cursor().execute('SELECT 1')
+        raw = conn._conn
+        conn.close()
+        conn.close()  # second close is a no-op
+        assert raw.rollbacks == 1 and not raw.closed and conn.closed
+        assert db_pool.pool_status()['in_use'] == 0 and db_pool.pool_status()['idle'] == 1
+        try:
+            conn.cursor()
+            assert False, 'cursor on a returned connection'
+        except psycopg2.InterfaceError:
+            pass
+        assert db_pool.get_connection()._conn is raw, 'idle connection not reused'
+    finally:
+        db_pool.reset_pool()
+    print("✅ Connections rolled back and reused after return")
+
+
+def test_broken_connections_discarded():
+    """Connections the server dropped are replaced at checkout and discarded on return"""
+    pool = _install(StubPool())
+    try:
+        pool._pool[0].closed = 1
+        conn = db_pool.get_connection()
+        assert not conn.closed and conn._conn is pool.opened[1]
+
+        raw = conn._conn
+        raw.broken = True
+        conn.close()
+        assert raw.closed and db_pool.pool_status() == {'initialized': True, 'in_use': 0, 'idle': 0, 'max': 3}
+    finally:
+        db_pool.reset_pool()
+    print("✅ Broken connections are not returned to the pool")
+
+
+def test_pool_exhaustion():
+    """Checkouts beyond the pool size wait for a returned connection, then fail with PoolError"""
+    _install(StubPool(maxconn=2))
+    try:
+        first, second = db_pool.get_connection(), db_pool.get_connection()
+        started = time.perf_counter()
+        try:
+            db_pool.get_connection(timeout=0.1)
+            assert False, 'third checkout from a pool of two'
+        except PoolError:
+            pass
+        assert time.perf_counter() - started >= 0.1
+
+        # A waiting checkout gets the connection as soon as another thread returns one
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(db_pool.get_connection(timeout=5)))
+        waiter.start()
+        time.sleep(0.05)
+        assert not got, 'checkout did not wait'
+        first.close()
+        waiter.join(5)
+        assert got and not got[0].closed and db_pool.pool_status()['in_use'] == 2
+
+        # More threads than free connections: all of them are served in turn
+        got.pop().close()
+        done = []
+
+        def work():
+            conn = db_pool.get_connection(timeout=5)
+            time.sleep(0.01)
+            conn.close()
+            done.append(True)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        assert len(done) == 8 and db_pool.pool_status()['in_use'] == 1
+        second.close()
+    finally:
+        db_pool.reset_pool()
+    print("✅ Checkouts wait for a free connection, PoolError after the timeout")
+
+
+def test_reset_after_fork():
+    """Inherited connections are dropped without closing; shutdown closes them"""
+    pool = _install(StubPool())
+    conn = db_pool.get_connection()
+    db_pool.reset_pool(close_connections=False)
+    assert db_pool.pool_status()['initialized'] is False
+    assert not any(c.closed for c in pool.opened), "the parent's sessions must stay open"
+    conn.close()  # a request finishing after the reset still returns cleanly
+
+    pool = _install(StubPool())
+    db_pool._pool_pid = os.getpid() + 1  # pool created by the master before fork
+    assert db_pool.pool_status()['initialized'] is False
+
+    _install(pool)
+    conn = db_pool.get_connection()
+    db_pool.reset_pool(close_connections=True)
+    assert all(c.closed for c in pool.opened)
+    conn.close()  # returned to a closed pool: dropped, no error
+    print("✅ Pool reset after fork and on shutdown")
+
+
+def test_gunicorn_hooks():
+    """post_fork forgets the master's pool, worker_exit closes the worker's"""
+    spec = importlib.util.spec_from_file_location(
+        'gunicorn_conf', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'))
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+    logs = []
+    server = types.SimpleNamespace(log=types.SimpleNamespace(info=logs.append, warning=logs.append))
+    worker = types.SimpleNamespace(pid=4321)
+
+    pool = _install(StubPool())
+    conf.post_fork(server, worker)
+    assert db_pool._pool is None and not any(c.closed for c in pool.opened)
+    assert logs == ['Worker 4321 forked, database pool reset']
+
+    pool = _install(StubPool())
+    conf.worker_exit(server, worker)
+    assert db_pool._pool is None and all(c.closed for c in pool.opened)
+    print("✅ gunicorn hooks reset and close the pool")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_checkout_and_return, test_broken_connections_discarded, test_pool_exhaustion,
+             test_reset_after_fork, test_gunicorn_hooks]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test script for the challenge history export
+Validates the filters, the generated SQL, the keyset paging and the
+CSV/Parquet encoders (batch by batch, without a database)
+"""
+
+import io
+import csv
+import sys
+from datetime import date, datetime
+
+import psycopg2
+
+import export
+
+
+def _batches(count, size=7):
+    rows = [(i, f'strava_{i}', 'Ân', 'Lê, Văn' if i % 3 else None, i % 2 == 0, date(2026, 1, 5), date(2026, 1, 11),
+             20.0, 12.5 + i, 3, 360.0, 50.0, datetime(2026, 1, 6, 8, 30)) for i in range(count)]
+    return [rows[i:i + size] for i in range(0, count, size)]
+
+
+def test_filters():
+    """Dates snap to the week start; bad dates, ranges and clubs are rejected"""
+    filters = export.parse_filters('2026-01-07', '2026-03-01', 'strava')
+    assert filters == {'from_week': date(2026, 1, 5), 'to_week': date(2026, 2, 23), 'club': 'strava'}
+    assert export.parse_filters() == {'from_week': None, 'to_week': None, 'club': 'all'}
+    for args in (('2026-13-01',), ('2026-03-01', '2026-01-05'), (None, None, 'hienvuong')):
+        try:
+            export.parse_filters(*args)
+            assert False, f'{args} accepted'
+        except ValueError:
+            pass
+    print("✅ Export filters validated")
+
+
+def test_query():
+    """Only the given filters end up in the WHERE clause, values as parameters"""
+    query, params = export.build_query(export.parse_filters())
+    assert 'WHERE' not in query and 'ORDER BY wc.user_id, wc.start_date' in query
+    query, params = export.build_query(export.parse_filters('2026-01-05', None, 'registered'))
+    assert 'wc.start_date >= %(from_week)s' in query and 'u.is_external IS NOT TRUE' in query
+    assert 'to_week)s' not in query and params == {'from_week': date(2026, 1, 5), 'to_week': None}
+    assert 'LIMIT' not in query and 'after_week' not in query
+    query, params = export.build_query(export.parse_filters(), after=(42, date(2026, 1, 5)), limit=100)
+    assert '(wc.user_id, wc.start_date) > (%(after_user)s, %(after_week)s)' in query and 'LIMIT %(limit)s' in query
+    assert params['after_week'] == date(2026, 1, 5) and params['after_user'] == 42 and params['limit'] == 100
+    print("✅ Export query built from filters")
+
+
+class PageConnection:
+    """Pooled connection stand-in answering the keyset query from a sorted row list"""
+
+    def __init__(self, rows, log):
+        self.rows = rows
+        self.log = log
+        self.result = []
+
+    def cursor(self, cursor_factory=None):
+        return self
+
+    def execute(self, query, params):
+        after = (params['after_user'], params['after_week']) if 'after_week' in params else None
+        rows = [r for r in self.rows if after is None or (r[export.USER_ID], r[export.START_DATE]) > after]
+        self.result = rows[:params['limit']]
+        self.log.append('query')
+
+    def fetchall(self):
+        return self.result
+
+    def close(self):
+        if self.log[-1] != 'closed':
+            self.log.append('closed')
+
+
+def test_csv_streamed_per_batch():
+    """One chunk per batch, pulled lazily; the concatenation is a valid CSV"""
+    pulled = []
+
+    def source():
+        for rows in _batches(50):
+            pulled.append(len(rows))
+            yield rows
+
+    chunks = export.csv_chunks(source())
+    first = next(chunks)
+    assert len(pulled) == 1 and first.startswith(b'user_id,username,')
+    body = (first + b''.join(chunks)).decode('utf-8')
+    assert len(pulled) == 8
+    records = list(csv.DictReader(io.StringIO(body)))
+    assert len(records) == 50 and records[1]['last_name'] == 'Lê, Văn' and records[0]['last_name'] == ''
+    assert records[2]['start_date'] == '2026-01-05' and records[2]['total_distance'] == '14.5'
+    assert b''.join(export.csv_chunks([])).decode().count('\n') == 1
+    print("✅ CSV streamed batch by batch")
+
+
+def test_parquet_row_groups():
+    """Parquet output is readable and split into row groups as they fill"""
+    if export.pyarrow_modules() is None:
+        print("✅ pyarrow not installed, Parquet export unavailable")
+        return
+    _, pq = export.pyarrow_modules()
+    chunks = list(export.parquet_chunks(_batches(25), row_group_rows=10))
+    assert len(chunks) == 3 and all(chunks)
+    parquet = pq.ParquetFile(io.BytesIO(b''.join(chunks)))
+    assert parquet.metadata.num_rows == 25 and parquet.num_row_groups == 3
+    table = parquet.read()
+    assert table.column_names == [name for name, _ in export.COLUMNS]
+    assert table.column('start_date')[0].as_py() == date(2026, 1, 5) and table.column('last_name')[0].as_py() is None
+    print("✅ Parquet written in row groups")
+
+
+def test_keyset_batches():
+    """Every row read once, page by page, each connection returned before its batch is sent"""
+    rows = [row for batch in _batches(23) for row in batch]
+    log = []
+    original = export.db_pool.get_connection
+    export.db_pool.get_connection = lambda database_url=None: PageConnection(rows, log)
+    try:
+        batches = []
+        for batch in export.iter_batches(None, export.parse_filters(), batch_rows=10):
+            assert log[-1] == 'closed', 'connection held while the batch is sent'
+            batches.append(batch)
+        assert [len(batch) for batch in batches] == [10, 10, 3]
+        assert [row[0] for batch in batches for row in batch] == list(range(23))
+        assert log.count('query') == 3
+
+        log.clear()
+        exact = list(export.iter_batches(None, export.parse_filters(), batch_rows=23))
+        assert [len(batch) for batch in exact] == [23] and log.count('query') == 2
+    finally:
+        export.db_pool.get_connection = original
+    print("✅ Export read in short keyset-paginated batches")
+
+
+def test_database_error_raised():
+    """An unreachable database fails the export before any byte is produced"""
+    chunks = export.export_chunks('postgresql://127.0.0.1:1/none?connect_timeout=1', export.parse_filters(), 'csv')
+    try:
+        next(chunks)
+        assert False, 'export produced data without a database'
+    except psycopg2.Error:
+        pass
+    print("✅ Database errors surface before streaming")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_filters, test_query, test_keyset_batches, test_csv_streamed_per_batch, test_parquet_row_groups,
+             test_database_error_raised]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test script for the health and readiness probes
+Validates liveness, template warmup and the database check without Postgres
+"""
+
+import sys
+import time
+
+from flask import Flask
+
+import db_pool
+import health
+
+UNREACHABLE_DATABASE = 'postgresql://probe@127.0.0.1:1/probe?connect_timeout=1'
+
+
+def make_app():
+    app = Flask(__name__)
+    health.init_app(app, UNREACHABLE_DATABASE)
+    return app
+
+
+def test_healthz():
+    """Liveness does not depend on the database"""
+    response = make_app().test_client().get('/healthz')
+    assert response.status_code == 200 and response.get_json() == {'status': 'ok'}
+    print("✅ /healthz answers without dependencies")
+
+
+def test_readyz_reports_database_down():
+    """Boot warmup compiles templates, records the failed ping and keeps readiness off"""
+    client = make_app().test_client()
+    first = client.get('/readyz')
+    assert first.status_code == 503
+
+    deadline = time.time() + 5
+    body = first.get_json()
+    while time.time() < deadline and not body['checks']['warmup']['ok']:
+        time.sleep(0.05)
+        body = client.get('/readyz').get_json()
+
+    assert body['status'] == 'not_ready'
+    assert body['checks']['templates']['ok'], body
+    assert not body['checks']['database']['ok'] and body['checks']['database']['error'], body
+    steps = body['checks']['warmup']['steps']
+    assert steps['templates']['ok'] and not steps['database']['ok'], steps
+    db_pool.reset_pool()
+    print("✅ /readyz stays not ready after warmup while the database is unreachable")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_healthz, test_readyz_reports_database_down]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
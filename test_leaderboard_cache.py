@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test script for the leaderboard result cache
+Validates single-flight coalescing, stale-while-revalidate refreshes,
+background warm-up, the snapshot fallback when the database fails and
+the JSON snapshot format
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from leaderboard_cache import CacheEntry, LeaderboardCache, SingleFlight, SnapshotStore
+
+
+def test_single_flight_coalesces():
+    """Concurrent callers of one key share a single computation"""
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return 'kết quả'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('week', compute)))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    while not flight.in_flight('week'):
+        time.sleep(0.001)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1, calls
+    assert sorted(shared for _, shared in results) == [False] + [True] * 9
+    assert all(value == 'kết quả' for value, _ in results)
+    print("✅ Concurrent misses share one computation")
+
+
+def test_single_flight_shares_errors():
+    """Waiters see the leader's exception, and the next call retries"""
+    flight = SingleFlight()
+    try:
+        flight.do('week', lambda: 1 / 0)
+        assert False, 'expected ZeroDivisionError'
+    except ZeroDivisionError:
+        pass
+    assert flight.do('week', lambda: 42) == (42, False)
+    print("✅ Failed computations are not cached")
+
+
+def test_stale_while_revalidate():
+    """Expired entries are served at once while one refresh runs"""
+    loads = []
+    release = threading.Event()
+
+    def loader(week):
+        loads.append(week)
+        if len(loads) > 1:
+            release.wait(2)
+        return len(loads)
+
+    cache = LeaderboardCache(loader, ttl=60, snapshots=SnapshotStore(None))
+    assert cache.get('2026-10-19').value == 1
+    assert cache.get('2026-10-19').value == 1 and len(loads) == 1
+
+    cache.invalidate('2026-10-19')
+    started = time.perf_counter()
+    for _ in range(5):
+        assert cache.get('2026-10-19').value == 1
+    assert time.perf_counter() - started < 0.5, 'stale reads must not wait for the refresh'
+
+    release.set()
+    deadline = time.time() + 2
+    while cache.get('2026-10-19').value != 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.get('2026-10-19').value == 2
+    assert len(loads) == 2, loads
+    print("✅ Stale entries are served while a single refresh runs")
+
+
+def test_refresh_warms_cold_key():
+    """refresh() loads a key in the background so the first request is a hit"""
+    release = threading.Event()
+    loads = []
+
+    def loader(week):
+        release.wait(2)
+        loads.append(week)
+        return len(loads)
+
+    cache = LeaderboardCache(loader, ttl=60, snapshots=SnapshotStore(None))
+    assert cache.refresh('2026-10-19')
+    assert not cache.refresh('2026-10-19'), 'a second warm-up must join the load in flight'
+    release.set()
+    deadline = time.time() + 2
+    while not loads and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    entry = cache.get('2026-10-19')
+    assert entry.value == 1 and entry.is_fresh(60) and loads == ['2026-10-19']
+    print("✅ refresh() warms a key in the background")
+
+
+def test_snapshot_fallback():
+    """A restarted worker serves the saved copy while the database is down or slow"""
+    with tempfile.TemporaryDirectory() as tmp:
+        LeaderboardCache(lambda week: {'rows': ['An', 'Bình']}, snapshots=SnapshotStore(tmp)).get('2026-10-19')
+
+        def down(week):
+            raise ConnectionError('could not connect to server')
+
+        restarted = LeaderboardCache(down, snapshots=SnapshotStore(tmp), retry_seconds=60)
+        entry = restarted.get('2026-10-19')
+        assert entry.value == {'rows': ['An', 'Bình']} and entry.degraded
+        assert 'could not connect' in entry.last_error
+
+        try:
+            restarted.get('2026-10-26')
+            assert False, 'expected ConnectionError for a week without snapshot'
+        except ConnectionError:
+            pass
+
+        def slow(week):
+            time.sleep(0.5)
+            return {'rows': ['mới']}
+
+        slow_cache = LeaderboardCache(slow, snapshots=SnapshotStore(tmp), latency_budget=0.05)
+        started = time.perf_counter()
+        assert slow_cache.get('2026-10-19').value == {'rows': ['An', 'Bình']}
+        assert time.perf_counter() - started < 0.4
+        time.sleep(0.6)
+        assert slow_cache.get('2026-10-19').value == {'rows': ['mới']}
+    print("✅ Saved snapshots are served when the database is down or slow")
+
+
+def test_snapshot_json():
+    """Snapshots are JSON that load back with dates and decimals; foreign directories are refused"""
+    value = {'week': date(2026, 10, 19), 'last_update': datetime(2026, 10, 19, 8, 30),
+             'results': [{'name': 'An', 'total_distance': Decimal('12.50'), 'runs': 3}]}
+    with tempfile.TemporaryDirectory() as tmp:
+        SnapshotStore(tmp).save('2026-10-19', CacheEntry(value, 1000.0))
+        with open(os.path.join(tmp, '2026-10-19.json'), encoding='utf-8') as f:
+            assert json.load(f)['value']['week'] == {'__date__': '2026-10-19'}
+        entry = SnapshotStore(tmp).load('2026-10-19')
+        assert entry.value == value and entry.loaded_at == 1000.0
+
+        if hasattr(os, 'getuid') and os.getuid() == 0:
+            os.chown(tmp, 12345, -1)
+            assert SnapshotStore(tmp).load('2026-10-19') is None
+            os.chown(tmp, 0, -1)
+    print("✅ Snapshots stored as JSON in a directory owned by the app user")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_single_flight_coalesces, test_single_flight_shares_errors, test_stale_while_revalidate,
+             test_refresh_warms_cold_key, test_snapshot_fallback, test_snapshot_json]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
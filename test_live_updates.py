@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test script for live leaderboard updates
+Validates row diffing, the SSE frames sent to a subscriber (event ids and
+the replay after a reconnect) and the versioned "changes since" lookup
+"""
+
+import os
+import sys
+import queue
+from datetime import date
+
+import leaderboard
+import live_updates
+from live_updates import LeaderboardBroker, diff_rows, sse_stream
+
+
+def row(username, total_distance):
+    return {'username': username, 'total_distance': total_distance, 'status': 'Cần bào thêm nữa'}
+
+
+def test_diff_rows():
+    """Only changed rows are reported and the snapshot follows the new state"""
+    snapshot = {}
+    first = diff_rows(snapshot, [row('a', 5), row('b', 3)])
+    assert [r['username'] for r in first['changed']] == ['a', 'b']
+    assert first['order_changed']
+
+    unchanged = diff_rows(snapshot, [row('a', 5), row('b', 3)])
+    assert unchanged['changed'] == [] and unchanged['removed'] == [] and not unchanged['order_changed']
+
+    moved = diff_rows(snapshot, [row('b', 8), row('c', 1)])
+    assert [r['username'] for r in moved['changed']] == ['b', 'c']
+    assert moved['removed'] == ['a']
+    assert moved['order'] == ['b', 'c'] and moved['order_changed']
+    assert list(snapshot) == ['b', 'c']
+    print("✅ Row diff reports changes, removals and order")
+
+
+def test_sse_stream_frames():
+    """Queued payloads become delta events and a None ends the stream"""
+    week = date(2026, 10, 19)
+    broker = LeaderboardBroker(None, lambda week_start, snapshot: None)
+    subscriber = queue.Queue()
+    broker._subscribers[week] = {subscriber}
+    broker._broadcast(week, {'changed': [], 'removed': ['a']})
+    broker._broadcast(week, {'version': 7, 'changed': []})
+    subscriber.put(None)
+
+    frames = list(sse_stream(broker, week, subscriber))
+    assert frames[0].startswith('retry: 5000\n')
+    assert frames[1] == 'event: delta\ndata: {"changed": [], "removed": ["a"]}\n\n', frames[1]
+    assert frames[2] == 'id: 7\nevent: delta\ndata: {"version": 7, "changed": []}\n\n', frames[2]
+    assert len(frames) == 3
+    assert broker.subscriber_count() == 0
+    print("✅ SSE stream emits delta frames and unsubscribes on close")
+
+
+def test_sse_replay_first():
+    """Rows missed while reconnecting are sent before live deltas, with the version as event id"""
+    week = date(2026, 10, 19)
+    broker = LeaderboardBroker(None, lambda week_start, snapshot: None)
+    subscriber = queue.Queue()
+    broker._subscribers[week] = {subscriber}
+    broker._broadcast(week, {'version': 9, 'changed': ['live']})
+    subscriber.put(None)
+
+    frames = list(sse_stream(broker, week, subscriber, replay={'version': 8, 'changed': ['missed']}))
+    assert frames[1].startswith('id: 8\nevent: delta\n') and 'missed' in frames[1]
+    assert frames[2].startswith('id: 9\n') and 'live' in frames[2]
+    for header, expected in (('12', 12), ('0', None), ('', None), (None, None), ('abc', None)):
+        assert live_updates.parse_event_id(header) == expected, header
+    print("✅ Missed changes replayed on reconnect")
+
+
+def test_subscriber_cap():
+    """Streams beyond SSE_MAX_CLIENTS are refused; threads are always left for pages"""
+    assert live_updates.SSE_MAX_CLIENTS >= 1
+    broker = LeaderboardBroker(None, lambda week_start, snapshot: None)
+    broker._listener_pid = os.getpid()  # no LISTEN thread in tests
+    week = date(2026, 10, 19)
+    subscribers = [broker.subscribe(week) for _ in range(live_updates.SSE_MAX_CLIENTS)]
+    assert all(subscribers) and broker.subscribe(week) is None
+    broker.unsubscribe(week, subscribers[0])
+    assert broker.subscribe(week) is not None
+    print("✅ Stream count capped per worker")
+
+
+class FakeCursor:
+    """Answers the leaderboard queries from an in-memory week"""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.result = []
+
+    def execute(self, query, params=None):
+        if 'FROM leaderboard_versions' in query:
+            self.result = [{'version': self.version}]
+        elif query == leaderboard.CHANGES_QUERY:
+            self.result = [r for r in self.rows if r['data_version'] > params[1]]
+        elif query == leaderboard.ORDER_QUERY:
+            self.result = [{'username': r['username']} for r in self.rows]
+        else:
+            self.result = list(self.rows)
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+
+def test_changes_since():
+    """Only rows newer than the client version are returned"""
+    rows = [dict(row('a', 9), data_version=4), dict(row('b', 7), data_version=2)]
+
+    changes = leaderboard.get_changes_since(FakeCursor(4, rows), date(2026, 10, 19), 2)
+    assert not changes['full'] and [r['username'] for r in changes['rows']] == ['a']
+    assert changes['version'] == 4 and changes['order'] == ['a', 'b']
+
+    current = leaderboard.get_changes_since(FakeCursor(4, rows), date(2026, 10, 19), 4)
+    assert current['rows'] == [] and current['order'] == [] and current['version'] == 4
+
+    for since in (0, 9):
+        resync = leaderboard.get_changes_since(FakeCursor(4, rows), date(2026, 10, 19), since)
+        assert resync['full'] and len(resync['rows']) == 2, since
+    print("✅ Changes since a version skip rows the client already has")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_diff_rows, test_sse_stream_frames, test_sse_replay_first, test_subscriber_cap, test_changes_since]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
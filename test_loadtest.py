@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script for the load test suite
+Validates percentile math, scenario coverage and one short run against a
+local in-process server (no database needed)
+"""
+
+import sys
+import threading
+
+from flask import Flask
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+import loadtest
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def test_percentiles():
+    """Nearest-rank percentiles of a known distribution"""
+    values = [i / 1000 for i in range(1, 101)]
+    assert loadtest.percentile(values, 50) == 0.05
+    assert loadtest.percentile(values, 95) == 0.095
+    assert loadtest.percentile(values, 99) == 0.099
+    assert loadtest.percentile([], 50) is None
+    summary = loadtest.summarize(values, {'200': 98, '500': 2}, 1, 10.0)
+    assert summary['requests'] == 101 and summary['errors'] == 3
+    assert summary['throughput_rps'] == 10.0 and summary['p99_ms'] == 99.0
+    print("✅ Percentiles and summaries are correct")
+
+
+def test_scenarios_cover_pages():
+    """Both views of current and past weeks plus the other pages are driven"""
+    names = [s['name'] for s in loadtest.build_scenarios()]
+    for required in ('weekly_results_current_table', 'weekly_results_current_cards',
+                     'weekly_results_past4w_table', 'register', 'feedback', 'admin_feedback', 'reports'):
+        assert required in names, names
+    assert len(names) == len(set(names))
+    print("✅ Scenarios cover every page")
+
+
+def test_short_run():
+    """A short closed-loop run against a local server reports throughput"""
+    app = Flask(__name__)
+    app.add_url_rule('/page', 'page', lambda: 'ok')
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        result = loadtest.run_scenario(f"http://127.0.0.1:{server.server_port}", {'name': 'page', 'path': '/page'},
+                                       concurrency=2, duration=0.5, warmup=0.1)
+    finally:
+        server.shutdown()
+    assert result['errors'] == 0 and result['statuses'].get('200', 0) > 0, result
+    assert result['throughput_rps'] > 0 and result['p50_ms'] <= result['p99_ms'], result
+    print(f"✅ Short run measured {result['throughput_rps']} rps")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_percentiles, test_scenarios_cover_pages, test_short_run]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
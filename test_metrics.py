@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test script for the metrics module
+Validates histogram bucketing, Prometheus rendering and the folding of
+exited processes' snapshots, without a database
+"""
+
+import os
+import sys
+import json
+import types
+import tempfile
+import importlib.util
+
+import metrics
+
+
+def test_histogram_buckets():
+    """Observations land in cumulative `le` buckets"""
+    hist = metrics.Histogram('test_latency_seconds', 'Test latency', ('endpoint',), buckets=(0.1, 1.0))
+    hist.observe(0.05, endpoint='home')
+    hist.observe(0.1, endpoint='home')
+    hist.observe(5.0, endpoint='home')
+
+    counts, total, count = hist.snapshot()['samples'][0][1]
+    assert counts == [2, 0, 1], counts
+    assert count == 3
+    assert abs(total - 5.15) < 1e-9
+    print("✅ Histogram bucketing is correct")
+
+
+def test_render_prometheus():
+    """Registered metrics render in the text exposition format"""
+    metrics.REQUEST_SECONDS.observe(0.02, endpoint='weekly_results', method='GET', status=200)
+    metrics.CRAWLER_RUNS.inc(result='success')
+    output = metrics.render_prometheus()
+
+    assert '# TYPE http_request_duration_seconds histogram' in output
+    assert 'http_request_duration_seconds_bucket{endpoint="weekly_results",method="GET",status="200",le="0.025"}' in output
+    assert 'http_request_duration_seconds_bucket{endpoint="weekly_results",method="GET",status="200",le="+Inf"}' in output
+    assert 'crawler_runs_total{result="success"}' in output
+    print("✅ Prometheus output rendered")
+
+
+def test_unit_accounting():
+    """DB statements are attributed to the active unit of work"""
+    stats = metrics.begin_unit('test_unit')
+    metrics.observe_db_query(0.01)
+    metrics.observe_db_query(0.02)
+    assert metrics.end_unit() is stats
+    assert stats.db_queries == 2
+    assert abs(stats.db_seconds - 0.03) < 1e-9
+    assert metrics.current_unit() is None
+    print("✅ Unit of work accounting is correct")
+
+
+def test_retired_snapshots():
+    """Exited processes are folded into one file and the merged totals do not change"""
+    saved = metrics.METRICS_MULTIPROC_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        metrics.METRICS_MULTIPROC_DIR = tmp
+        try:
+            counter = metrics.Counter('test_jobs_total', 'Test jobs', ('result',))
+            hist = metrics.Histogram('test_job_seconds', 'Test job time', buckets=(1.0,))
+            for pid, jobs in ((111, 2), (222, 3), (333, 5)):
+                counter._values, hist._values = {}, {}
+                counter.inc(jobs, result='ok')
+                hist.observe(0.5)
+                with open(os.path.join(tmp, f"metrics_{pid}.json"), 'w', encoding='utf-8') as f:
+                    json.dump({'test_jobs_total': counter.snapshot(), 'test_job_seconds': hist.snapshot()}, f)
+
+            def totals():
+                merged = metrics.collect()
+                return (merged['test_jobs_total']['samples'][('ok',)],
+                        merged['test_job_seconds']['samples'][()][2])
+
+            assert totals() == (10, 3)
+            assert metrics.retire_snapshot(111) and metrics.retire_snapshot(222)
+            assert not metrics.retire_snapshot(111), 'a snapshot is folded only once'
+            assert totals() == (10, 3), totals()
+
+            # The gunicorn master retires each worker it reaps
+            spec = importlib.util.spec_from_file_location(
+                'gunicorn_conf', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'))
+            conf = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(conf)
+            conf.child_exit(types.SimpleNamespace(log=None), types.SimpleNamespace(pid=333))
+            assert totals() == (10, 3), totals()
+            assert sorted(name for name in os.listdir(tmp) if name.endswith('.json')) == [metrics.RETIRED_SNAPSHOT]
+        finally:
+            metrics.METRICS_MULTIPROC_DIR = saved
+    print("✅ Snapshots of exited processes folded into the retired total")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_histogram_buckets, test_render_prometheus, test_unit_accounting, test_retired_snapshots]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
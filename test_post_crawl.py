@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test script for the post-crawl pipeline
+Validates step order, retries, background coalescing, the week summaries
+and report rendering outside the web app
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+from datetime import date
+
+import post_crawl
+import report_engine
+from reports_manifest import ReportsManifest
+
+WEEK = date(2026, 1, 5)
+LAST_WEEK = date(2025, 12, 29)
+
+
+def _results():
+    return [
+        {'first_name': 'An', 'last_name': 'Lê', 'distance_goal': 35, 'total_distance': 40.5, 'runs': 4,
+         'average_pace': 330, 'elevation_gain': 120, 'status': 'Hoàn thành kế hoạch'},
+        {'first_name': 'Bình', 'last_name': None, 'distance_goal': 45, 'total_distance': 20.0, 'runs': 2,
+         'average_pace': 390, 'elevation_gain': 30, 'status': 'Cần bào thêm nữa'},
+        {'first_name': 'Chi', 'last_name': '', 'distance_goal': None, 'total_distance': None, 'runs': None,
+         'average_pace': None, 'elevation_gain': None, 'status': 'Chạy chui'}
+    ]
+
+
+def test_default_steps():
+    """The crawler's pipeline runs its steps in the documented order"""
+    assert post_crawl.pipeline.steps == ['summary_stats', 'regenerate_reports']
+    assert post_crawl.recent_weeks(WEEK) == [WEEK, LAST_WEEK]
+    print("✅ Default post-crawl steps registered in order")
+
+
+def test_order_and_retries():
+    """Steps run in order; failures are retried, then recorded without stopping later steps"""
+    calls = []
+    flaky = {'failures': 1}
+
+    def record(name):
+        def step(context):
+            calls.append(name)
+            return name
+        return step
+
+    def flaky_step(context):
+        calls.append('flaky')
+        if flaky['failures']:
+            flaky['failures'] -= 1
+            raise RuntimeError('database restarting')
+        return 'recovered'
+
+    def broken_step(context):
+        calls.append('broken')
+        raise RuntimeError('no luck')
+
+    pipeline = post_crawl.Pipeline(retries=2, retry_seconds=0)
+    pipeline.add_step('first', record('first'))
+    pipeline.add_step('flaky', flaky_step)
+    pipeline.add_step('broken', broken_step)
+    pipeline.add_step('last', record('last'), retries=0)
+    run = pipeline.run({'weeks': [WEEK], 'current_week': WEEK})
+
+    assert calls == ['first', 'flaky', 'flaky', 'broken', 'broken', 'broken', 'last']
+    steps = run['steps']
+    assert list(steps) == ['first', 'flaky', 'broken', 'last']
+    assert steps['flaky'] == {'ok': True, 'detail': 'recovered', 'attempts': 2, 'ms': steps['flaky']['ms']}
+    assert not steps['broken']['ok'] and steps['broken']['error'] == 'no luck' and steps['broken']['attempts'] == 3
+    assert steps['last']['ok'] and run['weeks'] == ['2026-01-05'] and pipeline.last_run is run
+    print("✅ Steps run in order with retries")
+
+
+def test_trigger_coalesces():
+    """Crawls finishing during a run are merged into a single follow-up run"""
+    release = threading.Event()
+    started = threading.Event()
+    runs = []
+
+    def step(context):
+        runs.append(list(context['weeks']))
+        started.set()
+        release.wait(5)
+
+    pipeline = post_crawl.Pipeline(retries=0, retry_seconds=0)
+    pipeline.add_step('slow', step)
+    assert pipeline.trigger([WEEK], WEEK)
+    assert started.wait(5)
+    assert pipeline._thread.daemon, 'the pipeline must not hold up a web worker shutdown'
+    assert not pipeline.trigger([WEEK, LAST_WEEK], WEEK)
+    assert not pipeline.trigger([LAST_WEEK], WEEK)
+    release.set()
+    assert pipeline.wait(5)
+    assert runs == [[WEEK], [WEEK, LAST_WEEK]]
+    assert pipeline.trigger([WEEK], WEEK) and pipeline.wait(5) and len(runs) == 3
+    print("✅ Background runs coalesced")
+
+
+def test_week_summary():
+    """Summary numbers from the week's standings"""
+    summary = post_crawl.week_summary(WEEK, _results())
+    assert summary['participants'] == 3 and summary['registered'] == 2 and summary['completed'] == 1
+    assert summary['total_km'] == 60 and summary['completion_rate'] == 0.5
+    assert summary['total_runs'] == 6 and summary['total_elevation'] == 150 and summary['avg_pace'] == 360
+    assert [a['name'] for a in summary['top_distance']] == ['An Lê', 'Bình']
+    print("✅ Week summary computed")
+
+
+def test_summary_written_for_reports_page():
+    """Summaries land in .data/weekly_reports and show up on /reports"""
+    with tempfile.TemporaryDirectory() as data_path:
+        context = {'weeks': [WEEK, LAST_WEEK], 'current_week': WEEK, 'data_path': data_path,
+                   'standings': {WEEK: {'results': _results()}, LAST_WEEK: {'results': []}}}
+        assert post_crawl.summary_stats(context) == '2 week summaries'
+        with open(os.path.join(data_path, 'weekly_reports', 'tong_ket_tuan_2026-01-05.json'), encoding='utf-8') as f:
+            summary = json.load(f)
+        assert summary['week'] == '2026-01-05' and summary['participants'] == 3 and summary['generated_at']
+        names = [report['name'] for report in ReportsManifest(data_path).get()['weekly_reports']]
+        assert sorted(names) == ['tong_ket_tuan_2025-12-29.json', 'tong_ket_tuan_2026-01-05.json']
+    print("✅ Week summaries written to the reports folder")
+
+
+def test_reports_render_outside_app():
+    """The crawler's Jinja environment renders both report templates"""
+    weeks = report_engine.report_weeks(WEEK, weeks=4)
+    rows = [{'user_id': 1, 'first_name': 'An', 'last_name': 'Lê', 'username': 'strava_1', 'start_date': week,
+             'distance_goal': 20, 'total_distance': 25, 'runs': 3, 'average_pace': 350, 'elevation_gain': 40}
+            for week in weeks]
+    analytics = report_engine.build_report(rows, weeks, engine='python')
+    analytics['meta'] = {'generated_at': '2026-01-05T08:00:00', 'rows': len(rows), 'query_ms': 1.0,
+                         'analysis_ms': 1.0, 'engine': 'python'}
+    for spec in report_engine.REPORTS.values():
+        html = post_crawl.report_environment().get_template(spec['template']).render(report=spec, analytics=analytics)
+        assert 'An Lê' in html and '</html>' in html
+    print("✅ Reports render without the web app")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_default_steps, test_order_and_retries, test_trigger_coalesces, test_week_summary,
+             test_summary_written_for_reports_page, test_reports_render_outside_app]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
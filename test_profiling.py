@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for on-demand request profiling
+Validates that only admin requests with the switch are profiled and saved
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+from flask import Flask, session
+
+import profiling
+
+
+def make_app():
+    """Fresh app writing profiles to an empty directory"""
+    profiling.PROFILE_DIR = tempfile.mkdtemp(prefix='profiles_')
+    profiling.PROFILE_RETAIN = 3
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    profiling.init_app(app, lambda: session.get('authenticated', False))
+
+    @app.route('/page')
+    def page():
+        return 'ok'
+
+    @app.route('/broken')
+    def broken():
+        raise RuntimeError('boom')
+
+    return app
+
+
+def test_profiles_admin_requests_only():
+    """Anonymous requests and requests without the switch are not profiled"""
+    client = make_app().test_client()
+    assert 'X-Profile-Id' not in client.get('/page?_profile=1').headers
+
+    with client.session_transaction() as s:
+        s['authenticated'] = True
+    assert 'X-Profile-Id' not in client.get('/page').headers
+
+    profile_id = client.get('/page?_profile=1').headers['X-Profile-Id']
+    assert client.get('/page', headers={'X-Profile': '1'}).headers['X-Profile-Id'] != profile_id
+
+    profiles = profiling.list_profiles()
+    assert len(profiles) == 2 and profile_id in [p['id'] for p in profiles], profiles
+    summary = next(p for p in profiles if p['id'] == profile_id)
+    assert summary['path'] == '/page?_profile=1' and summary['status'] == 200, summary
+    assert 'function calls' in profiling.render_stats(profile_id, 'tottime')
+    print("✅ Only admin requests with the switch are profiled")
+
+
+def test_failed_request_releases_profiler():
+    """A view that raises does not leave the profiler running"""
+    app = make_app()
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s['authenticated'] = True
+    client.get('/broken?_profile=1')
+    assert not profiling._profile_lock.locked()
+    assert 'X-Profile-Id' in client.get('/page?_profile=1').headers
+    print("✅ Failing requests release the profiler")
+
+
+def test_retention_and_ids():
+    """Old profiles are pruned and malformed ids are rejected"""
+    client = make_app().test_client()
+    with client.session_transaction() as s:
+        s['authenticated'] = True
+    for _ in range(profiling.PROFILE_RETAIN + 2):
+        client.get('/page?_profile=1')
+    assert len(profiling.list_profiles()) == profiling.PROFILE_RETAIN
+    assert profiling.profile_file('../etc/passwd') is None
+    assert profiling.render_stats('20260101T000000_missing_000000') is None
+    print("✅ Retention limit and id validation work")
+
+
+def test_foreign_directory_refused():
+    """Profiles are neither saved to nor read from a directory owned by another user"""
+    client = make_app().test_client()
+    with client.session_transaction() as s:
+        s['authenticated'] = True
+    profile_id = client.get('/page?_profile=1').headers['X-Profile-Id']
+    assert profiling.profile_file(profile_id) is not None
+
+    real_getuid = os.getuid
+    os.getuid = lambda: real_getuid() + 1  # the directory now belongs to someone else
+    try:
+        assert 'X-Profile-Id' not in client.get('/page?_profile=1').headers
+        assert profiling.list_profiles() == []
+        assert profiling.profile_file(profile_id) is None and profiling.render_stats(profile_id) is None
+    finally:
+        os.getuid = real_getuid
+    assert len(profiling.list_profiles()) == 1
+    print("✅ Profile directory owned by another user is refused")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_profiles_admin_requests_only, test_failed_request_releases_profiler, test_retention_and_ids,
+             test_foreign_directory_refused]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+        finally:
+            shutil.rmtree(profiling.PROFILE_DIR, ignore_errors=True)
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
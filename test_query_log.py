@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test script for SQL instrumentation
+Validates statement fingerprints, per-unit accounting, N+1 detection and the
+slow-query log without a database
+"""
+
+import sys
+import logging
+
+import psycopg2.extensions
+
+import metrics
+import query_log
+
+
+class FakeConnection:
+    """Records EXPLAIN/savepoint statements issued by query_log.explain"""
+
+    autocommit = False
+
+    def __init__(self):
+        self.executed = []
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, connection, query=None):
+        self.connection = connection
+        self.query = query
+
+    def execute(self, statement, vars=None):
+        self.connection.executed.append(statement)
+
+    def fetchall(self):
+        return [{'QUERY PLAN': 'Seq Scan on users  (cost=0.00..1.05 rows=1 width=72)'}]
+
+    def close(self):
+        pass
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def capture_logs():
+    handler = Capture()
+    query_log.logger.addHandler(handler)
+    query_log.logger.setLevel(logging.INFO)
+    return handler
+
+
+def test_fingerprint():
+    """Literals, parameters and IN lists collapse to one shape"""
+    a = query_log.fingerprint("SELECT * FROM users WHERE username = %s  -- lookup")
+    b = query_log.fingerprint("SELECT * FROM users\n  WHERE username = 'strava_42'")
+    assert a == b == 'SELECT * FROM users WHERE username = ?', (a, b)
+    assert query_log.fingerprint('SELECT 1 FROM t WHERE id IN (1, 2, 3)') == \
+        query_log.fingerprint('SELECT 7 FROM t WHERE id IN (%s,%s)') == 'SELECT ? FROM t WHERE id IN (?...)'
+    assert query_log.fingerprint("INSERT INTO t VALUES (%s, %s), (%s, %s)") == 'INSERT INTO t VALUES (?...)'
+    print("✅ Statement fingerprints are stable")
+
+
+def test_repeat_detection():
+    """A shape repeated within one unit is flagged once; other units start clean"""
+    logs = capture_logs()
+    with query_log.unit('test.loop') as stats:
+        for i in range(query_log.QUERY_REPEAT_THRESHOLD + 2):
+            query_log.observe_query(f"SELECT * FROM users WHERE id = {i}", 0.001, 1)
+        query_log.observe_query("SELECT COUNT(*) FROM users", 0.001, 1)
+    assert stats.db_queries == query_log.QUERY_REPEAT_THRESHOLD + 3
+    repeated = query_log.repeated_statements(stats)
+    assert len(repeated) == 1 and repeated[0][1] == query_log.QUERY_REPEAT_THRESHOLD + 2, repeated
+    warnings = [m for m in logs.messages if m.startswith('Possible N+1 in test.loop')]
+    assert len(warnings) == 1, logs.messages
+    assert any(m.startswith('Unit test.loop:') for m in logs.messages), logs.messages
+    assert metrics.current_unit() is None
+
+    with query_log.unit('test.other') as other:
+        query_log.observe_query("SELECT * FROM users WHERE id = 1", 0.001, 1)
+    assert query_log.repeated_statements(other) == []
+    print("✅ Repeated statements are detected per unit of work")
+
+
+def test_slow_query_explain():
+    """Slow statements are logged with their plan, inside a savepoint"""
+    logs = capture_logs()
+    conn = FakeConnection()
+    cursor = FakeCursor(conn, b"SELECT * FROM users WHERE username = 'strava_1'")
+    with query_log.unit('test.slow'):
+        query_log.observe_query("SELECT * FROM users WHERE username = %s",
+                                query_log.SLOW_QUERY_MS / 1000 + 0.01, 1, cursor)
+    slow = [m for m in logs.messages if m.startswith('Slow query in test.slow')]
+    assert slow and 'Seq Scan on users' in slow[0], logs.messages
+    assert conn.executed[0] == 'SAVEPOINT query_log_explain'
+    assert conn.executed[1].startswith("EXPLAIN SELECT * FROM users WHERE username = 'strava_1'")
+    assert conn.executed[-1] == 'RELEASE SAVEPOINT query_log_explain'
+    print("✅ Slow queries are logged with EXPLAIN output")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_fingerprint, test_repeat_detection, test_slow_query_explain]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
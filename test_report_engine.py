@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Test script for the in-process report engine
+Validates the analytics on synthetic data, the rendered outputs and the
+background job status files
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import tempfile
+import threading
+from datetime import date
+
+from flask import Flask
+from markupsafe import escape
+
+import report_engine
+import synthetic_data
+
+END_WEEK = date(2026, 1, 5)
+
+
+def synthetic_rows(users=60, weeks=12, seed=3):
+    """weekly_challenges rows joined with users, as load_rows returns them"""
+    names = {row[0]: row for row in synthetic_data.generate_users(users, seed, END_WEEK, weeks)}
+    rows = []
+    for row in synthetic_data.generate_challenges(users, weeks, seed, END_WEEK):
+        record = dict(zip(synthetic_data.CHALLENGE_COLUMNS, row))
+        user = names[record['user_id']]
+        record.update(first_name=user[2], last_name=user[3], username=user[1])
+        rows.append({key: record[key] for key in ('user_id', 'first_name', 'last_name', 'username', 'start_date',
+                                                  'distance_goal', 'total_distance', 'runs', 'average_pace',
+                                                  'elevation_gain')})
+    return rows
+
+
+def test_analytics():
+    """Totals match the rows; categories, trends and insights are consistent"""
+    rows = synthetic_rows()
+    weeks = report_engine.report_weeks(END_WEEK)
+    report = report_engine.build_report(rows, weeks, engine='python')
+    assert report['weeks'][0] == '2025-10-20' and report['weeks'][-1] == END_WEEK.isoformat()
+    assert abs(report['summary']['total_km'] - sum(r['total_distance'] for r in rows)) < 1
+    assert sum(w['athletes'] for w in report['weekly']) == sum(1 for r in rows if r['total_distance'] > 0)
+    assert sum(report['categories'].values()) == report['summary']['athletes'] == len({r['user_id'] for r in rows})
+    totals = [a['total_km'] for a in report['athletes']]
+    assert totals == sorted(totals, reverse=True)
+    for athlete in report['athletes']:
+        assert athlete['recommendations'] and athlete['category'] in report_engine.CATEGORIES
+        assert 0 <= athlete['completion_rate'] <= 1 and 0 <= athlete['consistency'] <= 1
+    for athlete in report['insights']['at_risk']:
+        assert athlete['last2_km'] == 0 and athlete['weeks_active'] >= 3
+    json.dumps(report)
+    print(f"✅ Analytics for {report['summary']['athletes']} athletes over {len(weeks)} weeks")
+
+
+def test_known_athlete():
+    """Hand-computed numbers for one athlete"""
+    weeks = report_engine.report_weeks(END_WEEK, weeks=6)
+    rows = [{'user_id': 1, 'first_name': 'An', 'last_name': 'Lê', 'username': 'strava_1', 'start_date': week,
+             'distance_goal': 20, 'total_distance': distance, 'runs': 2, 'average_pace': 360, 'elevation_gain': 50}
+            for week, distance in zip(weeks, [30, 30, 10, 0, 0, 0])]
+    report = report_engine.build_report(rows, weeks, engine='python')
+    athlete = report['athletes'][0]
+    assert athlete['name'] == 'An Lê' and athlete['weeks_active'] == 3 and athlete['total_km'] == 70
+    assert athlete['avg_km'] == 23.3 and athlete['avg_pace'] == 360
+    assert athlete['completion_rate'] == round(2 / 6, 3) and athlete['goal_weeks'] == 6
+    # Last 4 weeks: 10 km over 4 weeks; before: 60 km over 2 weeks
+    assert athlete['recent_avg_km'] == 2.5 and athlete['previous_avg_km'] == 30 and athlete['trend'] == -0.917
+    assert athlete['category'] == 'Đang phát triển'
+    assert report['insights']['at_risk'][0]['user_id'] == 1
+    assert report['insights']['lower_goal'][0]['user_id'] == 1
+    assert report['summary']['completion_rate'] == round(2 / 6, 3)
+    print("✅ Hand-computed athlete matches")
+
+
+def test_pandas_matches_python():
+    """Both aggregation paths give the same report"""
+    if report_engine.pandas_module() is None:
+        print("✅ pandas not installed, pure-Python path only")
+        return
+    weeks = report_engine.report_weeks(END_WEEK)
+    # Several datasets: sums that land on a rounding boundary must not depend on the summation order
+    for seed in range(1, 9):
+        rows = synthetic_rows(users=120, seed=seed)
+        assert report_engine.build_report(rows, weeks, 'pandas') == report_engine.build_report(rows, weeks, 'python'), seed
+    print("✅ pandas and pure-Python aggregation agree")
+
+
+def test_render_and_write():
+    """Both report types render and are written as HTML + JSON"""
+    app = Flask(__name__)
+    weeks = report_engine.report_weeks(END_WEEK)
+    analytics = report_engine.build_report(synthetic_rows(), weeks)
+    analytics['meta'] = {'generated_at': '2026-01-05T08:00:00', 'rows': 1, 'query_ms': 1.0,
+                         'analysis_ms': 1.0, 'engine': 'python'}
+    with tempfile.TemporaryDirectory() as data_path:
+        for report_type, spec in report_engine.REPORTS.items():
+            html = app.jinja_env.get_template(spec['template']).render(report=spec, analytics=analytics)
+            assert escape(spec['title']) in html and analytics['athletes'][0]['name'] in html
+            files = report_engine.write_report(report_type, analytics, html, data_path)
+            with open(os.path.join(data_path, files[1]), encoding='utf-8') as f:
+                assert json.load(f)['summary'] == analytics['summary']
+            names = set(os.listdir(os.path.join(data_path, spec['folder'])))
+            assert {f"{spec['basename']}.html", f"{spec['basename']}.json",
+                    f"{spec['basename']}.html.gz", f"{spec['basename']}.json.gz"} <= names
+            with gzip.open(os.path.join(data_path, files[1] + '.gz'), 'rt', encoding='utf-8') as f:
+                assert json.load(f)['summary'] == analytics['summary']
+    print("✅ Reports rendered and written with precompressed copies")
+
+
+class VersionedJobs(report_engine.ReportJobs):
+    """Jobs against an unreachable database with the week versions given by the test"""
+
+    def __init__(self, data_path, versions=None):
+        super().__init__('postgresql://127.0.0.1:1/none?connect_timeout=1', data_path, Flask(__name__).jinja_env)
+        self.versions = versions or {}
+
+    def week_versions(self, weeks):
+        return self.versions
+
+
+def wait_for(jobs, job_id):
+    deadline = time.time() + 10
+    while jobs.status(job_id)['state'] in ('pending', 'running') and time.time() < deadline:
+        time.sleep(0.05)
+    return jobs.status(job_id)
+
+
+def test_job_status():
+    """A job records its state on disk; failures are reported, not raised"""
+    with tempfile.TemporaryDirectory() as data_path:
+        jobs = VersionedJobs(data_path)
+        job = jobs.submit('actionable_insights', END_WEEK)
+        assert report_engine.JOB_ID_PATTERN.match(job['id'])
+        status = wait_for(jobs, job['id'])
+        assert status['state'] == 'error' and status['error'] and status['finished_at']
+        assert not os.path.exists(os.path.join(jobs.jobs_path, 'actionable_insights.lock'))
+        assert jobs.status('../../etc/passwd') is None and jobs.status('20260105T080000_x_abcdef') is None
+        try:
+            jobs.submit('unknown', END_WEEK)
+            assert False, 'unknown report type accepted'
+        except ValueError:
+            pass
+    print("✅ Job status recorded")
+
+
+def test_data_key():
+    """The key changes with any covered week's version, and only then"""
+    weeks = report_engine.report_weeks(END_WEEK)
+    key = report_engine.data_key('actionable_insights', weeks, {weeks[3]: 7})
+    assert key == report_engine.data_key('actionable_insights', weeks, {weeks[3]: 7, date(2020, 1, 6): 99})
+    assert key != report_engine.data_key('actionable_insights', weeks, {weeks[3]: 8})
+    assert key != report_engine.data_key('interactive_vietnamese', weeks, {weeks[3]: 7})
+    assert key != report_engine.data_key('actionable_insights', report_engine.report_weeks(END_WEEK, 13), {weeks[3]: 7})
+    print("✅ Data key follows the week versions")
+
+
+def test_fresh_report_returned():
+    """An unchanged report is returned at once; a version change starts a rebuild"""
+    weeks = report_engine.report_weeks(END_WEEK)
+    with tempfile.TemporaryDirectory() as data_path:
+        jobs = VersionedJobs(data_path, {weeks[-1]: 3})
+        spec = report_engine.REPORTS['interactive_vietnamese']
+        files = report_engine.write_report('interactive_vietnamese', {}, '<html></html>', data_path)
+        os.makedirs(jobs.jobs_path)
+        with open(os.path.join(jobs.jobs_path, 'interactive_vietnamese.current'), 'w', encoding='utf-8') as f:
+            json.dump({'job_id': 'previous', 'files': files, 'generated_at': '2026-01-05T08:00:00',
+                       'data_key': report_engine.data_key('interactive_vietnamese', weeks, {weeks[-1]: 3})}, f)
+
+        job = jobs.submit('interactive_vietnamese', END_WEEK)
+        assert job['state'] == 'success' and job['cached'] and job['id'] == 'previous'
+        assert not [name for name in os.listdir(jobs.jobs_path) if name.endswith('.json')]
+
+        jobs.versions = {weeks[-1]: 4}
+        job = jobs.submit('interactive_vietnamese', END_WEEK)
+        assert job['state'] == 'pending' and 'cached' not in job
+        wait_for(jobs, job['id'])
+
+        # Same key but a report file deleted: rebuilt too
+        jobs.versions = {weeks[-1]: 3}
+        os.remove(os.path.join(data_path, spec['folder'], f"{spec['basename']}.html"))
+        job = jobs.submit('interactive_vietnamese', END_WEEK)
+        assert job['state'] == 'pending'
+        wait_for(jobs, job['id'])
+    print("✅ Up-to-date report returned without rebuilding")
+
+
+def test_concurrent_requests_coalesce():
+    """A request while the report is being built joins that job; stale locks are taken over"""
+    with tempfile.TemporaryDirectory() as data_path:
+        jobs = VersionedJobs(data_path)
+        running = {'id': '20260105T080000_actionable_insights_abc123', 'report': 'actionable_insights',
+                   'state': 'running', 'data_key': 'x'}
+        jobs._save(running)
+        assert jobs._claim('actionable_insights', running['id']) is None
+
+        job = jobs.submit('actionable_insights', END_WEEK)
+        assert job['id'] == running['id']
+        assert sorted(os.listdir(jobs.jobs_path)) == [f"{running['id']}.json", 'actionable_insights.lock']
+
+        stale = time.time() - report_engine.REPORT_LOCK_SECONDS - 1
+        os.utime(jobs._lock_path('actionable_insights'), (stale, stale))
+        job = jobs.submit('actionable_insights', END_WEEK)
+        assert job['id'] != running['id'] and job['state'] == 'pending'
+        wait_for(jobs, job['id'])
+    print("✅ Concurrent requests share one build")
+
+
+def test_claim_is_atomic():
+    """Claims racing for a free lock: exactly one wins and the lock always holds its id"""
+    with tempfile.TemporaryDirectory() as data_path:
+        jobs = VersionedJobs(data_path)
+        for round_number in range(20):
+            ids = [f"20260105T0800{round_number:02d}_actionable_insights_{i:06x}" for i in range(6)]
+            for job_id in ids:
+                jobs._save({'id': job_id, 'report': 'actionable_insights', 'state': 'pending', 'data_key': 'x'})
+            start = threading.Barrier(len(ids))
+            outcomes = {}
+
+            def claim(job_id):
+                start.wait()
+                outcomes[job_id] = jobs._claim('actionable_insights', job_id)
+
+            threads = [threading.Thread(target=claim, args=(job_id,)) for job_id in ids]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            winners = [job_id for job_id, holder in outcomes.items() if holder is None]
+            assert len(winners) == 1, f'round {round_number}: {len(winners)} claims won'
+            assert all(holder['id'] == winners[0] for holder in outcomes.values() if holder is not None)
+            with open(jobs._lock_path('actionable_insights'), encoding='utf-8') as f:
+                assert f.read() == winners[0]
+            assert not [name for name in os.listdir(jobs.jobs_path) if name.endswith('.tmp')]
+            for job_id in ids:
+                jobs._save({'id': job_id, 'report': 'actionable_insights', 'state': 'success', 'data_key': 'x'})
+            jobs._release('actionable_insights', winners[0])
+    print("✅ One claim wins a contended lock")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_analytics, test_known_athlete, test_pandas_matches_python, test_render_and_write, test_job_status,
+             test_data_key, test_fresh_report_returned, test_concurrent_requests_coalesce,
+             test_claim_is_atomic]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Test script for the reports manifest
+Validates timestamp ordering, metadata reuse and invalidation by folder mtime,
+and the streamed serving of report files
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import tempfile
+from datetime import datetime
+
+from flask import Flask
+
+from reports_manifest import ReportsManifest, send_report
+
+
+def _write(data_path, folder, name, content='x', modified=None):
+    os.makedirs(os.path.join(data_path, folder), exist_ok=True)
+    path = os.path.join(data_path, folder, name)
+    with open(path, 'w') as f:
+        f.write(content)
+    if modified is not None:
+        stamp = modified.timestamp()
+        os.utime(path, (stamp, stamp))
+    return path
+
+
+def test_sorted_by_timestamp():
+    """Newest first by real time, also across months and years"""
+    with tempfile.TemporaryDirectory() as data_path:
+        _write(data_path, 'weekly_reports', 'a.html', modified=datetime(2025, 12, 31, 9, 0))
+        _write(data_path, 'weekly_reports', 'b.json', modified=datetime(2026, 2, 1, 9, 0))
+        _write(data_path, 'weekly_reports', 'c.html', modified=datetime(2026, 1, 15, 9, 0))
+        _write(data_path, 'weekly_reports', 'notes.txt')
+        reports = ReportsManifest(data_path).get()
+    names = [r['name'] for r in reports['weekly_reports']]
+    # Sorting the '%d/%m/%Y' strings would give c, b, a
+    assert names == ['b.json', 'c.html', 'a.html'], names
+    assert reports['weekly_reports'][0]['modified'] == '01/02/2026 09:00'
+    assert reports['weekly_reports'][0]['type'] == 'JSON Data'
+    assert reports['interactive_reports'] == [] and 'error' not in reports
+    print("✅ Reports sorted by modification time")
+
+
+def test_cached_until_folder_changes():
+    """Unchanged folders are not listed again; a new file shows up"""
+    with tempfile.TemporaryDirectory() as data_path:
+        _write(data_path, 'user_insights', 'one.html')
+        manifest = ReportsManifest(data_path, check_seconds=0)
+        first = manifest.get()['user_insights']
+        assert manifest.get()['user_insights'] is first
+
+        folder = os.path.join(data_path, 'user_insights')
+        before = os.stat(folder).st_mtime_ns
+        _write(data_path, 'user_insights', 'two.json')
+        os.utime(folder, ns=(before + 10**9, before + 10**9))
+        second = manifest.get()['user_insights']
+    assert sorted(r['name'] for r in second) == ['one.html', 'two.json']
+    # Metadata of the unchanged file is reused
+    assert next(r for r in second if r['name'] == 'one.html') is first[0]
+    print("✅ Manifest refreshed only when the folder changes")
+
+
+def test_check_interval_and_invalidate():
+    """Within the check interval nothing is read; invalidate() picks up in-place rewrites"""
+    with tempfile.TemporaryDirectory() as data_path:
+        path = _write(data_path, 'performance_analysis', 'report.html', 'small')
+        manifest = ReportsManifest(data_path, check_seconds=60)
+        assert manifest.get()['performance_analysis'][0]['size'] == '5 B'
+
+        _write(data_path, 'performance_analysis', 'later.html')
+        with open(path, 'w') as f:
+            f.write('x' * 2048)
+        assert [r['name'] for r in manifest.get()['performance_analysis']] == ['report.html']
+
+        manifest.invalidate()
+        reports = {r['name']: r for r in manifest.get()['performance_analysis']}
+    assert set(reports) == {'report.html', 'later.html'}
+    assert reports['report.html']['size'] == '2.0 KB'
+    print("✅ Check interval respected, invalidate() revalidates files")
+
+
+def test_missing_folder():
+    """A missing .data folder gives empty sections; it is picked up once created"""
+    with tempfile.TemporaryDirectory() as root:
+        data_path = os.path.join(root, '.data')
+        manifest = ReportsManifest(data_path, check_seconds=0)
+        reports = manifest.get()
+        assert all(section == [] for section in reports.values()) and len(reports) == 4
+        _write(data_path, 'enhanced_interactive_report', 'bao_cao_strava_tuong_tac.html', modified=datetime.fromtimestamp(time.time()))
+        reports = manifest.get()
+    assert reports['interactive_reports'][0]['description'].startswith('Báo cáo tương tác')
+    print("✅ Missing folders handled")
+
+
+def _client(data_path):
+    app = Flask(__name__)
+    app.add_url_rule('/reports/view/<path:report_path>', 'view_report',
+                     lambda report_path: send_report(data_path, report_path))
+    return app.test_client()
+
+
+def test_send_report_conditional_and_range():
+    """JSON is sent as-is from disk with an ETag, 304 on revalidation and 206 for ranges"""
+    with tempfile.TemporaryDirectory() as data_path:
+        body = json.dumps({'athletes': list(range(2000))})
+        _write(data_path, 'user_insights', 'data.json', body)
+        client = _client(data_path)
+
+        response = client.get('/reports/view/user_insights/data.json')
+        assert response.status_code == 200 and response.mimetype == 'application/json'
+        assert response.get_data(as_text=True) == body and 'Content-Encoding' not in response.headers
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        etag = response.headers['ETag']
+        assert 'no-cache' in response.headers['Cache-Control']
+
+        response = client.get('/reports/view/user_insights/data.json', headers={'If-None-Match': etag})
+        assert response.status_code == 304 and not response.data
+
+        response = client.get('/reports/view/user_insights/data.json', headers={'Range': 'bytes=10-19'})
+        assert response.status_code == 206 and response.get_data(as_text=True) == body[10:20]
+        assert response.headers['Content-Range'] == f"bytes 10-19/{len(body)}"
+
+        assert client.get('/reports/view/user_insights/missing.json').status_code == 404
+        assert client.get('/reports/view/user_insights/data.txt').status_code == 400
+        assert client.get('/reports/view/../etc/passwd.json').status_code == 404
+    print("✅ Reports streamed with ETag, 304 and Range")
+
+
+def test_send_report_precompressed():
+    """An up-to-date .gz sibling is sent to clients that accept gzip; a stale one is ignored"""
+    with tempfile.TemporaryDirectory() as data_path:
+        body = json.dumps({'weeks': ['2026-01-05'] * 500})
+        path = _write(data_path, 'user_insights', 'data.json', body)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(body.encode(), mtime=0))
+        client = _client(data_path)
+
+        response = client.get('/reports/view/user_insights/data.json', headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'gzip' and response.mimetype == 'application/json'
+        assert gzip.decompress(response.data).decode() == body
+        assert 'Accept-Encoding' in response.headers['Vary']
+        gzip_etag = response.headers['ETag']
+
+        plain = client.get('/reports/view/user_insights/data.json', headers={'Accept-Encoding': 'identity'})
+        assert 'Content-Encoding' not in plain.headers and plain.get_data(as_text=True) == body
+        assert plain.headers['ETag'] != gzip_etag
+
+        # Report rewritten after the sibling: the old .gz must not be served
+        stale = time.time() - 60
+        os.utime(path + '.gz', (stale, stale))
+        response = client.get('/reports/view/user_insights/data.json', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers and response.get_data(as_text=True) == body
+    print("✅ Precompressed siblings served when current")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_sorted_by_timestamp, test_cached_until_folder_changes, test_check_interval_and_invalidate,
+             test_missing_folder, test_send_report_conditional_and_range, test_send_report_precompressed]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Test script for the startup-time budget
+Fails when the web app import gets slower than STARTUP_BUDGET_MS or starts
+loading modules that only optional features need
+"""
+
+import sys
+
+import startup_check
+
+
+def test_web_startup_budget():
+    """The web app imports within budget and without optional feature modules"""
+    problems = startup_check.check(runs=1, verbose=False)
+    assert not problems, problems
+    print("✅ Web app startup within budget")
+
+
+def test_crawler_import_is_lazy():
+    """Importing the crawler (as /sync-strava does) does not load Selenium or bs4"""
+    modules, _ = startup_check.profile_import('strava_leaderboard_crawler')
+    loaded = [name for name in ('selenium', 'bs4', 'requests') if name in modules]
+    assert not loaded, loaded
+    print("✅ Crawler defers browser and parser imports")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_web_startup_budget, test_crawler_import_is_lazy]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for the static asset pipeline
+Validates the fingerprinted build and the choice of precompressed variant
+from Accept-Encoding (q-values included)
+"""
+
+import os
+import sys
+import gzip
+import tempfile
+
+from flask import Flask
+
+import static_assets
+
+
+def _app(dist_dir):
+    source = os.path.join(dist_dir, 'src')
+    os.makedirs(os.path.join(source, 'js'))
+    with open(os.path.join(source, 'js', 'app.js'), 'w', encoding='utf-8') as f:
+        f.write('console.log("chạy bộ");\n' * 50)
+    static_assets._manifest = static_assets.build(source, os.path.join(dist_dir, 'dist'))
+    static_assets.DIST_DIR = os.path.join(dist_dir, 'dist')
+    app = Flask(__name__)
+    static_assets.init_app(app)
+    return app
+
+
+def test_build_manifest():
+    """Built names carry the content hash and gzip copies decompress to the source"""
+    original_dist = static_assets.DIST_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            _app(tmp)
+            built = static_assets.load_manifest()['js/app.js']
+            assert built.startswith('js/app.') and built.endswith('.js') and len(built) == len('js/app..js') + 12
+            with open(os.path.join(static_assets.DIST_DIR, built), 'rb') as f:
+                content = f.read()
+            with open(os.path.join(static_assets.DIST_DIR, built + '.gz'), 'rb') as f:
+                assert gzip.decompress(f.read()) == content
+        finally:
+            static_assets.DIST_DIR, static_assets._manifest = original_dist, None
+    print("✅ Assets fingerprinted and precompressed")
+
+
+def test_encoding_negotiation():
+    """The best accepted variant is sent; q=0 refuses an encoding"""
+    original_dist = static_assets.DIST_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            client = _app(tmp).test_client()
+            url = f"/assets/{static_assets.load_manifest()['js/app.js']}"
+            best = 'br' if static_assets.brotli is not None else 'gzip'
+            cases = [
+                ('gzip, deflate, br', best),
+                ('br;q=0, gzip', 'gzip'),
+                ('gzip;q=0.5, br;q=1', best),
+                ('br;q=0, gzip;q=0', None),
+                ('identity', None),
+                ('', None),
+                ('*', best),
+            ]
+            for header, expected in cases:
+                response = client.get(url, headers={'Accept-Encoding': header})
+                assert response.status_code == 200, header
+                assert response.headers.get('Content-Encoding') == expected, (header, response.headers)
+                assert response.mimetype == 'text/javascript' and 'Accept-Encoding' in response.vary
+                assert 'immutable' in response.headers['Cache-Control']
+                response.close()
+            assert client.get('/assets/js/other.js').status_code == 404
+        finally:
+            static_assets.DIST_DIR, static_assets._manifest = original_dist, None
+    print("✅ Precompressed variant chosen from Accept-Encoding q-values")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_build_manifest, test_encoding_negotiation]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script for the synthetic data generator
+Validates determinism, value ranges and the CSV stream fed to COPY
+"""
+
+import io
+import csv
+import sys
+import statistics
+from datetime import date
+
+import synthetic_data
+
+END_WEEK = date(2026, 1, 5)
+
+
+def test_deterministic():
+    """Same seed gives the same rows, another seed gives different ones"""
+    first = list(synthetic_data.generate_challenges(50, 40, 7, END_WEEK))
+    assert first == list(synthetic_data.generate_challenges(50, 40, 7, END_WEEK))
+    assert first != list(synthetic_data.generate_challenges(50, 40, 8, END_WEEK))
+    # Rows of one runner do not depend on how many runners are generated
+    assert [r for r in first if r[0] <= 10] == list(synthetic_data.generate_challenges(10, 40, 7, END_WEEK))
+    assert list(synthetic_data.generate_feedback(20, 7, END_WEEK)) == list(synthetic_data.generate_feedback(20, 7, END_WEEK))
+    print("✅ Generated data is deterministic")
+
+
+def test_realistic_values():
+    """Weeks are Mondays in range, unique per runner, with plausible numbers"""
+    rows = list(synthetic_data.generate_challenges(300, 52, 42, END_WEEK))
+    assert len({(r[0], r[1]) for r in rows}) == len(rows)
+    assert all(r[1].weekday() == 0 and r[1] <= END_WEEK and (r[2] - r[1]).days == 6 for r in rows)
+    distances = [r[4] for r in rows]
+    assert 10 < statistics.median(distances) < 40, statistics.median(distances)
+    assert all(r[5] >= 1 and 200 <= r[6] <= 700 and r[7] >= 0 for r in rows)
+    assert all(r[3] == synthetic_data.distance_goal(r[4]) for r in rows)
+    print(f"✅ {len(rows)} weekly rows with median {statistics.median(distances)}km")
+
+
+def test_copy_stream():
+    """The COPY stream is valid CSV with \\N for NULL, whatever the read size"""
+    rows = list(synthetic_data.generate_feedback(30, 3, END_WEEK))
+    whole = synthetic_data.CopyStream(rows).read()
+    stream = synthetic_data.CopyStream(rows)
+    chunks = []
+    while True:
+        chunk = stream.read(100)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    assert b''.join(chunks) == whole
+    parsed = list(csv.reader(io.StringIO(whole.decode('utf-8'))))
+    assert len(parsed) == 30 and len(parsed[0]) == len(synthetic_data.FEEDBACK_COLUMNS)
+    assert [row[8] == '\\N' for row in parsed] == [row[8] is None for row in rows]
+    print("✅ COPY stream is valid CSV")
+
+
+def main():
+    """Run all tests"""
+    tests = [test_deterministic, test_realistic_values, test_copy_stream]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__} failed: {e}")
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())